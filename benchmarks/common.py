@@ -0,0 +1,42 @@
+import pathlib
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from selenium import webdriver
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from whatsapp2telegram.metrics import RoundTripCounter
+
+FIXTURE = pathlib.Path(__file__).parent / "fixtures" / "whatsapp.html"
+
+
+def fixture_url(**params: float) -> str:
+    query = "&".join(f"{key}={value}" for key, value in params.items())
+    return f"{FIXTURE.as_uri()}?{query}"
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def launch_chrome() -> WebDriver:
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--headless=new")  # type: ignore
+    chrome_options.add_argument("--window-size=1920,1080")  # type: ignore
+    return webdriver.Chrome(options=chrome_options)
+
+
+@contextmanager
+def measure(label: str, counter: RoundTripCounter) -> Iterator[None]:
+    start_count = counter.count
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<12} round-trips={counter.count - start_count:<6} "
+        f"wall={elapsed * 1000:.1f}ms"
+    )
@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+from unittest.mock import patch
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from benchmarks.common import RoundTripCounter, fixture_url, launch_chrome, measure
+from whatsapp2telegram.models import Message
+from whatsapp2telegram.whatsapp import WhatsAppClient
+
+
+# The per-element Selenium scan get_new_messages used before the batched
+# extraction pass, kept here as the baseline.
+def legacy_get_new_messages(driver: WebDriver) -> list[dict[str, str]]:
+    unread_chats = driver.find_elements(
+        By.XPATH, "//span[contains(@aria-label, 'unread message')]"
+    )
+    messages: list[dict[str, str]] = []
+    for chat in unread_chats:
+        unread_count = int(chat.get_attribute("aria-label").split()[0])  # type: ignore
+        chat.click()
+        chat_name = driver.find_element(
+            By.XPATH, "//header/div[2]/div/div/div/span"
+        ).text
+        message_elements = driver.find_elements(
+            By.XPATH, "//div[contains(@class, 'copyable-text')]/parent::*"
+        )[-unread_count:]
+        for element in message_elements:
+            text = "\n".join(
+                span.text
+                for span in element.find_elements(
+                    By.XPATH,
+                    ".//span[contains(@class, 'selectable-text') and contains(@class, 'copyable-text')]/span",
+                )
+            )
+            messages.append({"chat": chat_name, "text": text})
+    return messages
+
+
+async def batched_get_new_messages(driver: WebDriver) -> list[Message]:
+    client = WhatsAppClient(None)  # type: ignore
+    client.driver = driver
+    client._is_authenticated = lambda: True  # type: ignore
+    return await client.get_new_messages()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--unread", type=int, default=30)
+    parser.add_argument("--history", type=int, default=50)
+    args = parser.parse_args()
+    url = fixture_url(chats=args.chats, unread=args.unread, history=args.history)
+
+    driver = launch_chrome()
+    counter = RoundTripCounter(driver)
+    try:
+        driver.get(url)
+        with measure("legacy", counter):
+            legacy = legacy_get_new_messages(driver)
+
+        driver.get(url)
+        # The one second settle per chat is identical in both paths.
+        with patch("whatsapp2telegram.whatsapp.time.sleep"), measure(
+            "batched", counter
+        ):
+            batched = asyncio.run(batched_get_new_messages(driver))
+    finally:
+        driver.quit()
+
+    # The legacy scan never read message ids or timestamps.
+    assert legacy == [
+        {"chat": message.chat, "text": message.text} for message in batched
+    ], "extraction results differ"
+    print(f"messages={len(batched)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import itertools
+import json
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+@dataclass
+class Received:
+    method: str
+    params: dict[str, Any]
+    at: float = field(default_factory=time.time)
+
+
+# Local stand-in for the Telegram Bot API, served on a background thread. It
+# implements the methods the bridge uses, answers after a configurable
+# latency and rejects a configurable share of sends (or the next
+# `reject_next` ones) with 429 Too Many Requests. Updates queued with
+# `queue_update` are handed out by getUpdates or, once a webhook is set,
+# POSTed to it from a background thread, in order, like Telegram does.
+class FakeTelegramServer:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        rate_limit: float = 0.0,
+        retry_after: int = 1,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.reject_next = 0
+        self.received: list[Received] = []
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._updates: list[dict[str, Any]] = []
+        self._next_update_id = 1
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Condition()
+        self._stopped = threading.Event()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+        # (url, secret token) set by setWebhook.
+        self.webhook: tuple[str, str | None] | None = None
+        # HTTP status of every webhook delivery, in order.
+        self.webhook_responses: list[int] = []
+        self._webhook_queue: queue.Queue[dict[str, Any] | None] = queue.Queue()
+        self._webhook_thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-telegram", daemon=True
+        )
+        self._thread.start()
+        self._webhook_thread = threading.Thread(
+            target=self._push_webhooks, name="fake-telegram-webhook", daemon=True
+        )
+        self._webhook_thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._webhook_queue.put(None)
+        with self._lock:
+            self._lock.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def sent_messages(self) -> list[Received]:
+        with self._lock:
+            return [r for r in self.received if r.method == "sendMessage"]
+
+    def queue_update(self, message: dict[str, Any]):
+        with self._lock:
+            update = {"update_id": self._next_update_id, "message": message}
+            self._next_update_id += 1
+            if self.webhook:
+                self._webhook_queue.put(update)
+                return
+            self._updates.append(update)
+            self._lock.notify_all()
+
+    def _push_webhooks(self):
+        while (update := self._webhook_queue.get()) is not None:
+            if self.webhook is None:
+                continue
+            url, secret = self.webhook
+            request = urllib.request.Request(
+                url,
+                data=json.dumps(update).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            if secret:
+                request.add_header("X-Telegram-Bot-Api-Secret-Token", secret)
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError:
+                status = 0
+            with self._lock:
+                self.webhook_responses.append(status)
+                self._lock.notify_all()
+
+    def queue_reply(self, chat_id: int, replied_text: str, text: str):
+        # A user replying, in Telegram, to a message forwarded by the bridge.
+        now = int(time.time())
+        chat = {"id": chat_id, "type": "private"}
+        user = {"id": chat_id, "is_bot": False, "first_name": "User"}
+        self.queue_update(
+            {
+                "message_id": self._message_id(),
+                "date": now,
+                "chat": chat,
+                "from": user,
+                "text": text,
+                "reply_to_message": {
+                    "message_id": self._message_id(),
+                    "date": now,
+                    "chat": chat,
+                    "from": BOT_USER,
+                    "text": replied_text,
+                },
+            }
+        )
+
+    def _message_id(self) -> int:
+        return next(self._message_ids)
+
+    def _handle(self, method: str, params: dict[str, Any]) -> tuple[int, Any]:
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": self._get_updates(params)}
+        if method in ("sendMessage", "sendPhoto", "sendDocument", "sendVoice"):
+            if self.latency:
+                self._stopped.wait(self.latency)
+            with self._lock:
+                if self.reject_next or self._random.random() < self.rate_limit:
+                    self.reject_next = max(0, self.reject_next - 1)
+                    self.rejected += 1
+                    return 429, {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": "Too Many Requests: retry after "
+                        f"{self.retry_after}",
+                        "parameters": {"retry_after": self.retry_after},
+                    }
+                self.received.append(Received(method, params))
+                message = {
+                    "message_id": self._message_id(),
+                    "date": int(time.time()),
+                    "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                    "from": BOT_USER,
+                }
+            if "text" in params:
+                message["text"] = params["text"]
+            attachment = {
+                "file_id": f"file-{message['message_id']}",
+                "file_unique_id": f"unique-{message['message_id']}",
+            }
+            if method == "sendPhoto":
+                message["photo"] = [{**attachment, "width": 1, "height": 1}]
+            elif method == "sendVoice":
+                message["voice"] = {**attachment, "duration": 1}
+            elif method == "sendDocument":
+                message["document"] = attachment
+            return 200, {"ok": True, "result": message}
+        if method == "getMe":
+            return 200, {"ok": True, "result": BOT_USER}
+        if method in ("deleteWebhook", "setWebhook", "editMessageText"):
+            with self._lock:
+                self.received.append(Received(method, params))
+                if method == "setWebhook":
+                    self.webhook = (params["url"], params.get("secret_token"))
+                elif method == "deleteWebhook":
+                    self.webhook = None
+            return 200, {"ok": True, "result": True}
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+    def _get_updates(self, params: dict[str, Any]) -> list[dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        deadline = time.time() + min(float(params.get("timeout") or 0), 1.0)
+        with self._lock:
+            while True:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+                if self._updates or time.time() >= deadline:
+                    return list(self._updates)
+                self._lock.wait(deadline - time.time())
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                content_type = self.headers.get("Content-Type", "")
+                if content_type.startswith("application/json"):
+                    params = json.loads(body or b"{}")
+                elif content_type.startswith("application/x-www-form-urlencoded"):
+                    params = dict(parse_qsl(body.decode()))
+                else:
+                    # Multipart uploads: the payload itself is not inspected.
+                    params = {"size": len(body)}
+                status, payload = server._handle(method, params)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format: str, *args: Any):
+                pass
+
+        return Handler
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import re
+import time
+from unittest.mock import patch
+
+from benchmarks.common import (
+    RoundTripCounter,
+    fixture_url,
+    launch_chrome,
+    percentile,
+)
+from benchmarks.fake_telegram import FakeTelegramServer
+from whatsapp2telegram import main as bridge
+from whatsapp2telegram.message_index import MessageIndex
+from whatsapp2telegram.telegram_bot import TelegramBot
+from whatsapp2telegram.whatsapp import WhatsAppClient
+
+CHAT_ID = 42
+BENCH_TEXT = re.compile(r"(?:bench|reply) (\d+) (\d+)")
+
+
+def latencies(texts: list[tuple[str, float]]) -> dict[int, float]:
+    # Maps every benchmark message found in the texts to its end-to-end
+    # latency in milliseconds; the texts carry their creation time.
+    found: dict[int, float] = {}
+    for text, received_at in texts:
+        for sequence, sent_at in BENCH_TEXT.findall(text):
+            found.setdefault(int(sequence), received_at * 1000 - int(sent_at))
+    return found
+
+
+def report(label: str, values: list[float], elapsed: float):
+    print(
+        f"{label:<8} count={len(values):<6} throughput={len(values) / elapsed:.1f}/s "
+        f"p50={percentile(values, 50):.0f}ms p99={percentile(values, 99):.0f}ms"
+    )
+
+
+async def run(args: argparse.Namespace):
+    server = FakeTelegramServer(latency=args.latency, rate_limit=args.rate_limit)
+    server.start()
+    driver = launch_chrome()
+    counter = RoundTripCounter(driver)
+    telegram_bot = TelegramBot("0:bench", str(CHAT_ID), base_url=server.base_url)
+    client = WhatsAppClient(telegram_bot)
+    client.driver = driver
+    client._is_authenticated = lambda: True  # type: ignore
+    message_index = MessageIndex()
+    claimed = 0
+    replies = 0
+    generated = 0
+    dispatcher: asyncio.Task[None] | None = None
+    try:
+        driver.get(
+            fixture_url(
+                chats=args.chats, unread=0, history=args.history, rate=args.rate
+            )
+        )
+        await telegram_bot.start()
+        dispatcher = asyncio.create_task(
+            bridge.dispatch_replies(telegram_bot, client)
+        )
+        started = time.time()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + args.duration
+        while True:
+            if loop.time() >= deadline:
+                generated = driver.execute_script("return window.__fixtureStop()")
+                deadline = float("inf")
+            for message in await client.get_pushed_messages():
+                if not message_index.claim(message):
+                    continue
+                bridge.forward(telegram_bot, message_index, message)
+                claimed += 1
+                if args.reply_every and claimed % args.reply_every == 0:
+                    server.queue_reply(
+                        CHAT_ID,
+                        f"From: {message.chat}\nMessage:\n{message.body}",
+                        f"reply {replies} {int(time.time() * 1000)}",
+                    )
+                    replies += 1
+            if deadline == float("inf"):
+                break
+            await asyncio.sleep(args.interval)
+
+        # One more drain picks up what arrived before the generator stopped.
+        for message in await client.get_pushed_messages():
+            if message_index.claim(message):
+                bridge.forward(telegram_bot, message_index, message)
+        await asyncio.wait_for(telegram_bot.delivery.join(), 120)
+        drain_deadline = loop.time() + 120
+        while len(telegram_bot.replies) and loop.time() < drain_deadline:
+            await asyncio.sleep(0.1)
+        elapsed = time.time() - started
+
+        forwarded = latencies([(r.params["text"], r.at) for r in server.sent_messages()])
+        sent = driver.execute_script("return window.__fixtureSent")
+        answered = latencies([(s["text"], s["at"] / 1000) for s in sent])
+    finally:
+        if dispatcher:
+            dispatcher.cancel()
+        await telegram_bot.stop()
+        driver.quit()
+        server.stop()
+
+    print(
+        f"generated={generated} forwarded={len(forwarded)} "
+        f"telegram_requests={len(server.sent_messages())} 429s={server.rejected}"
+    )
+    report("forward", list(forwarded.values()), elapsed)
+    report("reply", list(answered.values()), elapsed)
+    print(
+        f"round-trips/message="
+        f"{counter.count / max(1, len(forwarded) + len(answered)):.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--history", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=10, help="messages/s")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=1, help="push interval")
+    parser.add_argument("--latency", type=float, default=0.05, help="Bot API s")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="429 share")
+    parser.add_argument("--reply-every", type=int, default=0)
+    parser.add_argument("--settle", type=float, default=0.0)
+    args = parser.parse_args()
+
+    real_sleep = time.sleep
+    # Replaces the one second settle after opening a chat, which the fixture
+    # does not need; the fake Bot API waits on events, not time.sleep.
+    with patch(
+        "whatsapp2telegram.whatsapp.time.sleep",
+        lambda _: real_sleep(args.settle),
+    ):
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
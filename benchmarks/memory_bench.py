@@ -0,0 +1,53 @@
+import argparse
+import statistics
+import time
+
+from selenium import webdriver
+
+from benchmarks.common import fixture_url
+from whatsapp2telegram.browser import BrowserProfile
+from whatsapp2telegram.metrics import process_tree_rss
+
+
+def sample_rss(profile: BrowserProfile, url: str, duration: float) -> list[int]:
+    # Resident memory of chromedriver and Chrome, sampled every second while
+    # the fixture receives messages.
+    driver = webdriver.Chrome(options=profile.options())
+    try:
+        profile.apply(driver)
+        driver.get(url)
+        samples: list[int] = []
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            time.sleep(1)
+            samples.append(process_tree_rss(driver.service.process.pid))  # type: ignore
+        return samples
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--history", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=20, help="messages/s")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--heap-mb", type=int, default=512)
+    args = parser.parse_args()
+    url = fixture_url(chats=args.chats, unread=0, history=args.history, rate=args.rate)
+
+    for label, profile in (
+        ("full", BrowserProfile(lean=False)),
+        ("lean", BrowserProfile(lean=True, heap_mb=args.heap_mb)),
+    ):
+        samples = sample_rss(profile, url, args.duration)
+        # Steady state: the second half of the run, after start-up settles.
+        steady = statistics.median(samples[len(samples) // 2 :])
+        print(
+            f"{label:<6} steady_rss={steady / 2**20:.0f}MB "
+            f"peak_rss={max(samples) / 2**20:.0f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
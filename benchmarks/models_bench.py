@@ -0,0 +1,109 @@
+import argparse
+import hashlib
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from whatsapp2telegram.message_index import MEDIA_FIELDS, MessageIndex
+from whatsapp2telegram.models import Message
+
+
+def raw_messages(count: int, chats: int) -> list[dict[str, str]]:
+    # What the extraction scripts return, spread over a few minutes.
+    return [
+        {
+            "chat": f"Chat {i % chats}",
+            "id": f"false_{1000 + i % chats}@g.us_{i:016X}_4917{i % 97:06d}@c.us",
+            "pre": f"[12:{i // 1000 % 60:02d}, 17/10/2026] Sender {i % 97}: ",
+            "text": f"message number {i}",
+        }
+        for i in range(count)
+    ]
+
+
+def as_dict(raw: dict[str, str]) -> dict[str, str]:
+    # The dict the bridge passed around before Message.
+    return {
+        "chat": raw["chat"],
+        "id": raw["id"],
+        "pre": raw["pre"],
+        "text": raw["text"],
+    }
+
+
+def as_message(raw: dict[str, str]) -> Message:
+    return Message.parse(raw["chat"], raw["text"], raw["id"], raw["pre"])
+
+
+def dict_row(message: dict[str, str]) -> tuple[Any, ...]:
+    key = message.get("id") or message["text"]
+    fingerprint = hashlib.blake2b(
+        f"{message['chat']}\0{key}\0{message.get('pre', '')}".encode(),
+        digest_size=16,
+    ).hexdigest()
+    return (
+        fingerprint,
+        message["chat"],
+        message.get("id", ""),
+        message.get("pre", ""),
+        message["text"],
+        *(message.get(field, "") for field in MEDIA_FIELDS),
+    )
+
+
+def message_row(message: Message) -> tuple[Any, ...]:
+    media = message.media
+    return (
+        MessageIndex.fingerprint(message),
+        message.chat,
+        message.id,
+        message.pre,
+        message.text,
+        *((media.type, media.hash, media.filename) if media else ("",) * 3),
+    )
+
+
+def allocate(
+    label: str, build: Callable[[dict[str, str]], Any], raw: list[dict[str, str]]
+) -> list[Any]:
+    # Timed and traced in separate passes: tracing slows allocation down.
+    started = time.perf_counter()
+    built = [build(message) for message in raw]
+    elapsed = time.perf_counter() - started
+    del built
+    tracemalloc.start()
+    built = [build(message) for message in raw]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<24} {elapsed * 1000:8.1f}ms "
+        f"{size / len(raw):6.0f} bytes/message"
+    )
+    return built
+
+
+def serialize(label: str, dump: Callable[[Any], Any], messages: list[Any]):
+    started = time.perf_counter()
+    for message in messages:
+        dump(message)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<24} {elapsed * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--chats", type=int, default=50)
+    args = parser.parse_args()
+    raw = raw_messages(args.messages, args.chats)
+
+    print(f"allocation of {args.messages} messages")
+    dicts = allocate("dict", as_dict, raw)
+    messages = allocate("Message.parse", as_message, raw)
+    print(f"serialization of {args.messages} messages")
+    serialize("dict -> outbox row", dict_row, dicts)
+    serialize("Message -> outbox row", message_row, messages)
+
+
+if __name__ == "__main__":
+    main()
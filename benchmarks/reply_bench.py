@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import random
+import time
+from unittest.mock import patch
+
+from benchmarks.common import RoundTripCounter, fixture_url, launch_chrome
+from whatsapp2telegram.whatsapp import WhatsAppClient
+
+
+async def send_replies(
+    client: WhatsAppClient, chats: list[dict[str, str]], count: int, seed: int
+) -> tuple[int, float]:
+    # Replies to `count` random chats, quoting the newest message of each, the
+    # way dispatch_replies does; returns the replies sent and the elapsed time.
+    rng = random.Random(seed)
+    sent = 0
+    started = time.perf_counter()
+    for n in range(count):
+        chat = rng.choice(chats)
+        if await client.send_message(chat["name"], f"reply {n}", chat["quote"]):
+            sent += 1
+    return sent, time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace):
+    driver = launch_chrome()
+    counter = RoundTripCounter(driver)
+    client = WhatsAppClient(None)  # type: ignore
+    client.driver = driver
+    client._is_authenticated = lambda: True  # type: ignore
+    try:
+        driver.get(fixture_url(chats=args.chats, unread=0, history=args.history))
+        chats = driver.execute_script(
+            "return chats.map((c) => ({name: c.name,"
+            " quote: c.messages[c.messages.length - 1].id}))"
+        )
+        for label in ("search", "directory"):
+            start_count = counter.count
+            if label == "search":
+                with patch.object(client, "_open_chat", return_value=False):
+                    sent, elapsed = await send_replies(
+                        client, chats, args.replies, args.seed
+                    )
+            else:
+                sent, elapsed = await send_replies(
+                    client, chats, args.replies, args.seed
+                )
+            print(
+                f"{label:<10} replies={sent:<5} "
+                f"replies/min={sent / elapsed * 60:.0f} "
+                f"round-trips/reply={(counter.count - start_count) / max(1, sent):.1f}"
+            )
+    finally:
+        client.executor.shutdown()
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--history", type=int, default=20)
+    parser.add_argument("--replies", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--settle", type=float, default=0.0)
+    args = parser.parse_args()
+
+    real_sleep = time.sleep
+    # The search flow waits a fixed second after clicking the search box;
+    # both modes get the same settle time so only the navigation differs.
+    with patch(
+        "whatsapp2telegram.whatsapp.time.sleep",
+        lambda _: real_sleep(args.settle),
+    ):
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import fixture_url
+from benchmarks.fake_telegram import FakeTelegramServer
+from whatsapp2telegram.metrics import StartupTimer
+from whatsapp2telegram.telegram_bot import TelegramBot
+from whatsapp2telegram.whatsapp import WhatsAppClient
+
+
+def import_time(statement: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True)
+    return time.perf_counter() - started
+
+
+async def start(args: argparse.Namespace, concurrent: bool) -> StartupTimer:
+    # Time from nothing running to the first drained ingestion cycle.
+    server = FakeTelegramServer(latency=args.latency)
+    server.start()
+    telegram_bot = TelegramBot("0:bench", "42", base_url=server.base_url)
+    with tempfile.TemporaryDirectory() as profile:
+        client = WhatsAppClient(telegram_bot, profile)
+        client.supervisor.url = fixture_url(chats=args.chats, unread=0, history=20)
+        startup = StartupTimer()
+        try:
+            with startup.phase("startup"):
+                if concurrent:
+                    await asyncio.gather(telegram_bot.start(), client.start())
+                else:
+                    await telegram_bot.start()
+                    await client.start()
+                await client.get_pushed_messages()
+        finally:
+            await telegram_bot.stop()
+            await client.executor.run(client.stop)
+            client.executor.shutdown()
+            await client.supervisor.close()
+            server.stop()
+    startup.phases.update(client.startup.phases)
+    return startup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="Bot API s")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    eager = import_time(
+        "import whatsapp2telegram.telegram_bot, whatsapp2telegram.whatsapp"
+    )
+    lazy = import_time("import whatsapp2telegram.main")
+    print(f"import   eager={eager:.2f}s lazy={lazy:.2f}s")
+    for label, concurrent in (("sequential", False), ("concurrent", True)):
+        for _ in range(args.runs):
+            startup = asyncio.run(start(args, concurrent))
+            print(f"{label:<10} {startup.summary()}")
+
+
+if __name__ == "__main__":
+    main()
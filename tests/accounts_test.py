@@ -0,0 +1,73 @@
+import json
+import pytest
+from whatsapp2telegram.accounts import (
+    accounts_for_replica,
+    assign_replica,
+    load_accounts,
+    replica_index_from_hostname,
+)
+
+
+def write_accounts(tmp_path, entries):
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def test_load_accounts(tmp_path):
+    path = write_accounts(
+        tmp_path,
+        [
+            {"name": "work", "telegram_chat_id": -100},
+            {"name": "home", "telegram_chat_id": "200", "user_data_dir": "/p"},
+        ],
+    )
+
+    work, home = load_accounts(path, "/profiles", "/state")
+
+    assert work.telegram_chat_id == "-100"
+    assert work.user_data_dir == "/profiles/work"
+    assert work.state_dir == "/state/work"
+    assert home.user_data_dir == "/p"
+
+
+@pytest.mark.parametrize(
+    "entries",
+    [
+        [{"name": "work"}],
+        [{"name": "a", "telegram_chat_id": 1}, {"name": "a", "telegram_chat_id": 2}],
+        [{"name": "a", "telegram_chat_id": 1}, {"name": "b", "telegram_chat_id": 1}],
+    ],
+)
+def test_load_accounts_rejects_invalid_config(tmp_path, entries):
+    with pytest.raises(ValueError):
+        load_accounts(write_accounts(tmp_path, entries), "/profiles", "/state")
+
+
+def test_accounts_are_partitioned_across_replicas(tmp_path):
+    entries = [{"name": f"account{i}", "telegram_chat_id": i} for i in range(50)]
+    accounts = load_accounts(write_accounts(tmp_path, entries), "/p", "/s")
+
+    shards = [accounts_for_replica(accounts, i, 4) for i in range(4)]
+
+    assert sorted(a.name for shard in shards for a in shard) == sorted(
+        a.name for a in accounts
+    )
+    assert all(shards)
+    with pytest.raises(ValueError):
+        accounts_for_replica(accounts, 4, 4)
+
+
+def test_scaling_out_only_moves_accounts_to_new_replica():
+    names = [f"account{i}" for i in range(200)]
+    before = {name: assign_replica(name, 4) for name in names}
+    after = {name: assign_replica(name, 5) for name in names}
+
+    moved = [name for name in names if before[name] != after[name]]
+    assert moved
+    assert all(after[name] == 4 for name in moved)
+
+
+def test_replica_index_from_hostname():
+    assert replica_index_from_hostname("whatsapp2telegram-3") == 3
+    assert replica_index_from_hostname("laptop") is None
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from whatsapp2telegram.backfill import Backfill, BackfillPage, BackfillState
+from whatsapp2telegram.message_index import MessageIndex
+from whatsapp2telegram.models import Message
+
+
+def message(chat: str, id: str) -> Message:
+    return Message.parse(chat, id, id)
+
+
+def backfill_for(pages: list[BackfillPage | None], **kwargs) -> Backfill:
+    whatsapp_client = MagicMock()
+    whatsapp_client.backfill_page = AsyncMock(side_effect=pages)
+    telegram_bot = MagicMock()
+    telegram_bot.delivery.pending = 0
+    message_index = MessageIndex()
+    submitted: list[Message] = []
+
+    async def submit(message: Message) -> bool:
+        if not message_index.claim(message):
+            return False
+        submitted.append(message)
+        return True
+
+    backfill = Backfill(
+        whatsapp_client,
+        telegram_bot,
+        message_index,
+        BackfillState(),
+        submit,
+        page_size=2,
+        pause=0,
+        **kwargs,
+    )
+    backfill.submitted = submitted  # type: ignore
+    return backfill
+
+
+def test_plan_keeps_unfinished_checkpoint(tmp_path):
+    path = str(tmp_path / "backfill.db")
+    state = BackfillState(path)
+    state.plan({"A": "a1"})
+    state.advance("A", "a5")
+    state.close()
+
+    reopened = BackfillState(path)
+    reopened.plan({"A": "a9", "B": "b1"})
+
+    assert reopened.chats() == [("A", "a5"), ("B", "b1")]
+    reopened.finish("A")
+    assert len(reopened) == 1
+
+
+@pytest.mark.asyncio
+async def test_backfill_pages_through_chat():
+    backfill = backfill_for(
+        [
+            BackfillPage([message("A", "a2"), message("A", "a3")], complete=False),
+            BackfillPage([message("A", "a4")]),
+        ]
+    )
+    backfill.message_index.claim(message("A", "a3"))
+    backfill.state.plan({"A": "a1"})
+
+    await backfill.run()
+
+    calls = backfill.whatsapp_client.backfill_page.call_args_list  # type: ignore
+    assert [c.args[1] for c in calls] == ["a1", "a3"]
+    # a3 was already claimed by live ingestion.
+    assert [m.id for m in backfill.submitted] == ["a2", "a4"]  # type: ignore
+    assert backfill.forwarded == 2
+    assert len(backfill.state) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_pages_leave_chat_for_next_start():
+    backfill = backfill_for([None, None, None])
+    backfill.state.plan({"A": "a1"})
+
+    await backfill.run()
+
+    assert backfill.state.chats() == [("A", "a1")]
+
+
+@pytest.mark.asyncio
+async def test_backfill_waits_for_delivery_queue():
+    backfill = backfill_for([BackfillPage([message("A", "a2")])], max_pending=10)
+    backfill.telegram_bot.delivery.pending = 50  # type: ignore
+    backfill.state.plan({"A": "a1"})
+
+    task = asyncio.create_task(backfill.run())
+    await asyncio.sleep(0.01)
+    backfill.whatsapp_client.backfill_page.assert_not_called()  # type: ignore
+
+    backfill.telegram_bot.delivery.pending = 0  # type: ignore
+    await asyncio.wait_for(task, 1)
+    assert [m.id for m in backfill.submitted] == ["a2"]  # type: ignore
@@ -0,0 +1,54 @@
+from unittest.mock import MagicMock
+from selenium.common.exceptions import WebDriverException
+from whatsapp2telegram.browser import DEFAULT_BLOCKED_URLS, BrowserProfile
+
+
+def test_lean_options():
+    arguments = BrowserProfile(heap_mb=256).options("/profile").arguments
+
+    assert "user-data-dir=/profile" in arguments
+    assert "--window-size=1280,720" in arguments
+    assert "--js-flags=--max-old-space-size=256" in arguments
+    assert "--disable-background-networking" in arguments
+
+
+def test_full_options():
+    arguments = BrowserProfile(lean=False).options("/profile").arguments
+
+    assert "--window-size=1920,1080" in arguments
+    assert not any(a.startswith("--js-flags") for a in arguments)
+
+
+def test_apply_blocks_requests():
+    driver = MagicMock()
+
+    BrowserProfile().apply(driver)
+    BrowserProfile(lean=False).apply(driver)
+
+    driver.execute_cdp_cmd.assert_called_with(
+        "Network.setBlockedURLs", {"urls": list(DEFAULT_BLOCKED_URLS)}
+    )
+    assert driver.execute_cdp_cmd.call_count == 2
+
+    driver.execute_cdp_cmd.side_effect = WebDriverException()
+    BrowserProfile().apply(driver)
+
+
+def test_needs_recycling():
+    assert BrowserProfile(max_rss=100).needs_recycling(101) is True
+    assert BrowserProfile(max_rss=100).needs_recycling(99) is False
+    assert BrowserProfile(max_rss=0).needs_recycling(10**12) is False
+    assert BrowserProfile(lean=False, max_rss=100).needs_recycling(101) is False
+
+
+def test_recycle_tab_keeps_new_tab():
+    driver = MagicMock()
+    handles = iter(["old", "new"])
+    type(driver).current_window_handle = property(lambda _: next(handles))
+
+    BrowserProfile().recycle_tab(driver, "https://web.whatsapp.com")
+
+    driver.switch_to.new_window.assert_called_once_with("tab")
+    driver.get.assert_called_once_with("https://web.whatsapp.com")
+    driver.close.assert_called_once()
+    assert driver.switch_to.window.call_args_list[-1].args == ("new",)
@@ -0,0 +1,40 @@
+from whatsapp2telegram.chat_directory import ChatDirectory, jid_of
+
+
+def test_jid_of_message_id():
+    assert jid_of("false_4917612345678@c.us_3EB0ABC") == "4917612345678@c.us"
+    assert jid_of("true_1203630@g.us_3EB0ABC_49176@c.us") == "1203630@g.us"
+    assert jid_of("false_1") is None
+
+
+def test_find_prefers_jid_over_name():
+    directory = ChatDirectory()
+    directory.update("Twin", "1@c.us", 100)
+    directory.update("Twin", "2@c.us", 900)
+
+    assert directory.find("Twin", "1@c.us").position == 100
+    assert directory.find("Twin").jid == "2@c.us"
+    assert directory.find("Other") is None
+
+
+def test_learning_jid_replaces_name_entry():
+    directory = ChatDirectory()
+    directory.update("Chat", position=50)
+
+    directory.update("Chat", "1@c.us")
+
+    assert len(directory) == 1
+    assert directory.find("Chat").jid == "1@c.us"
+    assert directory.find("Chat").position is None
+
+
+def test_capacity_evicts_least_recently_seen():
+    directory = ChatDirectory(capacity=2)
+    directory.update("A", "a@c.us")
+    directory.update("B", "b@c.us")
+    directory.update("A", "a@c.us")
+
+    directory.update("C", "c@c.us")
+
+    assert directory.find("B") is None
+    assert directory.find("A") is not None
@@ -0,0 +1,244 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from whatsapp2telegram.delivery import DeliveryQueue, TokenBucket, split_text
+from whatsapp2telegram.models import Media
+
+
+def format_message(source: str, texts: list[str]) -> str:
+    return f"{source}: " + " | ".join(texts)
+
+
+@pytest.mark.asyncio
+async def test_delivers_in_order_per_source():
+    sent: list[str] = []
+
+    async def send(chat_id: str, text: str):
+        await asyncio.sleep(0)
+        sent.append(text)
+
+    queue = DeliveryQueue(send, format_message, chat_rate=1000, chat_burst=1000)
+    futures = []
+    for i in range(6):
+        futures.append(queue.submit("1", f"chat{i % 2}", f"m{i}"))
+        await asyncio.sleep(0.01)
+    await asyncio.gather(*futures)
+    await queue.close()
+
+    assert [text for text in sent if text.startswith("chat0")] == [
+        "chat0: m0",
+        "chat0: m2",
+        "chat0: m4",
+    ]
+    assert [text for text in sent if text.startswith("chat1")] == [
+        "chat1: m1",
+        "chat1: m3",
+        "chat1: m5",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_coalesces_consecutive_messages_from_same_source():
+    send = AsyncMock(return_value="sent")
+    queue = DeliveryQueue(send, format_message)
+    futures = [queue.submit("1", "chat", text) for text in ("a", "b", "c")]
+
+    results = await asyncio.gather(*futures)
+    await queue.close()
+
+    send.assert_called_once_with("1", "chat: a | b | c")
+    assert results == ["sent", "sent", "sent"]
+    assert queue.coalesced == 2
+
+
+@pytest.mark.asyncio
+async def test_coalescing_respects_max_length():
+    send = AsyncMock()
+    queue = DeliveryQueue(send, format_message, chat_rate=1000, max_length=12)
+    futures = [queue.submit("1", "chat", text) for text in ("aaa", "bbb", "ccc")]
+
+    await asyncio.gather(*futures)
+    await queue.close()
+
+    assert [call.args[1] for call in send.call_args_list] == [
+        "chat: aaa",
+        "chat: bbb",
+        "chat: ccc",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_retries_after_flood_limit():
+    send = AsyncMock(side_effect=[RetryAfter(0), "sent"])
+    queue = DeliveryQueue(send, format_message)
+
+    result = await queue.submit("1", "chat", "text")
+    await queue.close()
+
+    assert result == "sent"
+    assert send.call_count == 2
+    assert queue.retries == 1
+    assert queue.flood_limited == 1
+    assert queue.request_seconds.count(method="message", outcome="ok") == 1
+
+
+@pytest.mark.asyncio
+async def test_bounded_concurrency_across_chats():
+    in_flight = 0
+    peak = 0
+
+    async def send(chat_id: str, text: str):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    queue = DeliveryQueue(send, format_message, concurrency=2)
+    await asyncio.gather(*(queue.submit(str(i), "chat", "text") for i in range(6)))
+    await queue.close()
+
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, capacity=1)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    for _ in range(5):
+        await bucket.acquire()
+
+    assert loop.time() - started >= 0.035
+
+
+@pytest.mark.asyncio
+async def test_bad_request_is_not_retried():
+    send = AsyncMock(side_effect=BadRequest("Message is too long"))
+    queue = DeliveryQueue(send, format_message)
+
+    with pytest.raises(BadRequest):
+        await queue.submit("1", "chat", "text")
+    await queue.close()
+
+    send.assert_called_once()
+    assert queue.retries == 0
+
+
+@pytest.mark.asyncio
+async def test_long_message_is_split_on_lines_with_header():
+    send = AsyncMock()
+    queue = DeliveryQueue(send, format_message, chat_rate=1000, max_length=20)
+
+    await queue.submit("1", "chat", "line one\nline two\nline three")
+    await queue.close()
+
+    assert [call.args[1] for call in send.call_args_list] == [
+        "chat: line one",
+        "chat: line two",
+        "chat: line three",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_partial_failure_resumes_with_unsent_parts():
+    send = AsyncMock(side_effect=["first", NetworkError("down"), "second", "third"])
+    queue = DeliveryQueue(
+        send, format_message, chat_rate=1000, max_length=20, max_retries=0
+    )
+
+    result = await queue.submit("1", "chat", "line one\nline two\nline three")
+    await queue.close()
+
+    assert result == "third"
+    assert [call.args[1] for call in send.call_args_list] == [
+        "chat: line one",
+        "chat: line two",
+        "chat: line two",
+        "chat: line three",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_every_request_takes_a_chat_token():
+    send = AsyncMock()
+    queue = DeliveryQueue(
+        send, format_message, chat_rate=50, chat_burst=1, max_length=20
+    )
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    await queue.submit("1", "chat", "line one\nline two\nline three")
+    await queue.close()
+
+    assert send.call_count == 3
+    assert loop.time() - started >= 0.035
+
+
+@pytest.mark.asyncio
+async def test_sources_for_one_chat_are_sent_concurrently():
+    in_flight = 0
+    peak = 0
+
+    async def send(chat_id: str, text: str):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    queue = DeliveryQueue(send, format_message, chat_burst=3)
+    await asyncio.gather(*(queue.submit("1", f"chat{i}", "text") for i in range(3)))
+    await queue.close()
+
+    assert peak == 3
+
+
+def test_split_text():
+    assert split_text("a\nb\nc", 3) == ["a\nb", "c"]
+    assert split_text("abcdefg", 3) == ["abc", "def", "g"]
+
+
+@pytest.mark.asyncio
+async def test_media_is_sent_alone_with_caption():
+    send = AsyncMock()
+    send_media = AsyncMock()
+    queue = DeliveryQueue(
+        send, format_message, chat_rate=1000, chat_burst=1000, send_media=send_media
+    )
+    photo = Media("photo", "abc")
+
+    await asyncio.gather(
+        queue.submit("1", "chat", "before"),
+        queue.submit("1", "chat", "look", photo),
+        queue.submit("1", "chat", "after"),
+    )
+    await queue.close()
+
+    send_media.assert_called_once_with("1", "chat: look", photo)
+    assert [c.args[1] for c in send.call_args_list] == ["chat: before", "chat: after"]
+
+
+@pytest.mark.asyncio
+async def test_long_caption_follows_media_as_text():
+    send = AsyncMock(side_effect=[NetworkError("down")] * 6 + [None])
+    send_media = AsyncMock()
+    queue = DeliveryQueue(
+        send,
+        format_message,
+        chat_rate=1000,
+        chat_burst=1000,
+        max_retries=0,
+        send_media=send_media,
+        max_caption_length=10,
+    )
+    photo = Media("photo", "abc")
+
+    delivery = queue.submit("1", "chat", "a long caption", photo)
+    await asyncio.wait_for(delivery, 5)
+    await queue.close()
+
+    send_media.assert_called_once_with("1", "chat:", photo)
+    assert send.call_args_list[-1].args == ("1", "chat: a long caption")
@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from telegram.error import BadRequest
+from whatsapp2telegram.delivery import DeliveryQueue
+from whatsapp2telegram.digest import DIGEST, Digester, DigestPolicy
+from whatsapp2telegram.models import Media, Message
+
+
+def format_message(source: str, texts: list[str]) -> str:
+    return f"{source}: " + " | ".join(texts)
+
+
+def digester_for(**policy) -> tuple[Digester, AsyncMock, AsyncMock, list]:
+    send = AsyncMock(side_effect=lambda chat_id, text: SimpleNamespace(message_id=7))
+    edit = AsyncMock(
+        side_effect=lambda chat_id, id, text: SimpleNamespace(message_id=id)
+    )
+    routes: list = []
+    delivery = DeliveryQueue(
+        send,
+        format_message,
+        chat_rate=1000,
+        chat_burst=1000,
+        edit=edit,
+        on_sent=lambda chat_id, tag, sent: routes.append((tag, sent.message_id)),
+    )
+    policy = DigestPolicy({"Noisy": DIGEST}, **policy)
+    return Digester(delivery, policy, tick=3600), send, edit, routes
+
+
+def message(text: str, chat: str = "Noisy") -> Message:
+    return Message.parse(chat, text, pre="[12:05, 17/10/2026] Bob: ")
+
+
+@pytest.mark.asyncio
+async def test_window_is_sent_as_one_message():
+    digester, send, _, routes = digester_for(window=60)
+    futures = [digester.submit("1", message(text)) for text in ("a", "b", "c")]
+
+    digester.flush_due(digester.open[("1", "Noisy")].opened_at + 30)
+    await asyncio.sleep(0.01)
+    assert not send.called
+
+    digester.flush_due(digester.open[("1", "Noisy")].opened_at + 60)
+    results = await asyncio.gather(*futures)
+    await digester.stop()
+    await digester.delivery.close()
+
+    send.assert_called_once_with("1", "Noisy: [12:05] a\n[12:05] b\n[12:05] c")
+    assert [r.message_id for r in results] == [7, 7, 7]
+    assert routes == [(("Noisy", ""), 7)]
+    assert not digester.open
+    assert (digester.digested, digester.sent) == (3, 1)
+
+
+@pytest.mark.asyncio
+async def test_rolling_digest_edits_its_message():
+    digester, send, edit, _ = digester_for(window=60, rolling=True, edit_interval=10)
+    first = digester.submit("1", message("a"))
+    opened_at = digester.open[("1", "Noisy")].opened_at
+    digester.flush_due(opened_at + 10)
+    await first
+    second = digester.submit("1", message("b"))
+    digester.flush_due(opened_at + 20)
+    await second
+    third = digester.submit("1", message("c"))
+    digester.flush_due(opened_at + 60)
+    await third
+    await digester.stop()
+    await digester.delivery.close()
+
+    send.assert_called_once_with("1", "Noisy: [12:05] a")
+    assert [c.args for c in edit.call_args_list] == [
+        ("1", 7, "Noisy: [12:05] a\n[12:05] b"),
+        ("1", 7, "Noisy: [12:05] a\n[12:05] b\n[12:05] c"),
+    ]
+    assert not digester.open
+
+
+@pytest.mark.asyncio
+async def test_failed_edit_sends_new_lines_as_a_new_message():
+    digester, send, edit, _ = digester_for(window=60, rolling=True, edit_interval=10)
+    first = digester.submit("1", message("a"))
+    opened_at = digester.open[("1", "Noisy")].opened_at
+    digester.flush_due(opened_at + 10)
+    await first
+    edit.side_effect = BadRequest("Message to edit not found")
+    second = digester.submit("1", message("b"))
+    digester.flush_due(opened_at + 20)
+    result = await second
+    await digester.stop()
+    await digester.delivery.close()
+
+    assert edit.call_count == 1
+    assert send.call_args_list[1].args == ("1", "Noisy: [12:05] b")
+    assert result.message_id == 7
+
+
+@pytest.mark.asyncio
+async def test_stop_sends_open_digests():
+    digester, send, _, _ = digester_for(window=60)
+    future = digester.submit("1", message("a"))
+
+    await digester.stop()
+    await future
+    await digester.delivery.close()
+
+    send.assert_called_once_with("1", "Noisy: [12:05] a")
+
+
+@pytest.mark.asyncio
+async def test_failed_digest_fails_its_messages():
+    digester, send, _, _ = digester_for(window=60)
+    send.side_effect = BadRequest("Chat not found")
+    futures = [digester.submit("1", message(text)) for text in ("a", "b")]
+
+    await digester.stop()
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    await digester.delivery.close()
+
+    assert all(isinstance(result, BadRequest) for result in results)
+
+
+def test_policy_applies_to_text_in_digest_chats():
+    digester = Digester(AsyncMock(), DigestPolicy({"Noisy": DIGEST}))
+
+    assert digester.applies(message("a"))
+    assert not digester.applies(message("a", chat="Mom"))
+    assert not digester.applies(
+        Message.parse("Noisy", "", media=Media("photo", "abc"))
+    )
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+import pytest
+from whatsapp2telegram.driver_executor import DriverExecutor
+from whatsapp2telegram.metrics import LoopLagMonitor
+
+
+@pytest.fixture
+def executor():
+    executor = DriverExecutor()
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_run_uses_single_worker_thread(executor: DriverExecutor):
+    threads = await asyncio.gather(
+        *(executor.run(lambda: threading.current_thread().name) for _ in range(5))
+    )
+
+    assert len(set(threads)) == 1
+    assert threads[0] != threading.current_thread().name
+    assert threads[0].startswith("whatsapp-driver")
+
+
+@pytest.mark.asyncio
+async def test_run_preserves_submission_order(executor: DriverExecutor):
+    calls: list[int] = []
+
+    def command(index: int):
+        time.sleep(0.01)
+        calls.append(index)
+
+    await asyncio.gather(*(executor.run(command, i) for i in range(5)))
+
+    assert calls == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_run_propagates_exceptions(executor: DriverExecutor):
+    def command():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await executor.run(command)
+    assert executor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_blocking_command_does_not_block_loop(executor: DriverExecutor):
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+
+    await executor.run(time.sleep, 0.3)
+    await monitor.stop()
+
+    assert monitor.samples > 10
+    assert monitor.max_lag < 0.05
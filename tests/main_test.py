@@ -0,0 +1,182 @@
+import asyncio
+import subprocess
+import sys
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telegram.error import BadRequest
+from whatsapp2telegram import main
+from whatsapp2telegram.accounts import Account
+from whatsapp2telegram.metrics import LoopLagMonitor
+from whatsapp2telegram.telegram_bot import TelegramBot
+from whatsapp2telegram.whatsapp import WhatsAppClient
+from whatsapp2telegram.message_index import MessageIndex
+from whatsapp2telegram.models import Message
+from whatsapp2telegram.pipeline import ForwardPipeline
+from whatsapp2telegram.reply_queue import ReplyQueue
+
+
+@pytest.fixture
+def message():
+    return Message.parse("TestChat", "Hello", "false_1")
+
+
+async def settle(delivery: asyncio.Future[object]):
+    await asyncio.gather(delivery, return_exceptions=True)
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_forward_marks_delivered_message(message: Message):
+    loop = asyncio.get_running_loop()
+    delivery = loop.create_future()
+    telegram_bot = MagicMock()
+    telegram_bot.queue_message.return_value = delivery
+    index = MessageIndex()
+    index.claim(message)
+
+    main.forward(telegram_bot, index, message)
+    delivery.set_result(None)
+    await settle(delivery)
+
+    assert index.pending_messages() == []
+    assert index.claim(message) is False
+
+
+@pytest.mark.asyncio
+async def test_forward_releases_rejected_message(message: Message):
+    loop = asyncio.get_running_loop()
+    delivery = loop.create_future()
+    telegram_bot = MagicMock()
+    telegram_bot.queue_message.return_value = delivery
+    index = MessageIndex()
+    index.claim(message)
+
+    main.forward(telegram_bot, index, message)
+    delivery.set_exception(BadRequest("Message is too long"))
+    await settle(delivery)
+
+    assert index.pending_messages() == []
+    assert index.in_flight == set()
+
+
+@pytest.mark.asyncio
+async def test_forward_retries_failed_delivery(message: Message):
+    loop = asyncio.get_running_loop()
+    failed = loop.create_future()
+    telegram_bot = MagicMock()
+    telegram_bot.queue_message.return_value = failed
+    index = MessageIndex()
+    index.claim(message)
+    loop.call_later = MagicMock()  # type: ignore
+
+    main.forward(telegram_bot, index, message)
+    failed.set_exception(TimeoutError())
+    await settle(failed)
+
+    loop.call_later.assert_called_once()  # type: ignore
+    assert loop.call_later.call_args.args[1] is main.forward  # type: ignore
+    assert index.pending_messages() == [message]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_replies_survives_errors():
+    telegram_bot = MagicMock()
+    telegram_bot.replies = ReplyQueue(base_backoff=60)
+    telegram_bot.replies.put({"chat": "TestChat", "text": "Hello"})
+    whatsapp_client = MagicMock()
+    whatsapp_client.send_messages = AsyncMock(
+        side_effect=Exception("Authentication failed")
+    )
+
+    dispatcher = asyncio.create_task(
+        main.dispatch_replies(telegram_bot, whatsapp_client)
+    )
+    await asyncio.sleep(0.05)
+
+    assert not dispatcher.done()
+    dispatcher.cancel()
+    await asyncio.gather(dispatcher, return_exceptions=True)
+    assert len(telegram_bot.replies) == 1
+    assert telegram_bot.replies.get_nowait() is None
+
+
+@pytest.mark.asyncio
+async def test_dispatch_replies_acks_per_reply():
+    replies = ReplyQueue(base_backoff=60)
+    for text in ("one", "two", "three"):
+        replies.put({"chat": "TestChat", "text": text})
+    whatsapp_client = MagicMock()
+    whatsapp_client.send_messages = AsyncMock(return_value=[True, False, True])
+
+    dispatcher = asyncio.create_task(
+        main.dispatch_replies(MagicMock(), whatsapp_client, replies)
+    )
+    await asyncio.sleep(0.05)
+    dispatcher.cancel()
+    await asyncio.gather(dispatcher, return_exceptions=True)
+
+    whatsapp_client.send_messages.assert_called_once()
+    assert len(whatsapp_client.send_messages.call_args.args[0]) == 3
+    assert len(replies) == 1
+
+
+@pytest.mark.asyncio
+async def test_status_server_probes_and_metrics():
+    telegram_bot = TelegramBot("0:test", "42")
+    whatsapp_client = WhatsAppClient(telegram_bot)
+    account = Account("home", "42", "/tmp/profile", "/tmp/state")
+    pipeline = ForwardPipeline(MessageIndex(), MagicMock(), lambda: 0)
+    server = main.status_server(
+        telegram_bot,
+        [whatsapp_client],
+        [account],
+        LoopLagMonitor(),
+        port=0,
+        pipelines=[pipeline],
+    )
+    server.host = "127.0.0.1"
+    await server.start()
+
+    async def get(path: str) -> tuple[int, str]:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(f"GET {path} HTTP/1.1\r\n\r\n".encode())
+        response = (await reader.read()).decode()
+        writer.close()
+        head, _, body = response.partition("\r\n\r\n")
+        return int(head.split()[1]), body
+
+    try:
+        assert (await get("/readyz"))[0] == 503
+        whatsapp_client.authenticated = True
+        assert (await get("/readyz"))[0] == 200
+
+        assert (await get("/healthz"))[0] == 200
+        whatsapp_client.last_cycle_at = time.monotonic() - main.LIVENESS_TIMEOUT - 1
+        assert await get("/healthz") == (503, "stalled: home\n")
+
+        whatsapp_client.messages_read = 3
+        status, body = await get("/metrics")
+        assert status == 200
+        assert 'whatsapp2telegram_messages_read_total{account="home"} 3' in body
+        assert 'whatsapp2telegram_reply_queue_depth{telegram_chat_id="42"} 0' in body
+        assert 'whatsapp2telegram_forward_queue_depth{account="home"} 0' in body
+    finally:
+        await server.stop()
+
+
+def test_import_defers_selenium_and_telegram():
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, whatsapp2telegram.main;"
+            "print(sorted({m.split('.')[0] for m in sys.modules}"
+            " & {'selenium', 'telegram'}))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    assert loaded.strip() == "[]"
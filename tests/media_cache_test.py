@@ -0,0 +1,42 @@
+from whatsapp2telegram.media_cache import MediaCache
+
+
+def test_blob_is_kept_until_uploaded():
+    cache = MediaCache()
+
+    content_hash = cache.put_blob(b"image bytes")
+
+    assert cache.get_blob(content_hash) == b"image bytes"
+    assert cache.file_id(content_hash) is None
+
+    cache.store_file_id(content_hash, "file-1")
+
+    assert cache.get_blob(content_hash) is None
+    assert cache.file_id(content_hash) == "file-1"
+
+
+def test_known_content_is_not_stored_again():
+    cache = MediaCache()
+    content_hash = cache.put_blob(b"image bytes")
+    cache.store_file_id(content_hash, "file-1")
+
+    assert cache.put_blob(b"image bytes") == content_hash
+    assert cache.get_blob(content_hash) is None
+
+
+def test_file_ids_survive_restart(tmp_path):
+    path = str(tmp_path / "media.db")
+    cache = MediaCache(path)
+    content_hash = cache.put_blob(b"image bytes")
+    cache.store_file_id(content_hash, "file-1")
+    cache.close()
+
+    assert MediaCache(path).file_id(content_hash) == "file-1"
+
+
+def test_prune_drops_stale_entries():
+    cache = MediaCache(retention=-1)
+    cache.store_file_id(cache.put_blob(b"uploaded"), "file-1")
+    cache.put_blob(b"orphan")
+
+    assert cache.prune() == 2
@@ -0,0 +1,103 @@
+import dataclasses
+import pytest
+from whatsapp2telegram.message_index import MessageIndex
+from whatsapp2telegram.models import Media, Message
+
+
+@pytest.fixture
+def message():
+    return Message.parse("TestChat", "Hello", "false_1@c.us_A")
+
+
+def test_claim_only_once_while_in_flight(message: Message):
+    index = MessageIndex()
+
+    assert index.claim(message) is True
+    assert index.claim(message) is False
+
+
+def test_release_allows_retry(message: Message):
+    index = MessageIndex()
+    index.claim(message)
+
+    index.release(message)
+
+    assert index.claim(message) is True
+
+
+def test_forwarded_survives_restart(tmp_path, message: Message):
+    path = str(tmp_path / "forwarded.db")
+    index = MessageIndex(path)
+    index.claim(message)
+    index.mark_forwarded(message)
+    index.close()
+
+    reopened = MessageIndex(path)
+
+    assert reopened.claim(message) is False
+    assert reopened.claim(dataclasses.replace(message, id="false_1@c.us_B")) is True
+
+
+def test_lru_is_bounded(message: Message):
+    index = MessageIndex(cache_size=2)
+    for i in range(5):
+        index.mark_forwarded(dataclasses.replace(message, id=str(i)))
+
+    assert len(index.cache) == 2
+    assert index.claim(dataclasses.replace(message, id="0")) is False
+
+
+def test_pending_messages_survive_restart(tmp_path, message: Message):
+    path = str(tmp_path / "forwarded.db")
+    index = MessageIndex(path)
+    index.claim(dataclasses.replace(message, pre="[12:00] Bob: "))
+    index.close()
+
+    reopened = MessageIndex(path)
+
+    assert reopened.pending_messages() == [dataclasses.replace(message, pre="[12:00] Bob: ")]
+    assert reopened.claim(dataclasses.replace(message, pre="[12:00] Bob: ")) is True
+
+
+def test_release_drops_pending(message: Message):
+    index = MessageIndex()
+    index.claim(message)
+
+    index.release(message)
+
+    assert index.pending_messages() == []
+
+
+def test_fingerprint_includes_timestamp():
+    first = Message.parse("TestChat", "ok", pre="[12:00, 17/10/2026] Bob: ")
+    second = Message.parse("TestChat", "ok", pre="[12:05, 17/10/2026] Bob: ")
+
+    assert MessageIndex.fingerprint(first) != MessageIndex.fingerprint(second)
+
+
+def test_prune_drops_old_fingerprints(message: Message):
+    index = MessageIndex(retention=0)
+    index.mark_forwarded(message)
+
+    assert index.prune() == 1
+
+
+def test_pending_media_message_survives_restart(tmp_path, message: Message):
+    path = str(tmp_path / "forwarded.db")
+    media_message = dataclasses.replace(message, media=Media("photo", "abc"))
+    MessageIndex(path).claim(media_message)
+
+    assert MessageIndex(path).pending_messages() == [media_message]
+
+
+def test_checkpoint_is_last_forwarded_message(message: Message):
+    index = MessageIndex()
+    later = dataclasses.replace(message, id="false_1@c.us_B")
+    index.claim(message)
+    index.claim(later)
+
+    index.mark_forwarded(later)
+    index.mark_forwarded(message)
+    index.mark_forwarded(Message.parse("Other", "no id"))
+
+    assert index.checkpoints() == {"TestChat": message.id}
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+import pytest
+from whatsapp2telegram.metrics import (
+    Histogram,
+    LoopLagMonitor,
+    Registry,
+    StartupTimer,
+    counter,
+    gauge,
+    process_tree_rss,
+)
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_detects_blocking_call():
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+
+    time.sleep(0.2)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    assert monitor.max_lag >= 0.15
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_reset():
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.max_lag = 1.0
+    monitor.samples = 3
+
+    monitor.reset()
+
+    assert monitor.max_lag == 0.0
+    assert monitor.samples == 0
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1))
+    histogram.observe(0.05, phase="drain")
+    histogram.observe(0.5, phase="drain")
+    histogram.observe(5, phase="drain")
+
+    samples = {
+        (suffix, labels.get("le")): value
+        for suffix, labels, value in histogram.samples(account="a")
+    }
+
+    assert samples[("_bucket", "0.1")] == 1
+    assert samples[("_bucket", "1")] == 2
+    assert samples[("_bucket", "+Inf")] == 3
+    assert samples[("_sum", None)] == 5.55
+    assert histogram.count(phase="drain") == 3
+
+
+def test_registry_renders_one_family_per_name():
+    registry = Registry()
+    registry.register(lambda: [counter("w2t_read_total", "Read", 3, account="a")])
+    registry.register(lambda: [counter("w2t_read_total", "Read", 4, account="b")])
+    registry.register(lambda: [gauge("w2t_lag_seconds", "Lag", 0.25)])
+
+    text = registry.render()
+
+    assert text.count("# TYPE w2t_read_total counter") == 1
+    assert 'w2t_read_total{account="a"} 3' in text
+    assert 'w2t_read_total{account="b"} 4' in text
+    assert "w2t_lag_seconds 0.25" in text
+
+
+def test_process_tree_rss_of_this_process():
+    assert process_tree_rss(os.getpid()) > 0
+    assert process_tree_rss(2**22 + 1) == 0
+
+
+def test_startup_timer_records_phases():
+    startup = StartupTimer()
+
+    with startup.phase("chrome"):
+        time.sleep(0.01)
+
+    assert startup.phases["chrome"] >= 0.01
+    assert startup.summary().startswith("chrome 0.0")
+    assert startup.elapsed() >= startup.phases["chrome"]
@@ -0,0 +1,35 @@
+from datetime import datetime
+from whatsapp2telegram.models import Message, parse_pre
+
+
+def test_parse_pre_reads_sender_and_timestamp():
+    sender, timestamp = parse_pre("[12:05, 17/10/2026] Bob: ")
+
+    assert sender == "Bob"
+    assert timestamp == datetime(2026, 10, 17, 12, 5).timestamp()
+
+
+def test_parse_pre_reads_twelve_hour_clock():
+    sender, timestamp = parse_pre("[1:05 PM, 10/17/2026] Alice Smith: ")
+
+    assert sender == "Alice Smith"
+    assert timestamp == datetime(2026, 10, 17, 13, 5).timestamp()
+
+
+def test_parse_pre_ignores_unknown_formats():
+    assert parse_pre("") == ("", None)
+    assert parse_pre("[yesterday, sometime] Bob: ") == ("Bob", None)
+
+
+def test_group_message_body_names_its_sender():
+    group = Message.parse(
+        "Family", "hi", "false_123@g.us_ABC_456@c.us", "[12:05, 17/10/2026] Bob: "
+    )
+    direct = Message.parse(
+        "Bob", "hi", "false_456@c.us_ABC", "[12:05, 17/10/2026] Bob: "
+    )
+
+    assert group.is_group and group.chat_id == "123@g.us"
+    assert group.body == "Bob: hi"
+    assert not direct.is_group
+    assert direct.body == "hi"
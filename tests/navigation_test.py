@@ -0,0 +1,47 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from whatsapp2telegram.navigation import NavigationManager
+
+
+@pytest.fixture
+def navigation():
+    return NavigationManager(reload_cost=10.0)
+
+
+def test_return_to_chat_list_with_escape(navigation: NavigationManager):
+    mock_driver = MagicMock()
+    mock_driver.execute_script.side_effect = [False, True]
+
+    with patch("whatsapp2telegram.navigation.ActionChains") as mock_chains:
+        navigation.return_to_chat_list(mock_driver)
+
+    assert mock_chains.return_value.send_keys.call_count == 2
+    mock_driver.refresh.assert_not_called()
+    assert navigation.reloads_avoided == 1
+    assert navigation.reloads == 0
+    assert 9.0 < navigation.time_saved <= 10.0
+
+
+def test_return_to_chat_list_falls_back_to_reload(navigation: NavigationManager):
+    mock_driver = MagicMock()
+    mock_driver.execute_script.return_value = False
+
+    with patch("whatsapp2telegram.navigation.ActionChains"):
+        navigation.return_to_chat_list(mock_driver)
+
+    mock_driver.refresh.assert_called_once()
+    assert navigation.reloads == 1
+    assert navigation.reloads_avoided == 0
+    assert navigation.time_saved == 0.0
+    assert navigation.reload_cost < 10.0
+
+
+def test_recover_reloads_once(navigation: NavigationManager):
+    mock_driver = MagicMock()
+    navigation.needs_recovery = True
+
+    navigation.recover(mock_driver)
+    navigation.recover(mock_driver)
+
+    mock_driver.refresh.assert_called_once()
+    assert navigation.needs_recovery is False
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from whatsapp2telegram.message_index import MessageIndex
+from whatsapp2telegram.models import Message
+from whatsapp2telegram.pipeline import (
+    PRIORITY_DIRECT,
+    PRIORITY_GROUP,
+    ForwardPipeline,
+    priority_of,
+)
+
+
+def message(id: str, chat: str = "Chat") -> Message:
+    return Message.parse(chat, id, id)
+
+
+def pipeline_for(pending: list[int] | None = None, **kwargs) -> ForwardPipeline:
+    forwarded: list[Message] = []
+    pending = pending if pending is not None else [0]
+    pipeline = ForwardPipeline(
+        MessageIndex(),
+        forwarded.append,
+        lambda: pending[0],
+        poll_interval=0.01,
+        **kwargs,
+    )
+    pipeline.forwarded_messages = forwarded  # type: ignore
+    return pipeline
+
+
+def test_groups_come_after_direct_chats():
+    assert priority_of(message("false_4917@c.us_A")) == PRIORITY_DIRECT
+    assert priority_of(message("false_1203@g.us_A_4917@c.us")) == PRIORITY_GROUP
+    assert priority_of(Message.parse("Chat", "no id")) == PRIORITY_DIRECT
+
+
+@pytest.mark.asyncio
+async def test_direct_messages_overtake_groups():
+    pipeline = pipeline_for()
+    await pipeline.submit(message("false_1@g.us_A_2@c.us", "Group"))
+    await pipeline.submit(message("false_3@c.us_B", "Friend"))
+    await pipeline.submit(message("false_1@g.us_C_2@c.us", "Group"))
+    assert await pipeline.submit(message("false_3@c.us_B", "Friend")) is False
+
+    runner = asyncio.create_task(pipeline.run())
+    await asyncio.sleep(0.05)
+    runner.cancel()
+
+    ids = [m.id for m in pipeline.forwarded_messages]  # type: ignore
+    assert ids == ["false_3@c.us_B", "false_1@g.us_A_2@c.us", "false_1@g.us_C_2@c.us"]
+
+
+@pytest.mark.asyncio
+async def test_waits_while_telegram_is_busy():
+    pending = [10]
+    pipeline = pipeline_for(pending, max_in_flight=10)
+    await pipeline.submit(message("false_1@c.us_A"))
+
+    runner = asyncio.create_task(pipeline.run())
+    await asyncio.sleep(0.05)
+    assert pipeline.forwarded == 0
+    assert len(pipeline) == 1
+
+    pending[0] = 0
+    await asyncio.sleep(0.05)
+    runner.cancel()
+    assert pipeline.forwarded == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds_to_outbox_and_refills_in_order():
+    pending = [10]
+    pipeline = pipeline_for(pending, capacity=2, max_in_flight=10, put_timeout=0.01)
+    for i in range(5):
+        assert await pipeline.submit(message(f"false_1@c.us_{i}")) is True
+
+    assert len(pipeline) == 2
+    assert pipeline.shed == 3
+    assert pipeline.spilling is True
+    assert pipeline.blocked_seconds > 0
+
+    runner = asyncio.create_task(pipeline.run())
+    pending[0] = 0
+    await asyncio.sleep(0.1)
+    runner.cancel()
+
+    ids = [m.id for m in pipeline.forwarded_messages]  # type: ignore
+    assert ids == [f"false_1@c.us_{i}" for i in range(5)]
+    assert pipeline.refilled == 3
+    assert pipeline.spilling is False
+
+
+@pytest.mark.asyncio
+async def test_resume_reads_outbox_back():
+    pipeline = pipeline_for()
+    pipeline.message_index.claim(message("false_1@c.us_A"))
+    pipeline.message_index.defer(message("false_1@c.us_A"))
+
+    pipeline.resume()
+    runner = asyncio.create_task(pipeline.run())
+    await asyncio.sleep(0.05)
+    runner.cancel()
+
+    ids = [m.id for m in pipeline.forwarded_messages]  # type: ignore
+    assert ids == ["false_1@c.us_A"]
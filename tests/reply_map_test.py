@@ -0,0 +1,30 @@
+from whatsapp2telegram.reply_map import ReplyMap
+
+
+def test_resolve_recorded_route():
+    reply_map = ReplyMap()
+
+    reply_map.record("42", 7, "Team: Alpha", "false_1@g.us_A")
+
+    assert reply_map.resolve("42", 7) == ("Team: Alpha", "false_1@g.us_A")
+    assert reply_map.resolve("42", 8) is None
+    assert reply_map.resolve("43", 7) is None
+
+
+def test_prune_keeps_newest_routes():
+    reply_map = ReplyMap(capacity=2)
+    for message_id in range(5):
+        reply_map.record("42", message_id, "Chat", f"false_{message_id}")
+
+    reply_map.prune()
+
+    assert len(reply_map) == 2
+    assert reply_map.resolve("42", 4) == ("Chat", "false_4")
+    assert reply_map.resolve("42", 0) is None
+
+
+def test_routes_survive_restart(tmp_path):
+    path = str(tmp_path / "reply_map.db")
+    ReplyMap(path).record("42", 7, "Chat", "false_1")
+
+    assert ReplyMap(path).resolve("42", 7) == ("Chat", "false_1")
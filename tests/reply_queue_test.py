@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from whatsapp2telegram.reply_queue import ReplyQueue
+
+
+def test_put_and_ack():
+    queue = ReplyQueue()
+    queue.put({"chat": "TestChat", "text": "Hello"})
+
+    reply_id, reply = queue.get_nowait()  # type: ignore
+
+    assert reply == {"chat": "TestChat", "text": "Hello"}
+    assert queue.get_nowait() is None
+    queue.ack(reply_id)
+    assert len(queue) == 0
+
+
+def test_nack_retries_with_backoff():
+    queue = ReplyQueue(base_backoff=60)
+    queue.put({"chat": "TestChat", "text": "Hello"})
+    reply_id, _ = queue.get_nowait()  # type: ignore
+
+    queue.nack(reply_id)
+
+    assert len(queue) == 1
+    assert queue.get_nowait() is None
+    assert 59 < queue._next_due_in() <= 60  # type: ignore
+
+
+def test_nack_drops_after_max_attempts():
+    queue = ReplyQueue(max_attempts=2, base_backoff=0)
+    queue.put({"chat": "TestChat", "text": "Hello"})
+
+    for _ in range(2):
+        reply_id, _ = queue.get_nowait()  # type: ignore
+        queue.nack(reply_id)
+
+    assert len(queue) == 0
+
+
+def test_leased_replies_are_redelivered_after_crash(tmp_path):
+    path = str(tmp_path / "replies.db")
+    queue = ReplyQueue(path)
+    queue.put({"chat": "TestChat", "text": "Hello"})
+    assert queue.get_nowait() is not None
+    queue.close()
+
+    reopened = ReplyQueue(path)
+
+    assert reopened.get_nowait() == (1, {"chat": "TestChat", "text": "Hello"})
+
+
+@pytest.mark.asyncio
+async def test_get_waits_for_retry():
+    queue = ReplyQueue(base_backoff=0.05)
+    queue.put({"chat": "TestChat", "text": "Hello"})
+    reply_id, _ = await queue.get()
+    queue.nack(reply_id)
+
+    retried_id, _ = await asyncio.wait_for(queue.get(), 1)
+
+    assert retried_id == reply_id
+
+
+def test_quote_is_kept_with_reply():
+    queue = ReplyQueue()
+
+    queue.put({"chat": "TestChat", "text": "Hi", "quote": "false_1"})
+
+    assert queue.get_nowait() == (
+        1,
+        {"chat": "TestChat", "text": "Hi", "quote": "false_1"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_batch_takes_due_replies():
+    queue = ReplyQueue()
+    for text in ("one", "two", "three"):
+        queue.put({"chat": "TestChat", "text": text})
+
+    batch = await asyncio.wait_for(queue.get_batch(limit=2), 1)
+
+    assert [reply["text"] for _, reply in batch] == ["one", "two"]
+    assert (await queue.get_batch())[0][1]["text"] == "three"
@@ -0,0 +1,67 @@
+from whatsapp2telegram.scheduler import AdaptiveInterval, ChatScheduler
+
+
+def test_adaptive_interval_backs_off_when_idle():
+    interval = AdaptiveInterval(1, 10)
+
+    assert [interval.next(False) for _ in range(5)] == [2, 4, 8, 10, 10]
+    assert interval.next(True) == 1
+
+
+def test_plan_orders_chats_by_weight():
+    scheduler = ChatScheduler({"Mom": 10, "Group": 0.1})
+
+    selected, deferred = scheduler.plan(
+        [
+            {"chat": "Group", "count": 3},
+            {"chat": "Friend", "count": 1},
+            {"chat": "Mom", "count": 2},
+        ]
+    )
+
+    assert [c["chat"] for c in selected] == ["Mom", "Friend", "Group"]
+    assert scheduler.plan(
+        [{"chat": "Big", "count": 9}, {"chat": "Small", "count": 1}]
+    )[0] == [{"chat": "Small", "count": 1}, {"chat": "Big", "count": 9}]
+    assert deferred == []
+
+
+def test_plan_caps_messages_per_cycle():
+    scheduler = ChatScheduler({"Friend": 2}, max_messages_per_cycle=10)
+    unread = [{"chat": "Huge group", "count": 500}, {"chat": "Friend", "count": 2}]
+
+    selected, deferred = scheduler.plan(unread)
+
+    assert [c["chat"] for c in selected] == ["Friend"]
+    assert [c["chat"] for c in deferred] == ["Huge group"]
+    assert scheduler.last_cycle.chats == 1
+    assert scheduler.last_cycle.messages == 2
+    assert scheduler.last_cycle.deferred == 1
+
+
+def test_plan_always_reads_one_chat():
+    scheduler = ChatScheduler(max_messages_per_cycle=10)
+
+    selected, _ = scheduler.plan([{"chat": "Huge group", "count": 500}])
+
+    assert [c["chat"] for c in selected] == ["Huge group"]
+
+
+def test_deferred_chats_are_not_starved():
+    scheduler = ChatScheduler({"Busy": 1.5}, max_messages_per_cycle=5)
+    unread = [{"chat": "Busy", "count": 5}, {"chat": "Quiet", "count": 5}]
+
+    assert scheduler.plan(unread)[0] == [{"chat": "Busy", "count": 5}]
+    assert scheduler.plan(unread)[0] == [{"chat": "Quiet", "count": 5}]
+    assert scheduler.waiting == {"Busy": 1}
+
+
+def test_next_interval_treats_deferred_chats_as_activity():
+    scheduler = ChatScheduler(
+        max_messages_per_cycle=1, interval=AdaptiveInterval(1, 30)
+    )
+    scheduler.plan([{"chat": "A", "count": 1}, {"chat": "B", "count": 1}])
+
+    assert scheduler.next_interval(False) == 1
+    scheduler.plan([])
+    assert scheduler.next_interval(False) == 2
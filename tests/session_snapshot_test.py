@@ -0,0 +1,100 @@
+import os
+import tarfile
+import pytest
+from whatsapp2telegram.session_snapshot import (
+    SESSION_MARKER,
+    SessionSnapshot,
+    has_session,
+    prune_caches,
+)
+
+
+def write(path, content: bytes = b"data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def profile(tmp_path) -> str:
+    profile = str(tmp_path / "profile")
+    write(os.path.join(profile, "Local State"), b"{}")
+    write(os.path.join(profile, SESSION_MARKER, "000003.log"), b"keys" * 100)
+    write(os.path.join(profile, SESSION_MARKER, "LOCK"), b"")
+    write(os.path.join(profile, "Default/Local Storage/leveldb/000005.ldb"))
+    write(os.path.join(profile, "Default/Cache/Cache_Data/data_1"), b"x" * 4096)
+    write(os.path.join(profile, "Default/History"))
+    write(os.path.join(profile, "SingletonLock"))
+    return profile
+
+
+def test_snapshot_holds_only_the_session(profile: str, tmp_path):
+    snapshot = SessionSnapshot(str(tmp_path / "snapshots" / "default.tar.gz"))
+
+    assert snapshot.due()
+    assert snapshot.save(profile)
+
+    with tarfile.open(snapshot.path) as archive:
+        names = set(archive.getnames())
+    assert names == {
+        "Local State",
+        f"{SESSION_MARKER}/000003.log",
+        "Default/Local Storage/leveldb/000005.ldb",
+    }
+    assert snapshot.verify()
+    assert open(snapshot.checksum_path).read().endswith("  default.tar.gz\n")
+    assert snapshot.saves == 1 and snapshot.size == os.path.getsize(snapshot.path)
+    assert not snapshot.due()
+    assert not os.path.exists(f"{snapshot.path}.tmp")
+
+
+def test_restore_logs_a_new_profile_in(profile: str, tmp_path):
+    snapshot = SessionSnapshot(str(tmp_path / "default.tar.gz"))
+    snapshot.save(profile)
+    new_profile = str(tmp_path / "new-profile")
+
+    assert snapshot.restore(new_profile)
+
+    assert has_session(new_profile)
+    with open(os.path.join(new_profile, SESSION_MARKER, "000003.log"), "rb") as f:
+        assert f.read() == b"keys" * 100
+    assert not os.path.exists(os.path.join(new_profile, "Default/Cache"))
+    assert not os.path.exists(f"{new_profile}.restoring")
+    # A profile that is logged in already is left alone.
+    assert not snapshot.restore(new_profile)
+
+
+def test_restore_refuses_a_corrupted_snapshot(profile: str, tmp_path):
+    snapshot = SessionSnapshot(str(tmp_path / "default.tar.gz"))
+    snapshot.save(profile)
+    with open(snapshot.path, "r+b") as f:
+        f.seek(20)
+        f.write(b"garbage")
+    new_profile = str(tmp_path / "new-profile")
+
+    assert not snapshot.verify()
+    assert not snapshot.restore(new_profile)
+    assert not has_session(new_profile)
+
+
+def test_no_snapshot_without_a_session(tmp_path):
+    snapshot = SessionSnapshot(str(tmp_path / "default.tar.gz"))
+
+    assert not snapshot.save(str(tmp_path / "empty"))
+    assert not snapshot.restore(str(tmp_path / "empty"))
+    assert not os.path.exists(snapshot.path)
+
+
+def test_existing_snapshot_is_not_due_until_interval(profile: str, tmp_path):
+    SessionSnapshot(str(tmp_path / "default.tar.gz")).save(profile)
+
+    assert not SessionSnapshot(str(tmp_path / "default.tar.gz")).due()
+    assert SessionSnapshot(str(tmp_path / "default.tar.gz"), interval=0).due()
+
+
+def test_prune_caches_keeps_the_session(profile: str):
+    assert prune_caches(profile) == 4096
+
+    assert not os.path.exists(os.path.join(profile, "Default/Cache"))
+    assert os.path.exists(os.path.join(profile, "Default/History"))
+    assert has_session(profile)
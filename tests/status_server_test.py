@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from whatsapp2telegram.status_server import Request, Response, StatusServer
+
+
+async def request(port: int, raw: bytes) -> tuple[int, bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+@pytest.mark.asyncio
+async def test_routes_requests():
+    server = StatusServer("127.0.0.1", 0)
+    received: list[Request] = []
+
+    async def echo(req: Request) -> Response:
+        received.append(req)
+        return Response(body=req.body)
+
+    server.route("POST", "/echo", echo)
+    await server.start()
+    try:
+        status, body = await request(
+            server.port,
+            b"POST /echo?x=1 HTTP/1.1\r\nContent-Length: 5\r\nX-Token: t\r\n\r\nhello",
+        )
+        assert (status, body) == (200, b"hello")
+        assert received[0].headers["x-token"] == "t"
+
+        status, _ = await request(server.port, b"GET /echo HTTP/1.1\r\n\r\n")
+        assert status == 405
+        status, _ = await request(server.port, b"GET /missing HTTP/1.1\r\n\r\n")
+        assert status == 404
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_failing_handler_returns_500():
+    server = StatusServer("127.0.0.1", 0)
+
+    async def broken(req: Request) -> Response:
+        raise RuntimeError("boom")
+
+    server.route("GET", "/broken", broken)
+    await server.start()
+    try:
+        status, _ = await request(server.port, b"GET /broken HTTP/1.1\r\n\r\n")
+        assert status == 500
+    finally:
+        await server.stop()
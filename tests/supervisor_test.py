@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import MagicMock
+from selenium.common.exceptions import WebDriverException
+from whatsapp2telegram.supervisor import SessionSupervisor
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    profile = tmp_path / "profile"
+    profile.mkdir()
+    (profile / "Default").mkdir()
+    (profile / "Default" / "Preferences").write_text("{}")
+    (profile / "SingletonLock").write_text("")
+    (profile / "Cache").mkdir()
+    return SessionSupervisor(MagicMock(side_effect=lambda _: MagicMock()), str(profile))
+
+
+def test_probe():
+    driver = MagicMock()
+    driver.execute_script.return_value = 1
+    assert SessionSupervisor.probe(driver) is True
+
+    driver.execute_script.side_effect = WebDriverException()
+    assert SessionSupervisor.probe(driver) is False
+    assert SessionSupervisor.probe(None) is False
+
+
+@pytest.mark.asyncio
+async def test_ensure_standby_uses_profile_snapshot(supervisor: SessionSupervisor, tmp_path):
+    supervisor.launch()
+    await supervisor.ensure_standby()
+
+    standby_dir = tmp_path / "profile-standby"
+    supervisor.create_driver.assert_called_with(str(standby_dir))  # type: ignore
+    supervisor.standby.get.assert_called_once_with("about:blank")  # type: ignore
+    assert (standby_dir / "Default" / "Preferences").exists()
+    assert not (standby_dir / "SingletonLock").exists()
+    assert not (standby_dir / "Cache").exists()
+    await supervisor.close()
+
+
+@pytest.mark.asyncio
+async def test_promote_swaps_sessions(supervisor: SessionSupervisor):
+    active = supervisor.launch()
+    await supervisor.ensure_standby()
+    standby = supervisor.standby
+    standby.execute_script.return_value = 1  # type: ignore
+    active_dir, standby_dir = supervisor.profiles
+
+    assert supervisor.promote() is standby
+
+    active.quit.assert_called_once()
+    standby.get.assert_called_with("https://web.whatsapp.com")  # type: ignore
+    assert supervisor.profiles == [standby_dir, active_dir]
+    assert supervisor.standby is None
+    await supervisor.close()
+
+
+def test_promote_without_healthy_standby(supervisor: SessionSupervisor):
+    active = supervisor.launch()
+    assert supervisor.promote() is None
+
+    standby = MagicMock()
+    standby.execute_script.side_effect = WebDriverException()
+    supervisor.standby = standby
+    assert supervisor.promote() is None
+    standby.quit.assert_called_once()
+    active.quit.assert_not_called()
+
+
+def test_record_recovery(supervisor: SessionSupervisor):
+    supervisor.record_recovery(2.0, warm=True)
+    supervisor.record_recovery(40.0, warm=False)
+
+    assert supervisor.recoveries == 2
+    assert supervisor.cold_restarts == 1
+    assert supervisor.last_recovery_time == 40.0
+    assert supervisor.max_recovery_time == 40.0
@@ -1,7 +1,11 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from telegram import Update
 from telegram.ext import ContextTypes
+from benchmarks.fake_telegram import FakeTelegramServer
+from whatsapp2telegram.digest import DIGEST, DigestPolicy
+from whatsapp2telegram.models import Media, Message
 from whatsapp2telegram.telegram_bot import TelegramBot
 
 
@@ -24,6 +28,7 @@ async def test_start(telegram_bot: TelegramBot):
     telegram_bot.application.initialize.assert_called_once()
     telegram_bot.application.start.assert_called_once()
     telegram_bot.application.updater.start_polling.assert_called_once()
+    await asyncio.wait_for(telegram_bot.wait_started(), 1)
 
 
 @pytest.mark.asyncio
@@ -55,20 +60,24 @@ async def test_handle_message(telegram_bot: TelegramBot):
     update = MagicMock(spec=Update)
     update.message.chat.id = int(telegram_bot.chat_id)
     update.message.text = "Test reply"
+    update.message.reply_to_message.message_id = 7
     update.message.reply_to_message.text = "From: TestChat\nOriginal message"
     context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
 
     await telegram_bot._handle_message(update, context)  # type: ignore
 
     assert len(telegram_bot.replies) == 1
-    assert telegram_bot.replies[0] == {"chat": "TestChat", "text": "Test reply"}
+    assert telegram_bot.replies.get_nowait() == (
+        1,
+        {"chat": "TestChat", "text": "Test reply"},
+    )
 
 
 @pytest.mark.asyncio
 async def test_forward_message(telegram_bot: TelegramBot):
     mock_bot = AsyncMock()
     telegram_bot.application.bot = mock_bot
-    message = {"chat": "TestChat", "text": "Test message"}
+    message = Message.parse("TestChat", "Test message")
 
     await telegram_bot.forward_message(message)
 
@@ -77,6 +86,22 @@ async def test_forward_message(telegram_bot: TelegramBot):
     )
 
 
+@pytest.mark.asyncio
+async def test_group_message_names_its_sender(telegram_bot: TelegramBot):
+    mock_bot = AsyncMock()
+    telegram_bot.application.bot = mock_bot
+    message = Message.parse(
+        "Team", "Hi all", "false_1@g.us_A_2@c.us", "[09:30, 17/10/2026] Bob: "
+    )
+
+    await telegram_bot.queue_message(message)
+    await telegram_bot.delivery.close()
+
+    mock_bot.send_message.assert_called_once_with(
+        chat_id=telegram_bot.chat_id, text="From: Team\nMessage:\nBob: Hi all"
+    )
+
+
 @pytest.mark.asyncio
 async def test_send_qr_code(telegram_bot: TelegramBot):
     mock_bot = AsyncMock()
@@ -92,16 +117,159 @@ async def test_send_qr_code(telegram_bot: TelegramBot):
     )
 
 
-def test_get_replies(telegram_bot: TelegramBot):
-    telegram_bot.replies = [
-        {"chat": "TestChat1", "text": "Test1"},
-        {"chat": "TestChat2", "text": "Test2"},
+@pytest.mark.asyncio
+async def test_replies_are_consumed_as_they_arrive(telegram_bot: TelegramBot):
+    consumer = asyncio.create_task(telegram_bot.replies.get())
+    await asyncio.sleep(0)
+
+    telegram_bot.replies.put({"chat": "TestChat1", "text": "Test1"})
+    reply_id, reply = await asyncio.wait_for(consumer, 1)
+    telegram_bot.replies.ack(reply_id)
+
+    assert reply == {"chat": "TestChat1", "text": "Test1"}
+    assert len(telegram_bot.replies) == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_message(telegram_bot: TelegramBot):
+    mock_bot = AsyncMock()
+    telegram_bot.application.bot = mock_bot
+
+    await telegram_bot.queue_message(Message.parse("TestChat", "Test message"))
+    await telegram_bot.delivery.close()
+
+    mock_bot.send_message.assert_called_once_with(
+        chat_id=telegram_bot.chat_id, text="From: TestChat\nMessage:\nTest message"
+    )
+
+
+@pytest.mark.asyncio
+async def test_handle_message_routes_replies_by_chat(telegram_bot: TelegramBot):
+    telegram_bot.add_chat("789")
+    update = MagicMock(spec=Update)
+    update.message.chat.id = 789
+    update.message.text = "Test reply"
+    update.message.reply_to_message.message_id = 7
+    update.message.reply_to_message.text = "From: TestChat\nOriginal message"
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+
+    await telegram_bot._handle_message(update, context)  # type: ignore
+    update.message.chat.id = 555
+    await telegram_bot._handle_message(update, context)  # type: ignore
+
+    assert len(telegram_bot.replies) == 0
+    assert len(telegram_bot.reply_queues["789"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_round_trip_against_bot_api_server():
+    server = FakeTelegramServer(retry_after=0)
+    server.start()
+    telegram_bot = TelegramBot("0:test", "42", base_url=server.base_url)
+    try:
+        await telegram_bot.start()
+        server.reject_next = 1
+        server.queue_reply(42, "From: TestChat\nMessage:\nHello", "Hi back")
+
+        await asyncio.wait_for(
+            telegram_bot.queue_message(Message.parse("TestChat", "Hello")), 5
+        )
+        reply = await asyncio.wait_for(telegram_bot.replies.get(), 5)
+    finally:
+        await telegram_bot.stop()
+        server.stop()
+
+    assert server.rejected == 1
+    assert [r.params["text"] for r in server.sent_messages()] == [
+        "From: TestChat\nMessage:\nHello"
     ]
+    assert reply[1] == {"chat": "TestChat", "text": "Hi back"}
+
+
+@pytest.mark.asyncio
+async def test_repeated_media_is_sent_by_file_id():
+    server = FakeTelegramServer()
+    server.start()
+    telegram_bot = TelegramBot("0:test", "42", base_url=server.base_url)
+    content_hash = telegram_bot.media_cache.put_blob(b"\x89PNG fake image")
+    message = Message.parse("TestChat", "", media=Media("photo", content_hash))
+    try:
+        await asyncio.wait_for(telegram_bot.queue_message(message), 5)
+        await asyncio.wait_for(telegram_bot.queue_message(message), 5)
+    finally:
+        await telegram_bot.delivery.close()
+        server.stop()
+
+    photos = [r for r in server.received if r.method == "sendPhoto"]
+    assert len(photos) == 2
+    assert photos[1].params["photo"] == "file-1"
+    assert telegram_bot.media_cache.uploads == 1
+    assert telegram_bot.media_cache.hits == 1
 
-    replies = telegram_bot.get_replies()
 
-    assert replies == [
-        {"chat": "TestChat1", "text": "Test1"},
-        {"chat": "TestChat2", "text": "Test2"},
+@pytest.mark.asyncio
+async def test_reply_is_routed_through_reply_map(telegram_bot: TelegramBot):
+    mock_bot = AsyncMock()
+    mock_bot.send_message.return_value = MagicMock(message_id=5)
+    telegram_bot.application.bot = mock_bot
+    await telegram_bot.queue_message(
+        Message.parse("Team: Alpha", "Hello", "false_1@g.us_A")
+    )
+    await telegram_bot.delivery.close()
+
+    update = MagicMock(spec=Update)
+    update.message.chat.id = int(telegram_bot.chat_id)
+    update.message.text = "Test reply"
+    update.message.reply_to_message.message_id = 5
+    update.message.reply_to_message.text = None
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    await telegram_bot._handle_message(update, context)  # type: ignore
+
+    assert telegram_bot.replies.get_nowait() == (
+        1,
+        {"chat": "Team: Alpha", "text": "Test reply", "quote": "false_1@g.us_A"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_unmapped_reply_falls_back_to_header(telegram_bot: TelegramBot):
+    update = MagicMock(spec=Update)
+    update.message.chat.id = int(telegram_bot.chat_id)
+    update.message.text = "Test reply"
+    update.message.reply_to_message.message_id = 5
+    update.message.reply_to_message.text = "From: Team: Alpha\nMessage:\nHello"
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+
+    await telegram_bot._handle_message(update, context)  # type: ignore
+
+    assert telegram_bot.replies.get_nowait() == (
+        1,
+        {"chat": "Team: Alpha", "text": "Test reply"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_media_in_a_digest_chat_follows_the_open_digest(
+    telegram_bot: TelegramBot,
+):
+    calls: list[str] = []
+    telegram_bot.digests.policy = DigestPolicy({"Noisy": DIGEST})
+    telegram_bot.delivery.send = AsyncMock(
+        side_effect=lambda chat_id, text: calls.append(text)
+    )
+    telegram_bot.delivery.send_media = AsyncMock(
+        side_effect=lambda chat_id, caption, media: calls.append(media.type)
+    )
+    photo = Message.parse("Noisy", "", media=Media("photo", "abc"))
+
+    futures = [
+        telegram_bot.queue_message(Message.parse("Noisy", "a")),
+        telegram_bot.queue_message(Message.parse("Noisy", "b")),
+        telegram_bot.queue_message(photo),
     ]
-    assert telegram_bot.replies == []
+    await asyncio.wait_for(asyncio.gather(*futures), 5)
+    await telegram_bot.digests.stop()
+    await telegram_bot.delivery.close()
+
+    assert calls == ["From: Noisy\nMessage:\na\nb", "photo"]
+    assert telegram_bot.digests.digested == 2
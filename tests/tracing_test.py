@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from whatsapp2telegram import tracing
+from whatsapp2telegram.driver_executor import DriverExecutor
+from whatsapp2telegram.metrics import RoundTripCounter
+
+
+@pytest.fixture
+def exporter(monkeypatch: pytest.MonkeyPatch) -> MagicMock:
+    exporter = MagicMock()
+    monkeypatch.setattr(tracing, "tracer", tracing.Tracer([exporter]))
+    return exporter
+
+
+def exported(exporter: MagicMock) -> dict[str, tracing.Span]:
+    tracing.tracer.flush()
+    return {span.name: span for span in exporter.export.call_args.args[0]}
+
+
+def test_spans_are_noops_without_exporters(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(tracing, "tracer", tracing.Tracer())
+
+    with tracing.span("cycle") as span:
+        span.set(messages=1)
+
+    assert span is tracing.NOOP_SPAN
+    assert not tracing.tracer.finished
+    assert not span.attributes
+
+
+@pytest.mark.asyncio
+async def test_driver_calls_nest_and_count_commands(exporter: MagicMock):
+    driver = MagicMock()
+    round_trips = RoundTripCounter(driver)
+    executor = DriverExecutor()
+
+    def read_chat():
+        with tracing.span("extract"):
+            driver.command_executor.execute("executeScript")
+        driver.command_executor.execute("findElement")
+
+    try:
+        with tracing.span("cycle"):
+            await executor.run(read_chat)
+        driver.command_executor.execute("outside any span")
+    finally:
+        executor.shutdown(wait=True)
+
+    spans = exported(exporter)
+    assert spans["extract"].parent is spans["cycle"]
+    assert spans["extract"].trace_id == spans["cycle"].trace_id
+    assert spans["extract"].round_trips == 1
+    assert spans["cycle"].round_trips == 2
+    assert round_trips.count == 3
+
+
+def test_span_records_errors(exporter: MagicMock):
+    with pytest.raises(ValueError):
+        with tracing.span("telegram_send", chat_id="1"):
+            raise ValueError("boom")
+
+    span = exported(exporter)["telegram_send"]
+    assert span.attributes == {"chat_id": "1", "error": "ValueError"}
+    assert span.end_ns >= span.start_ns > 0
+
+
+def test_reentered_span_is_current_only_inside(exporter: MagicMock):
+    cycle = tracing.start("cycle")
+    with cycle:
+        with tracing.span("scan"):
+            pass
+    with tracing.span("consumer"):
+        pass
+    cycle.end()
+
+    spans = exported(exporter)
+    assert spans["scan"].parent is cycle
+    assert spans["consumer"].parent is None
+
+
+def test_jsonl_exporter_writes_one_span_per_line(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    tracer = tracing.Tracer([tracing.JsonlExporter(str(path))])
+    with tracer.span("cycle", mode="push"):
+        with tracer.span("drain"):
+            pass
+    tracer.flush()
+
+    drain, cycle = [json.loads(line) for line in path.read_text().splitlines()]
+    assert drain["parent_span_id"] == cycle["span_id"]
+    assert cycle["parent_span_id"] is None
+    assert cycle["attributes"] == {"mode": "push", "webdriver.commands": 0}
+    assert tracer.exported == 2
+
+
+def test_otlp_payload_follows_the_json_encoding():
+    tracer = tracing.Tracer([MagicMock()])
+    with tracer.span("driver_restart", warm=True) as span:
+        pass
+
+    payload = tracing.OtlpExporter("http://collector:4318/").payload([span])
+
+    assert tracing.OtlpExporter("http://collector:4318/").url == (
+        "http://collector:4318/v1/traces"
+    )
+    [otlp_span] = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert otlp_span["traceId"] == span.trace_id and len(span.trace_id) == 32
+    assert otlp_span["startTimeUnixNano"] == str(span.start_ns)
+    assert {"key": "warm", "value": {"boolValue": True}} in otlp_span["attributes"]
+    assert {
+        "key": "webdriver.commands",
+        "value": {"intValue": "0"},
+    } in otlp_span["attributes"]
+
+
+def test_profiler_writes_folded_stacks(tmp_path):
+    profiler = tracing.SamplingProfiler(str(tmp_path), interval=0.001)
+    done = threading.Event()
+
+    def busy_worker():
+        while not done.is_set():
+            time.sleep(0.001)
+
+    worker = threading.Thread(target=busy_worker, name="busy")
+    worker.start()
+    try:
+        assert profiler.toggle() is None
+        time.sleep(0.1)
+        path = profiler.toggle()
+    finally:
+        done.set()
+        worker.join()
+
+    assert path is not None and not profiler.running
+    lines = open(path).read().splitlines()
+    assert profiler.samples > 0
+    assert any(
+        line.startswith("busy;") and "busy_worker" in line
+        for line in lines
+    )
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
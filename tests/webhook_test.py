@@ -0,0 +1,101 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock
+from benchmarks.fake_telegram import FakeTelegramServer
+from whatsapp2telegram.status_server import Request, StatusServer
+from whatsapp2telegram.telegram_bot import TelegramBot
+from whatsapp2telegram.webhook import (
+    FORWARDED_HEADER,
+    SECRET_HEADER,
+    WebhookReceiver,
+    update_chat_id,
+)
+
+
+def update(chat_id: int) -> dict:
+    return {
+        "update_id": 1,
+        "message": {"message_id": 1, "date": 0, "chat": {"id": chat_id}},
+    }
+
+
+def post(body: dict, headers: dict[str, str]) -> Request:
+    return Request("POST", "/telegram", headers, json.dumps(body).encode())
+
+
+def test_update_chat_id():
+    assert update_chat_id(update(42)) == "42"
+    assert update_chat_id({"update_id": 1, "callback_query": {}}) is None
+
+
+@pytest.mark.asyncio
+async def test_rejects_wrong_secret():
+    telegram_bot = AsyncMock()
+    receiver = WebhookReceiver(telegram_bot, "secret")
+
+    response = await receiver.handle(post(update(42), {SECRET_HEADER: "guess"}))
+
+    assert response.status == 403
+    telegram_bot.receive_update.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_passes_update_on_to_serving_replica():
+    peer_bot = AsyncMock()
+    peer = StatusServer("127.0.0.1", 0)
+    peer.route("POST", "/telegram", WebhookReceiver(peer_bot, "secret").handle)
+    await peer.start()
+    local_bot = AsyncMock()
+    receiver = WebhookReceiver(
+        local_bot,
+        "secret",
+        chat_replicas={"42": 1, "7": 0},
+        replica_index=0,
+        peer_url=f"http://127.0.0.1:{peer.port}/telegram?replica={{replica}}",
+    )
+    try:
+        forwarded = await receiver.handle(post(update(42), {SECRET_HEADER: "secret"}))
+        local = await receiver.handle(post(update(7), {SECRET_HEADER: "secret"}))
+        looped = await receiver.handle(
+            post(update(42), {SECRET_HEADER: "secret", FORWARDED_HEADER: "1"})
+        )
+    finally:
+        await receiver.close()
+        await peer.stop()
+
+    assert (forwarded.status, local.status, looped.status) == (200, 200, 200)
+    peer_bot.receive_update.assert_called_once_with(update(42))
+    assert local_bot.receive_update.call_count == 2
+    assert receiver.forwarded == 1
+
+
+@pytest.mark.asyncio
+async def test_replies_arrive_through_webhook():
+    telegram = FakeTelegramServer()
+    telegram.start()
+    server = StatusServer("127.0.0.1", 0)
+    await server.start()
+    telegram_bot = TelegramBot(
+        "0:test",
+        "42",
+        base_url=telegram.base_url,
+        webhook_url=f"http://127.0.0.1:{server.port}/telegram",
+        webhook_secret="secret",
+    )
+    server.route("POST", "/telegram", WebhookReceiver(telegram_bot, "secret").handle)
+    try:
+        await telegram_bot.start()
+        telegram.queue_reply(42, "From: TestChat\nMessage:\nHello", "Hi back")
+
+        reply = await asyncio.wait_for(telegram_bot.replies.get(), 5)
+    finally:
+        await telegram_bot.stop()
+        await server.stop()
+        telegram.stop()
+
+    assert reply[1] == {"chat": "TestChat", "text": "Hi back"}
+    assert telegram.webhook == (f"http://127.0.0.1:{server.port}/telegram", "secret")
+    assert telegram.webhook_responses == [200]
+    # Polling would have cleared the webhook first.
+    assert "deleteWebhook" not in [r.method for r in telegram.received]
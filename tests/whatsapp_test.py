@@ -1,7 +1,10 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.common.exceptions import WebDriverException
+from whatsapp2telegram import scripts
+from whatsapp2telegram.models import Message
 from whatsapp2telegram.whatsapp import WhatsAppClient
 from whatsapp2telegram.telegram_bot import TelegramBot
 from selenium.webdriver.common.keys import Keys
@@ -22,13 +25,36 @@ async def test_start(whatsapp_client: WhatsAppClient):
     with patch("whatsapp2telegram.whatsapp.webdriver.Chrome") as mock_chrome:
         mock_driver = MagicMock()
         mock_chrome.return_value = mock_driver
-        whatsapp_client._is_authenticated = MagicMock(return_value=True)  # type: ignore
+        mock_driver.execute_script.return_value = "chats"
+        whatsapp_client._authenticate = AsyncMock()  # type: ignore
 
         await whatsapp_client.start()
 
         mock_chrome.assert_called_once()
         mock_driver.get.assert_called_once_with("https://web.whatsapp.com")
         assert whatsapp_client.driver == mock_driver
+        assert whatsapp_client.authenticated is True
+        whatsapp_client._authenticate.assert_not_called()  # type: ignore
+        assert set(whatsapp_client.startup.phases) == {"chrome", "chat_list"}
+
+
+@pytest.mark.asyncio
+async def test_start_restores_the_snapshot_before_chrome(
+    mock_telegram_bot: TelegramBot, tmp_path
+):
+    snapshot = MagicMock()
+    profile = str(tmp_path / "profile")
+    whatsapp_client = WhatsAppClient(mock_telegram_bot, profile, snapshot=snapshot)
+    with patch("whatsapp2telegram.whatsapp.webdriver.Chrome") as mock_chrome:
+        mock_chrome.return_value.execute_script.return_value = "chats"
+        snapshot.restore.side_effect = lambda _: mock_chrome.assert_not_called()
+
+        await whatsapp_client.start()
+
+    snapshot.restore.assert_called_once_with(profile)
+    assert whatsapp_client.save_snapshot() is snapshot.save.return_value
+    snapshot.save.assert_called_once_with(profile)
+    assert "restore" in whatsapp_client.startup.phases
 
 
 @pytest.mark.asyncio
@@ -36,7 +62,7 @@ async def test_start_with_authentication(whatsapp_client: WhatsAppClient):
     with patch("whatsapp2telegram.whatsapp.webdriver.Chrome") as mock_chrome:
         mock_driver = MagicMock()
         mock_chrome.return_value = mock_driver
-        whatsapp_client._is_authenticated = MagicMock(side_effect=[False, True])  # type: ignore
+        mock_driver.execute_script.return_value = "qr"
         whatsapp_client._authenticate = AsyncMock()  # type: ignore
 
         await whatsapp_client.start()
@@ -116,6 +142,10 @@ async def test_send_message(whatsapp_client: WhatsAppClient):
     mock_driver = MagicMock()
     whatsapp_client.driver = mock_driver
 
+    mock_driver.execute_script.side_effect = lambda script, *args: (
+        None if script == scripts.FIND_CHAT_ROW else True
+    )
+
     mock_search_box = MagicMock(spec=WebElement)
     mock_message_box = MagicMock(spec=WebElement)
     mock_driver.find_element.side_effect = [mock_search_box, mock_message_box]
@@ -126,3 +156,439 @@ async def test_send_message(whatsapp_client: WhatsAppClient):
     mock_search_box.send_keys.assert_any_call(Keys.ENTER)
     mock_message_box.send_keys.assert_any_call("Hello, World!")
     mock_message_box.send_keys.assert_any_call(Keys.ENTER)
+    mock_driver.refresh.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_send_message_opens_chat_from_directory(whatsapp_client: WhatsAppClient):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    whatsapp_client.navigation = MagicMock()
+    mock_row = MagicMock(spec=WebElement)
+    mock_message_box = MagicMock(spec=WebElement)
+    mock_driver.find_element.return_value = mock_message_box
+    whatsapp_client.directory.update("Test Chat", "1@c.us", 640)
+    mock_driver.execute_script.side_effect = [
+        {"row": mock_row, "position": 600},
+        {"jid": "1@c.us"},
+        None,
+    ]
+
+    assert await whatsapp_client.send_message("Test Chat", "Hello") is True
+
+    mock_driver.execute_script.assert_any_call(scripts.FIND_CHAT_ROW, "Test Chat", 640)
+    mock_row.click.assert_called_once()
+    mock_driver.find_element.assert_called_once()
+    mock_message_box.send_keys.assert_any_call("Hello")
+    assert whatsapp_client.directory.find("Test Chat").position == 600
+
+
+@pytest.mark.asyncio
+async def test_send_message_searches_when_row_is_another_chat(
+    whatsapp_client: WhatsAppClient,
+):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    whatsapp_client.navigation = MagicMock()
+    mock_search_box = MagicMock(spec=WebElement)
+    mock_driver.find_element.side_effect = [
+        mock_search_box,
+        MagicMock(spec=WebElement),
+    ]
+    mock_driver.execute_script.side_effect = [
+        {"row": MagicMock(spec=WebElement), "position": 0},
+        {"jid": "2@c.us"},
+        None,
+        None,
+        False,
+        None,
+    ]
+
+    with patch("whatsapp2telegram.whatsapp.time.sleep"):
+        assert await whatsapp_client.send_message("Twin", "Hi", "true_1@c.us_AB") is True
+
+    mock_search_box.send_keys.assert_any_call("Twin")
+
+
+@pytest.mark.asyncio
+async def test_send_message_succeeds_when_navigation_fails(
+    whatsapp_client: WhatsAppClient,
+):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    mock_driver.execute_script.side_effect = lambda script, *args: (
+        None if script == scripts.FIND_CHAT_ROW else True
+    )
+    mock_driver.find_element.side_effect = [
+        MagicMock(spec=WebElement),
+        MagicMock(spec=WebElement),
+    ]
+    whatsapp_client.navigation.return_to_chat_list = MagicMock(  # type: ignore
+        side_effect=WebDriverException()
+    )
+    whatsapp_client._restart = AsyncMock()  # type: ignore
+
+    assert await whatsapp_client.send_message("Test Chat", "Hello") is True
+    whatsapp_client._restart.assert_not_called()  # type: ignore
+    assert whatsapp_client.navigation.needs_recovery is True
+
+
+@pytest.mark.asyncio
+async def test_get_pushed_messages(whatsapp_client: WhatsAppClient):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    mock_driver.execute_script.return_value = [
+        {
+            "type": "message",
+            "chat": "Test Chat",
+            "id": "false_1",
+            "pre": "[12:00, 17/10/2026] Bob: ",
+            "text": "Hi",
+        }
+    ]
+
+    messages = await whatsapp_client.get_pushed_messages()
+
+    assert messages == [
+        Message.parse("Test Chat", "Hi", "false_1", "[12:00, 17/10/2026] Bob: ")
+    ]
+    assert messages[0].sender == "Bob"
+    mock_driver.execute_script.assert_called_once()
+    mock_driver.find_elements.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_pushed_messages_reads_unread_chat(whatsapp_client: WhatsAppClient):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    mock_row = MagicMock(spec=WebElement)
+    mock_driver.execute_script.side_effect = [
+        [{"type": "unread", "chat": "Test Chat", "count": 1}],
+        {"row": mock_row, "position": 0},
+        None,
+    ]
+    whatsapp_client._read_open_chat = MagicMock(  # type: ignore
+        return_value=[Message.parse("Test Chat", "Unread")]
+    )
+
+    with patch("whatsapp2telegram.whatsapp.time.sleep"):
+        messages = await whatsapp_client.get_pushed_messages()
+
+    assert messages == [Message.parse("Test Chat", "Unread")]
+    mock_row.click.assert_called_once()
+    whatsapp_client._read_open_chat.assert_called_once_with(1)  # type: ignore
+    assert mock_driver.execute_script.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_get_pushed_messages_not_authenticated(whatsapp_client: WhatsAppClient):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    mock_driver.execute_script.return_value = None
+    whatsapp_client._is_authenticated = MagicMock(return_value=False)  # type: ignore
+    whatsapp_client._authenticate = AsyncMock()  # type: ignore
+
+    messages = await whatsapp_client.get_pushed_messages()
+
+    assert messages == []
+    whatsapp_client._authenticate.assert_called_once()  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_get_new_messages_batched(whatsapp_client: WhatsAppClient):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    whatsapp_client._is_authenticated = MagicMock(return_value=True)  # type: ignore
+    mock_row = MagicMock(spec=WebElement)
+    mock_driver.execute_script.side_effect = [
+        [{"chat": "Test Chat", "count": 2}],
+        {"row": mock_row, "position": 0},
+        {
+            "chat": "Test Chat",
+            "messages": [
+                {"id": "false_1", "pre": "[12:00] Bob: ", "text": "First"},
+                {"id": "false_2", "pre": None, "text": "Second"},
+            ],
+        },
+        None,
+        True,
+    ]
+
+    with patch("whatsapp2telegram.whatsapp.time.sleep"):
+        messages = await whatsapp_client.get_new_messages()
+
+    assert messages == [
+        Message.parse("Test Chat", "First", "false_1", "[12:00] Bob: "),
+        Message.parse("Test Chat", "Second", "false_2"),
+    ]
+    assert mock_driver.execute_script.call_count == 5
+    mock_driver.refresh.assert_not_called()
+    assert whatsapp_client.navigation.reloads_avoided == 1
+    assert mock_driver.execute_script.call_args_list[3].args[1] == [
+        "false_1",
+        "false_2",
+    ]
+    mock_driver.find_elements.assert_not_called()
+    mock_row.click.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_send_message_reports_failure(whatsapp_client: WhatsAppClient):
+    whatsapp_client.driver = MagicMock()
+    whatsapp_client._send_message = MagicMock(side_effect=WebDriverException())  # type: ignore
+    whatsapp_client._restart = AsyncMock()  # type: ignore
+
+    assert await whatsapp_client.send_message("Test Chat", "Hello") is False
+    whatsapp_client._restart.assert_called_once()  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_get_pushed_messages_retries_missing_chat(whatsapp_client: WhatsAppClient):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    mock_driver.execute_script.side_effect = [
+        [{"type": "unread", "chat": "Hidden Chat", "count": 1}],
+        None,
+        None,
+        None,
+    ]
+
+    messages = await whatsapp_client.get_pushed_messages()
+
+    assert messages == []
+    retry_call = mock_driver.execute_script.call_args_list[2]
+    assert "retry" in retry_call.args[0]
+    assert retry_call.args[1] == "Hidden Chat"
+
+
+@pytest.mark.asyncio
+async def test_get_pushed_messages_salvages_on_driver_failure(
+    whatsapp_client: WhatsAppClient,
+):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    mock_driver.execute_script.side_effect = [
+        [
+            {"type": "message", "chat": "A", "id": "false_1", "pre": "", "text": "Hi"},
+            {"type": "unread", "chat": "B", "count": 1},
+        ],
+        WebDriverException(),
+        WebDriverException(),
+    ]
+    whatsapp_client._restart = AsyncMock()  # type: ignore
+
+    messages = await whatsapp_client.get_pushed_messages()
+
+    assert messages == [Message.parse("A", "Hi", "false_1")]
+    whatsapp_client._restart.assert_called_once()  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_concurrent_failures_restart_once(whatsapp_client: WhatsAppClient):
+    whatsapp_client.driver = MagicMock()
+    whatsapp_client._launch = MagicMock()  # type: ignore
+    whatsapp_client._wait_for_startup = MagicMock(return_value="chats")  # type: ignore
+    generation = whatsapp_client.generation
+
+    await asyncio.gather(
+        whatsapp_client._restart(generation), whatsapp_client._restart(generation)
+    )
+
+    whatsapp_client._launch.assert_called_once()  # type: ignore
+    assert whatsapp_client.generation == generation + 1
+
+
+@pytest.mark.asyncio
+async def test_restart_promotes_standby(whatsapp_client: WhatsAppClient):
+    standby = MagicMock()
+    whatsapp_client.supervisor.promote = MagicMock(return_value=standby)  # type: ignore
+    whatsapp_client.start = AsyncMock()  # type: ignore
+    whatsapp_client._is_authenticated = MagicMock(return_value=True)  # type: ignore
+    whatsapp_client.navigation.needs_recovery = True
+    generation = whatsapp_client.generation
+
+    await whatsapp_client._restart(generation)
+
+    whatsapp_client.start.assert_not_called()  # type: ignore
+    assert whatsapp_client.driver is standby
+    assert whatsapp_client.generation == generation + 1
+    assert whatsapp_client.navigation.needs_recovery is False
+    assert whatsapp_client.supervisor.recoveries == 1
+    assert whatsapp_client.supervisor.cold_restarts == 0
+
+
+@pytest.mark.asyncio
+async def test_get_pushed_messages_defers_chats_over_budget(
+    whatsapp_client: WhatsAppClient,
+):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    whatsapp_client.scheduler.max_messages_per_cycle = 5
+    mock_driver.execute_script.return_value = [
+        {"type": "unread", "chat": "Huge group", "count": 50},
+        {"type": "unread", "chat": "Friend", "count": 1},
+    ]
+    whatsapp_client._read_unread_chat = MagicMock(return_value=[])  # type: ignore
+
+    await whatsapp_client.get_pushed_messages()
+
+    whatsapp_client._read_unread_chat.assert_called_once_with("Friend", 1)  # type: ignore
+    mock_driver.execute_script.assert_called_with(
+        scripts.RETRY_UNREAD_CHAT, "Huge group"
+    )
+
+
+def test_fetch_media_reads_blob_in_chunks(whatsapp_client: WhatsAppClient):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    mock_driver.execute_async_script.return_value = 5
+    mock_driver.execute_script.side_effect = ["aGVs", "bG8=", None]
+
+    with patch("whatsapp2telegram.whatsapp.MEDIA_CHUNK_SIZE", 3):
+        assert whatsapp_client._fetch_media("blob:x") == b"hello"
+
+    assert mock_driver.execute_script.call_args_list[1].args[2] == 3
+    mock_driver.execute_script.assert_called_with(scripts.RELEASE_BLOB, "blob:x")
+
+
+def test_media_is_attached_by_content_hash(whatsapp_client: WhatsAppClient):
+    whatsapp_client._fetch_media = MagicMock(return_value=b"image")  # type: ignore
+    message = Message.parse("TestChat", "", "false_1")
+
+    message = whatsapp_client._attach_media(
+        message, {"url": "blob:x", "type": "photo", "filename": ""}
+    )
+
+    assert message.media is not None
+    assert message.media.type == "photo"
+    assert whatsapp_client.media_cache.get_blob(message.media.hash) == b"image"
+
+
+def test_failed_media_download_is_noted(whatsapp_client: WhatsAppClient):
+    whatsapp_client._fetch_media = MagicMock(return_value=None)  # type: ignore
+    message = Message.parse("TestChat", "Look", "false_1")
+
+    message = whatsapp_client._attach_media(
+        message, {"url": "blob:x", "type": "photo", "filename": ""}
+    )
+
+    assert message.text == "Look\n[photo could not be forwarded]"
+    assert message.media is None
+
+
+@pytest.mark.asyncio
+async def test_send_message_quotes_original(whatsapp_client: WhatsAppClient):
+    mock_driver = MagicMock()
+    whatsapp_client.driver = mock_driver
+    mock_driver.find_element.side_effect = [
+        MagicMock(spec=WebElement),
+        MagicMock(spec=WebElement),
+    ]
+    mock_driver.execute_script.return_value = False
+    whatsapp_client.navigation = MagicMock()
+
+    assert await whatsapp_client.send_message("Chat", "Hi", "false_1") is True
+
+    mock_driver.execute_script.assert_any_call(scripts.OPEN_MESSAGE_MENU, "false_1")
+
+
+@pytest.mark.asyncio
+async def test_supervise_recycles_tab_over_memory_limit(
+    whatsapp_client: WhatsAppClient,
+):
+    whatsapp_client.driver = MagicMock()
+    whatsapp_client.supervisor = MagicMock()
+    whatsapp_client.supervisor.probe.return_value = True
+    whatsapp_client.supervisor.ensure_standby = AsyncMock(
+        side_effect=asyncio.CancelledError
+    )
+    whatsapp_client.browser = MagicMock()
+    whatsapp_client.browser.needs_recycling.return_value = True
+    whatsapp_client._is_authenticated = MagicMock(return_value=True)  # type: ignore
+
+    with pytest.raises(asyncio.CancelledError):
+        await whatsapp_client.supervise(0)
+
+    whatsapp_client.browser.recycle_tab.assert_called_once()
+    assert whatsapp_client.tab_recycles == 1
+
+
+@pytest.mark.asyncio
+async def test_send_messages_opens_each_chat_once(whatsapp_client: WhatsAppClient):
+    whatsapp_client.driver = MagicMock()
+    whatsapp_client.navigation = MagicMock()
+    whatsapp_client._open_chat = MagicMock(return_value=True)  # type: ignore
+    mock_message_box = MagicMock(spec=WebElement)
+    whatsapp_client.driver.find_element.return_value = mock_message_box
+
+    results = await whatsapp_client.send_messages(
+        [
+            {"chat": "A", "text": "first"},
+            {"chat": "B", "text": "other"},
+            {"chat": "A", "text": "line 1\nline 2"},
+        ]
+    )
+
+    assert results == [True, True, True]
+    assert [c.args[0] for c in whatsapp_client._open_chat.call_args_list] == ["A", "B"]  # type: ignore
+    typed = [c.args[0] for c in mock_message_box.send_keys.call_args_list]
+    assert typed == [
+        "first",
+        Keys.ENTER,
+        "line 1" + Keys.SHIFT + Keys.ENTER + Keys.NULL + "line 2",
+        Keys.ENTER,
+        "other",
+        Keys.ENTER,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_send_messages_reports_partial_failure(whatsapp_client: WhatsAppClient):
+    whatsapp_client.driver = MagicMock()
+    whatsapp_client.navigation = MagicMock()
+    whatsapp_client._open_chat = MagicMock(return_value=True)  # type: ignore
+    whatsapp_client._restart = AsyncMock()  # type: ignore
+    mock_message_box = MagicMock(spec=WebElement)
+    mock_message_box.send_keys.side_effect = [None, None, WebDriverException()]
+    whatsapp_client.driver.find_element.return_value = mock_message_box
+
+    results = await whatsapp_client.send_messages(
+        [{"chat": "A", "text": "sent"}, {"chat": "A", "text": "lost"}]
+    )
+
+    assert results == [True, False]
+    whatsapp_client._restart.assert_called_once()  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_backfill_page_reads_history_after_checkpoint(
+    whatsapp_client: WhatsAppClient,
+):
+    whatsapp_client.driver = MagicMock()
+    whatsapp_client.navigation = MagicMock()
+    whatsapp_client._open_chat = MagicMock(return_value=True)  # type: ignore
+    whatsapp_client.driver.execute_async_script.return_value = {"found": True}
+    whatsapp_client.driver.execute_script.side_effect = lambda script, *a: (
+        {
+            "chat": "Test Chat",
+            "found": True,
+            "messages": [{"id": "false_1@c.us_B", "pre": "[10:01]", "text": "Hi"}],
+            "newest": "false_1@c.us_Z",
+            "complete": False,
+        }
+        if script == scripts.EXTRACT_AFTER
+        else None
+    )
+
+    page = await whatsapp_client.backfill_page("Test Chat", "false_1@c.us_A", 100, 40)
+
+    assert page is not None
+    assert page.messages == [
+        Message.parse("Test Chat", "Hi", "false_1@c.us_B", "[10:01]")
+    ]
+    assert page.found is True and page.complete is False
+    whatsapp_client._open_chat.assert_called_once_with("Test Chat", "1@c.us")  # type: ignore
+    whatsapp_client.driver.execute_script.assert_any_call(
+        scripts.BASELINE_OPEN_CHAT, ["false_1@c.us_Z"]
+    )
+    whatsapp_client.navigation.return_to_chat_list.assert_called_once()
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Account:
+    name: str
+    telegram_chat_id: str
+    user_data_dir: str
+    state_dir: str
+
+
+# Reads the accounts served by the bridge from a JSON file:
+#
+#   [{"name": "work", "telegram_chat_id": "-100123",
+#     "user_data_dir": "/data/work/profile"}, ...]
+#
+# `user_data_dir` is optional; every account gets its own Chrome profile and
+# state directory, since two WhatsApp identities can never share a profile.
+def load_accounts(path: str, profiles_dir: str, state_dir: str) -> list[Account]:
+    with open(path) as f:
+        entries = json.load(f)
+    accounts: list[Account] = []
+    names: set[str] = set()
+    chat_ids: set[str] = set()
+    for entry in entries:
+        name = entry.get("name")
+        chat_id = entry.get("telegram_chat_id")
+        if not name or chat_id in (None, ""):
+            raise ValueError(
+                f"Every account in {path} needs a name and a telegram_chat_id."
+            )
+        if name in names:
+            raise ValueError(f"Duplicate account name '{name}' in {path}.")
+        if str(chat_id) in chat_ids:
+            # Replies are routed back to WhatsApp by Telegram chat.
+            raise ValueError(f"Telegram chat {chat_id} is used by two accounts.")
+        names.add(name)
+        chat_ids.add(str(chat_id))
+        accounts.append(
+            Account(
+                name=name,
+                telegram_chat_id=str(chat_id),
+                user_data_dir=entry.get("user_data_dir")
+                or os.path.join(profiles_dir, name),
+                state_dir=os.path.join(state_dir, name),
+            )
+        )
+    return accounts
+
+
+def assign_replica(name: str, replica_count: int) -> int:
+    # Rendezvous hashing: every replica scores every account and the highest
+    # score wins, so changing the replica count only moves the accounts of
+    # the replicas added or removed.
+    def score(replica: int) -> bytes:
+        return hashlib.blake2b(f"{name}\0{replica}".encode(), digest_size=8).digest()
+
+    return max(range(replica_count), key=score)
+
+
+def accounts_for_replica(
+    accounts: list[Account], replica_index: int, replica_count: int
+) -> list[Account]:
+    if not 0 <= replica_index < replica_count:
+        raise ValueError(
+            f"REPLICA_INDEX must be between 0 and {replica_count - 1}, "
+            f"got {replica_index}."
+        )
+    return [
+        account
+        for account in accounts
+        if assign_replica(account.name, replica_count) == replica_index
+    ]
+
+
+def replica_index_from_hostname(hostname: str) -> int | None:
+    # StatefulSet pods are named <statefulset>-<ordinal>.
+    _, _, ordinal = hostname.rpartition("-")
+    return int(ordinal) if ordinal.isdigit() else None
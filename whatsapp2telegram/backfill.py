@@ -0,0 +1,164 @@
+import asyncio
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from whatsapp2telegram.message_index import MessageIndex
+from whatsapp2telegram.models import Message
+
+if TYPE_CHECKING:
+    from whatsapp2telegram.telegram_bot import TelegramBot
+    from whatsapp2telegram.whatsapp import WhatsAppClient
+
+# Consecutive failed pages after which a chat waits for the next start.
+MAX_PAGE_FAILURES = 3
+
+
+@dataclass
+class BackfillPage:
+    messages: list[Message] = field(default_factory=list)
+    # Whether the page starts right after the checkpoint. False means history
+    # could not be scrolled back that far and older messages were skipped.
+    found: bool = True
+    # Whether the page reaches the newest message of the chat.
+    complete: bool = True
+
+
+# Chats still to be caught up, each with the WhatsApp id of the last message
+# known to be forwarded. Rows are planned from the message index checkpoints
+# when the bridge starts and advance page by page, so a restart mid-backfill
+# resumes where it stopped rather than at the newest message, which live
+# forwarding has moved the checkpoint to in the meantime.
+class BackfillState:
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS backfill ("
+            " chat TEXT PRIMARY KEY,"
+            " since TEXT NOT NULL,"
+            " planned_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.db.commit()
+
+    def plan(self, checkpoints: dict[str, str]) -> int:
+        # Chats with an unfinished backfill keep their older checkpoint.
+        planned_at = time.time()
+        cursor = self.db.executemany(
+            "INSERT OR IGNORE INTO backfill VALUES (?, ?, ?)",
+            [(chat, since, planned_at) for chat, since in checkpoints.items()],
+        )
+        self.db.commit()
+        return cursor.rowcount
+
+    def chats(self) -> list[tuple[str, str]]:
+        return self.db.execute(
+            "SELECT chat, since FROM backfill ORDER BY planned_at, chat"
+        ).fetchall()
+
+    def advance(self, chat: str, since: str):
+        self.db.execute("UPDATE backfill SET since = ? WHERE chat = ?", (since, chat))
+        self.db.commit()
+
+    def finish(self, chat: str):
+        self.db.execute("DELETE FROM backfill WHERE chat = ?", (chat,))
+        self.db.commit()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM backfill").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+# Catches up on messages that arrived while the bridge was down, including
+# ones already read on the phone, which leave no unread badge behind. One chat
+# at a time, each page is a single driver call: open the chat, scroll history
+# back to the checkpoint, extract the next `page_size` messages in one DOM
+# pass and return to the chat list, so live ingestion and replies get the
+# driver between pages. Messages are submitted like live ones, and the next
+# page waits while more than `max_pending` are queued for Telegram, which
+# keeps memory bounded and leaves the rate to the delivery queue.
+class Backfill:
+    def __init__(
+        self,
+        whatsapp_client: "WhatsAppClient",
+        telegram_bot: "TelegramBot",
+        message_index: MessageIndex,
+        state: BackfillState,
+        submit: Callable[[Message], Awaitable[bool]],
+        page_size: int = 100,
+        max_scrolls: int = 40,
+        max_pending: int = 200,
+        pause: float = 1.0,
+    ):
+        self.whatsapp_client = whatsapp_client
+        self.telegram_bot = telegram_bot
+        self.message_index = message_index
+        self.state = state
+        self.submit = submit
+        self.page_size = page_size
+        self.max_scrolls = max_scrolls
+        self.max_pending = max_pending
+        self.pause = pause
+        self.pages = 0
+        self.forwarded = 0
+        self.gaps = 0
+
+    def plan(self) -> int:
+        # Call before live forwarding starts moving the checkpoints.
+        return self.state.plan(self.message_index.checkpoints())
+
+    async def run(self):
+        started = time.monotonic()
+        chats = self.state.chats()
+        if not chats:
+            return
+        print(f"[backfill] Catching up on {len(chats)} chats")
+        for chat, since in chats:
+            await self._backfill_chat(chat, since)
+        print(
+            f"[backfill] Done in {time.monotonic() - started:.0f}s: "
+            f"{self.forwarded} messages forwarded from {self.pages} pages"
+        )
+
+    async def _backfill_chat(self, chat: str, since: str):
+        failures = 0
+        while True:
+            await self._wait_for_capacity()
+            page = await self.whatsapp_client.backfill_page(
+                chat, since, self.page_size, self.max_scrolls
+            )
+            if page is None:
+                failures += 1
+                if failures >= MAX_PAGE_FAILURES:
+                    print(f"[backfill] Giving up on '{chat}' until restart")
+                    return
+                await asyncio.sleep(self.pause)
+                continue
+            failures = 0
+            self.pages += 1
+            if not page.found:
+                self.gaps += 1
+                print(f"[backfill] '{chat}': history before the page was skipped")
+            for message in page.messages:
+                if await self.submit(message):
+                    self.forwarded += 1
+            if page.messages:
+                # Submitted messages are in the outbox; the checkpoint may move.
+                since = page.messages[-1].id
+                self.state.advance(chat, since)
+            if page.complete or not page.messages:
+                self.state.finish(chat)
+                return
+            await asyncio.sleep(self.pause)
+
+    async def _wait_for_capacity(self):
+        while self.telegram_bot.delivery.pending > self.max_pending:
+            await asyncio.sleep(self.pause)
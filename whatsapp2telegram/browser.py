@@ -0,0 +1,92 @@
+from dataclasses import dataclass, field
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+# Requests text extraction never needs: profile pictures, web fonts and the
+# emoji and sticker artwork. Message media is downloaded by WhatsApp Web from
+# its media servers into blob: URLs, which stay unblocked, so media
+# forwarding still finds the files it reads.
+DEFAULT_BLOCKED_URLS = (
+    "*pps.whatsapp.net/*",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*/emoji/*",
+    "*.webp",
+)
+
+# Background work a headless bridge has no use for.
+LEAN_ARGUMENTS = (
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-domain-reliability",
+    "--disable-extensions",
+    "--disable-sync",
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--mute-audio",
+    "--no-first-run",
+    "--renderer-process-limit=2",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,"
+    "AutofillServerCommunication,CalculateNativeWinOcclusion",
+)
+
+
+# How Chrome is launched for WhatsApp Web. The full profile is what the
+# bridge always ran; the lean one packs more bridges per node: a smaller
+# viewport, no background services, a capped JavaScript heap and no
+# decorative downloads, with the tab recycled once Chrome grows past
+# `max_rss` bytes.
+@dataclass
+class BrowserProfile:
+    lean: bool = True
+    heap_mb: int = 512
+    max_rss: int = 1536 * 1024 * 1024
+    blocked_urls: tuple[str, ...] = field(default=DEFAULT_BLOCKED_URLS)
+
+    def options(self, user_data_dir: str | None = None) -> webdriver.ChromeOptions:
+        chrome_options = webdriver.ChromeOptions()
+        chrome_options.add_argument("--headless=new")  # type: ignore
+        chrome_options.add_argument("--lang=en")  # type: ignore
+        if user_data_dir:
+            chrome_options.add_argument(f"user-data-dir={user_data_dir}")  # type: ignore
+        if not self.lean:
+            chrome_options.add_argument("--window-size=1920,1080")  # type: ignore
+            return chrome_options
+        chrome_options.add_argument("--window-size=1280,720")  # type: ignore
+        for argument in LEAN_ARGUMENTS:
+            chrome_options.add_argument(argument)  # type: ignore
+        chrome_options.add_argument(  # type: ignore
+            f"--js-flags=--max-old-space-size={self.heap_mb}"
+        )
+        return chrome_options
+
+    def needs_recycling(self, rss: int) -> bool:
+        return self.lean and 0 < self.max_rss < rss
+
+    def apply(self, driver: WebDriver):
+        # Request blocking is set per tab, so call again after opening one.
+        if not self.lean or not self.blocked_urls:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})  # type: ignore
+            driver.execute_cdp_cmd(  # type: ignore
+                "Network.setBlockedURLs", {"urls": list(self.blocked_urls)}
+            )
+        except (AttributeError, WebDriverException) as e:
+            print(f"Warning: could not block requests: {e}")
+
+    def recycle_tab(self, driver: WebDriver, url: str):
+        # Moves WhatsApp Web to a fresh tab and closes the old one, which
+        # frees its renderer's heap. The login lives in the profile, so the
+        # new tab starts logged in.
+        old_handle = driver.current_window_handle
+        driver.switch_to.new_window("tab")
+        new_handle = driver.current_window_handle
+        self.apply(driver)
+        driver.get(url)
+        driver.switch_to.window(old_handle)
+        driver.close()
+        driver.switch_to.window(new_handle)
@@ -0,0 +1,57 @@
+import collections
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class ChatEntry:
+    name: str
+    # The chat's WhatsApp id, e.g. 4917612345678@c.us or 1203630@g.us.
+    jid: str | None
+    # Offset of the chat's row in the scrollable chat list, in pixels.
+    position: float | None
+    seen_at: float
+
+
+def jid_of(message_id: str) -> str | None:
+    # Message data-ids look like false_<jid>_<id>[_<participant>].
+    parts = message_id.split("_")
+    return parts[1] if len(parts) > 2 and "@" in parts[1] else None
+
+
+# Chats seen in the chat list, learned as they are opened: the display name,
+# the JID taken from the data-ids of its messages and where its row was last
+# rendered. Lets the client click a chat's row directly, even when the list is
+# virtualized or two chats share a name, instead of typing into the search box.
+class ChatDirectory:
+    def __init__(self, capacity: int = 5000):
+        self.capacity = capacity
+        self.entries: collections.OrderedDict[str, ChatEntry] = (
+            collections.OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def update(self, name: str, jid: str | None = None, position: float | None = None):
+        key = jid or f"name:{name}"
+        if jid:
+            # The chat is now known by id; forget its name-only entry.
+            self.entries.pop(f"name:{name}", None)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = ChatEntry(name, jid, position, time.monotonic())
+            self.entries[key] = entry
+        entry.name = name
+        entry.seen_at = time.monotonic()
+        if position is not None:
+            entry.position = position
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def find(self, name: str, jid: str | None = None) -> ChatEntry | None:
+        if jid and jid in self.entries:
+            return self.entries[jid]
+        candidates = [e for e in self.entries.values() if e.name == name]
+        return max(candidates, key=lambda e: e.seen_at) if candidates else None
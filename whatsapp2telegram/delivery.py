@@ -0,0 +1,403 @@
+import asyncio
+import collections
+import functools
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from whatsapp2telegram import tracing
+from whatsapp2telegram.metrics import Histogram
+from whatsapp2telegram.models import Media
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+TELEGRAM_MAX_CAPTION_LENGTH = 1024
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = asyncio.get_running_loop().time()
+        if self.updated is not None:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def wait(self):
+        # Waits until a token is available without consuming it.
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class Delivery:
+    source: str
+    text: str
+    future: asyncio.Future[Any] = field(repr=False)
+    # Parts still to send when a long message was only partly delivered.
+    parts: list[str] | None = None
+    # An attached photo, voice note or file.
+    media: Media | None = None
+    # Opaque caller data handed to `on_sent` with every Telegram message that
+    # carries (part of) this delivery.
+    tag: Any = None
+    # A Telegram message this delivery replaces the text of, instead of
+    # sending a new one.
+    replaces: int | None = None
+
+
+def split_text(text: str, limit: int) -> list[str]:
+    parts: list[str] = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if current and len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    parts.append(current)
+    return parts
+
+
+# Outbound Telegram messages are queued in one lane per (Telegram chat,
+# WhatsApp chat) pair. Each lane has one worker, which keeps the messages of
+# a WhatsApp chat in order, while lanes run concurrently up to the size of
+# the HTTP connection pool. Every request takes a token from the global
+# bucket and from the bucket of its Telegram chat. Consecutive messages that
+# pile up in a lane while its Telegram chat is throttled are coalesced into a
+# single Telegram message. Media messages are sent on their own, with the
+# text as caption, or followed by the text when it is too long for one, and
+# so are edits of a message already sent.
+class DeliveryQueue:
+    def __init__(
+        self,
+        send: Callable[[str, str], Awaitable[Any]],
+        format_message: Callable[[str, list[str]], str],
+        concurrency: int = 8,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH,
+        max_retries: int = 5,
+        send_media: Callable[[str, str, Media], Awaitable[Any]] | None = None,
+        max_caption_length: int = TELEGRAM_MAX_CAPTION_LENGTH,
+        on_sent: Callable[[str, Any, Any], None] | None = None,
+        edit: Callable[[str, int, str], Awaitable[Any]] | None = None,
+    ):
+        self.send = send
+        self.edit = edit
+        self.on_sent = on_sent
+        self.send_media = send_media
+        self.format_message = format_message
+        self.max_length = max_length
+        self.max_caption_length = max_caption_length
+        self.max_retries = max_retries
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: dict[str, TokenBucket] = {}
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lanes: dict[tuple[str, str], collections.deque[Delivery]] = {}
+        self.wakeups: dict[tuple[str, str], asyncio.Event] = {}
+        self.workers: dict[tuple[str, str], asyncio.Task[None]] = {}
+        self.unfinished: set[asyncio.Future[Any]] = set()
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.flood_limited = 0
+        # Bot API request latency by method ("message", "media" or "edit") and
+        # outcome.
+        self.request_seconds = Histogram()
+
+    @property
+    def pending(self) -> int:
+        return len(self.unfinished)
+
+    def submit(
+        self,
+        chat_id: str,
+        source: str,
+        text: str,
+        media: Media | None = None,
+        tag: Any = None,
+        replaces: int | None = None,
+    ) -> asyncio.Future[Any]:
+        loop = asyncio.get_running_loop()
+        delivery = Delivery(
+            source, text, loop.create_future(), media=media, tag=tag, replaces=replaces
+        )
+        self.unfinished.add(delivery.future)
+        delivery.future.add_done_callback(self.unfinished.discard)
+        key = (chat_id, source)
+        if chat_id not in self.chat_buckets:
+            self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        if key not in self.lanes:
+            self.lanes[key] = collections.deque()
+            self.wakeups[key] = asyncio.Event()
+            self.workers[key] = asyncio.create_task(self._work(key))
+        self.lanes[key].append(delivery)
+        self.wakeups[key].set()
+        return delivery.future
+
+    async def join(self):
+        await asyncio.gather(*self.unfinished, return_exceptions=True)
+
+    async def close(self, timeout: float = 10):
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Warning: {self.pending} Telegram deliveries dropped on shutdown")
+        for worker in self.workers.values():
+            worker.cancel()
+        await asyncio.gather(*self.workers.values(), return_exceptions=True)
+        for future in list(self.unfinished):
+            future.cancel()
+        self.workers.clear()
+        self.lanes.clear()
+        self.wakeups.clear()
+
+    async def _work(self, key: tuple[str, str]):
+        chat_id, _ = key
+        lane = self.lanes[key]
+        wakeup = self.wakeups[key]
+        while True:
+            if not lane:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+
+            # Let messages accumulate while the chat is throttled, so they can
+            # be coalesced; the token itself is taken per request.
+            await self.chat_buckets[chat_id].wait()
+            batch = self._take_batch(lane)
+            try:
+                if batch[0].media and self.send_media:
+                    await self._send_media(key, batch[0], batch[0].media)
+                elif batch[0].replaces is not None and self.edit:
+                    await self._send_edit(key, batch[0], batch[0].replaces)
+                else:
+                    await self._send_batch(key, batch)
+            except asyncio.CancelledError:
+                lane.extendleft(reversed([d for d in batch if not d.future.done()]))
+                raise
+
+    def _take_batch(self, lane: collections.deque[Delivery]) -> list[Delivery]:
+        batch = [lane.popleft()]
+        while (
+            lane
+            and batch[0].parts is None
+            and lane[0].parts is None
+            and not batch[0].media
+            and not lane[0].media
+            and batch[0].replaces is None
+            and lane[0].replaces is None
+        ):
+            texts = [d.text for d in batch] + [lane[0].text]
+            if len(self.format_message(batch[0].source, texts)) > self.max_length:
+                break
+            batch.append(lane.popleft())
+        self.coalesced += len(batch) - 1
+        return batch
+
+    def _plan(self, batch: list[Delivery]) -> list[list[tuple[Delivery, str]]]:
+        # Packs the batch into requests of at most max_length characters,
+        # splitting long messages on line boundaries; every request repeats
+        # the "From:" header.
+        source = batch[0].source
+        room = self._room(source)
+        requests: list[list[tuple[Delivery, str]]] = []
+        current: list[tuple[Delivery, str]] = []
+        for delivery in batch:
+            parts = delivery.parts or split_text(delivery.text, room)
+            for part in parts:
+                texts = [text for _, text in current] + [part]
+                too_long = len(self.format_message(source, texts)) > self.max_length
+                if current and too_long:
+                    requests.append(current)
+                    current = []
+                current.append((delivery, part))
+        requests.append(current)
+        return requests
+
+    def _room(self, source: str) -> int:
+        return self.max_length - len(self.format_message(source, [""]))
+
+    async def _send_media(
+        self, key: tuple[str, str], delivery: Delivery, media: Media
+    ):
+        chat_id, source = key
+        caption = self.format_message(source, [delivery.text])
+        too_long = len(caption) > self.max_caption_length
+        if too_long:
+            caption = self.format_message(source, [""]).rstrip()
+        try:
+            result = await self._send_with_retry(chat_id, caption, media)
+        except Exception as e:
+            print(f"[delivery] Failed to deliver media to {chat_id}: {e}")
+            delivery.future.set_exception(e)
+            return
+        self._sent(chat_id, delivery, result)
+        if not too_long:
+            delivery.future.set_result(result)
+            return
+        # The text follows as a continuation, so a failure from here on never
+        # sends the media a second time.
+        delivery.media = None
+        delivery.parts = split_text(delivery.text, self._room(source))
+        self.lanes[key].appendleft(delivery)
+
+    async def _send_edit(self, key: tuple[str, str], delivery: Delivery, replaces: int):
+        chat_id, source = key
+        try:
+            result = await self._send_with_retry(
+                chat_id, self.format_message(source, [delivery.text]), replaces=replaces
+            )
+        except Exception as e:
+            print(f"[delivery] Failed to edit message {replaces} in {chat_id}: {e}")
+            delivery.future.set_exception(e)
+            return
+        self._sent(chat_id, delivery, result)
+        delivery.future.set_result(result)
+
+    async def _send_batch(self, key: tuple[str, str], batch: list[Delivery]):
+        chat_id, source = key
+        requests = self._plan(batch)
+        remaining: dict[int, list[str]] = {id(d): [] for d in batch}
+        for request in requests:
+            for delivery, part in request:
+                remaining[id(delivery)].append(part)
+        sent: set[int] = set()
+        for request in requests:
+            try:
+                result = await self._send_with_retry(
+                    chat_id, self.format_message(source, [text for _, text in request])
+                )
+            except Exception as e:
+                print(f"[delivery] Failed to deliver to {chat_id}: {e}")
+                self._fail(key, batch, remaining, sent, e)
+                return
+            for delivery, _ in request:
+                self._sent(chat_id, delivery, result)
+                sent.add(id(delivery))
+                remaining[id(delivery)].pop(0)
+                if not remaining[id(delivery)] and not delivery.future.done():
+                    delivery.future.set_result(result)
+
+    def _sent(self, chat_id: str, delivery: Delivery, result: Any):
+        if self.on_sent and delivery.tag is not None:
+            try:
+                self.on_sent(chat_id, delivery.tag, result)
+            except Exception as e:
+                print(f"[delivery] on_sent hook failed: {e}")
+
+    def _fail(
+        self,
+        key: tuple[str, str],
+        batch: list[Delivery],
+        remaining: dict[int, list[str]],
+        sent: set[int],
+        error: Exception,
+    ):
+        continuations: list[Delivery] = []
+        for delivery in batch:
+            if delivery.future.done():
+                continue
+            if id(delivery) not in sent and delivery.parts is None:
+                delivery.future.set_exception(error)
+            elif isinstance(error, (BadRequest, Forbidden)):
+                # Part of the message is already in Telegram; failing it would
+                # make the caller forward the sent parts a second time.
+                print("[delivery] Message only partially delivered")
+                delivery.future.set_result(None)
+            else:
+                delivery.parts = remaining[id(delivery)]
+                continuations.append(delivery)
+        self.lanes[key].extendleft(reversed(continuations))
+
+    async def _send_with_retry(
+        self,
+        chat_id: str,
+        text: str,
+        media: Media | None = None,
+        replaces: int | None = None,
+    ) -> Any:
+        request: Callable[[], Awaitable[Any]]
+        if replaces is not None and self.edit:
+            method = "edit"
+            request = functools.partial(self.edit, chat_id, replaces, text)
+        elif media and self.send_media:
+            method = "media"
+            request = functools.partial(self.send_media, chat_id, text, media)
+        else:
+            method = "message"
+            request = functools.partial(self.send, chat_id, text)
+        attempt = 0
+        while True:
+            await self.chat_buckets[chat_id].acquire()
+            await self.global_bucket.acquire()
+            outcome = "error"
+            try:
+                async with self.semaphore:
+                    started = asyncio.get_running_loop().time()
+                    try:
+                        with tracing.span(
+                            "telegram_send",
+                            method=method,
+                            chat_id=chat_id,
+                            attempt=attempt,
+                        ):
+                            result = await request()
+                        outcome = "ok"
+                    finally:
+                        self.request_seconds.observe(
+                            asyncio.get_running_loop().time() - started,
+                            method=method,
+                            outcome=outcome,
+                        )
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                delay = e.retry_after
+                if hasattr(delay, "total_seconds"):
+                    delay = delay.total_seconds()  # type: ignore
+                self.flood_limited += 1
+                print(f"[delivery] Flood limit hit, retrying in {delay}s")
+            except (BadRequest, Forbidden):
+                # Permanent errors; BadRequest subclasses NetworkError.
+                raise
+            except NetworkError as e:
+                delay = min(2**attempt, 30)
+                print(f"[delivery] {e}, retrying in {delay}s")
+            attempt += 1
+            self.retries += 1
+            if attempt > self.max_retries:
+                raise TimeoutError(
+                    f"Delivery to {chat_id} failed after {attempt} attempts"
+                )
+            await asyncio.sleep(float(delay))
@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from whatsapp2telegram.models import Message
+
+if TYPE_CHECKING:
+    from whatsapp2telegram.delivery import DeliveryQueue
+
+IMMEDIATE = "immediate"
+DIGEST = "digest"
+POLICIES = (IMMEDIATE, DIGEST)
+
+
+# How each WhatsApp chat reaches Telegram: every message on its own, or
+# gathered into one Telegram message per `window` seconds. Rolling digests
+# send the first lines of a window right away and then edit that message
+# every `edit_interval` seconds as lines arrive, instead of waiting for the
+# window to end.
+@dataclass
+class DigestPolicy:
+    # Chat name to IMMEDIATE or DIGEST; other chats get `default`.
+    chats: dict[str, str] = field(default_factory=dict)
+    default: str = IMMEDIATE
+    window: float = 300
+    rolling: bool = False
+    edit_interval: float = 30
+
+    def digests(self, chat: str) -> bool:
+        return self.chats.get(chat, self.default) == DIGEST
+
+
+def line_of(message: Message) -> str:
+    if message.timestamp is None:
+        return message.body
+    sent_at = time.strftime("%H:%M", time.localtime(message.timestamp))
+    return f"[{sent_at}] {message.body}"
+
+
+@dataclass
+class Digest:
+    chat_id: str
+    chat: str
+    opened_at: float
+    flushed_at: float
+    # Lines not sent yet, each with the future of the message it carries.
+    entries: list[tuple[str, asyncio.Future[Any]]] = field(default_factory=list)
+    # Rolling digests: the Telegram message being edited and the text it shows.
+    message_id: int | None = None
+    text: str = ""
+    sending: asyncio.Future[Any] | None = None
+
+
+# Gathers the messages of digest chats per (Telegram chat, WhatsApp chat)
+# and hands each window to the delivery queue as one message, which costs one
+# Bot API call and one notification instead of one per message. Every
+# message gets a future that resolves when the digest carrying it is in
+# Telegram, so the message index marks it forwarded only then. Telegram
+# replies to a digest go to its WhatsApp chat, without a quote.
+class Digester:
+    def __init__(
+        self,
+        delivery: "DeliveryQueue",
+        policy: DigestPolicy | None = None,
+        tick: float = 1.0,
+    ):
+        self.delivery = delivery
+        self.policy = policy or DigestPolicy()
+        self.tick = tick
+        self.open: dict[tuple[str, str], Digest] = {}
+        # WhatsApp messages gathered, and Telegram messages sent or edited
+        # to carry them.
+        self.digested = 0
+        self.sent = 0
+        self._task: asyncio.Task[None] | None = None
+
+    def applies(self, message: Message) -> bool:
+        # Media is sent on its own, as it cannot be part of a text digest.
+        return message.media is None and self.policy.digests(message.chat)
+
+    def submit(self, chat_id: str, message: Message) -> asyncio.Future[Any]:
+        key = (chat_id, message.chat)
+        digest = self.open.get(key)
+        if digest is None:
+            now = time.monotonic()
+            digest = self.open[key] = Digest(chat_id, message.chat, now, now)
+        future = asyncio.get_running_loop().create_future()
+        digest.entries.append((line_of(message), future))
+        self.digested += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    def close(self, chat_id: str, chat: str):
+        # Sends what the digest of a chat holds, e.g. before a message that
+        # bypasses it, so the messages of the chat stay in order.
+        digest = self.open.pop((chat_id, chat), None)
+        if digest is not None:
+            self._flush(digest, rolling=False)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for chat_id, chat in list(self.open):
+            self.close(chat_id, chat)
+
+    def flush_due(self, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        for key, digest in list(self.open.items()):
+            if now - digest.opened_at >= self.policy.window:
+                if self._flush(digest, self.policy.rolling) and not digest.entries:
+                    del self.open[key]
+            elif (
+                self.policy.rolling
+                and now - digest.flushed_at >= self.policy.edit_interval
+            ):
+                self._flush(digest, rolling=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.flush_due()
+
+    def _flush(self, digest: Digest, rolling: bool) -> bool:
+        # Returns False when a rolling digest waits for its first message to
+        # be sent, as there is nothing to edit yet.
+        if not digest.entries:
+            return True
+        if rolling and digest.sending is not None and not digest.sending.done():
+            return False
+        entries, digest.entries = digest.entries, []
+        text = "\n".join(line for line, _ in entries)
+        combined = f"{digest.text}\n{text}"
+        if rolling and digest.message_id is not None and self._fits(digest, combined):
+            replaces: int | None = digest.message_id
+            digest.text = combined
+        else:
+            replaces = None
+            digest.message_id = None
+            digest.text = text
+        digest.flushed_at = time.monotonic()
+        digest.sending = self._send(digest, entries, digest.text, replaces)
+        return True
+
+    def _send(
+        self,
+        digest: Digest,
+        entries: list[tuple[str, asyncio.Future[Any]]],
+        text: str,
+        replaces: int | None = None,
+    ) -> asyncio.Future[Any]:
+        future = self.delivery.submit(
+            digest.chat_id, digest.chat, text, tag=(digest.chat, ""), replaces=replaces
+        )
+        self.sent += 1
+        future.add_done_callback(
+            functools.partial(self._delivered, digest, entries, text, replaces)
+        )
+        return future
+
+    def _delivered(
+        self,
+        digest: Digest,
+        entries: list[tuple[str, asyncio.Future[Any]]],
+        text: str,
+        replaces: int | None,
+        delivery: asyncio.Future[Any],
+    ):
+        pending = [future for _, future in entries if not future.done()]
+        if delivery.cancelled():
+            for future in pending:
+                future.cancel()
+            return
+        error = delivery.exception()
+        if error is not None and replaces is not None:
+            # The rolling message could not be edited, e.g. it was deleted;
+            # its new lines go out in a message of their own.
+            digest.message_id = None
+            digest.text = "\n".join(line for line, _ in entries)
+            digest.sending = self._send(digest, entries, digest.text)
+            return
+        for future in pending:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(delivery.result())
+        if error is None and replaces is None and self._fits(digest, text):
+            # A text split over several messages cannot be edited as one.
+            digest.message_id = getattr(delivery.result(), "message_id", None)
+
+    def _fits(self, digest: Digest, text: str) -> bool:
+        formatted = self.delivery.format_message(digest.chat, [text])
+        return len(formatted) <= self.delivery.max_length
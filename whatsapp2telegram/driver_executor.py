@@ -0,0 +1,46 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+# Selenium is blocking and not thread-safe: every command touching the driver
+# is queued, in submission order, to one dedicated worker thread so the event
+# loop only ever awaits the result. Calls run in a copy of the caller's
+# context, so tracing spans follow them into the worker.
+class DriverExecutor:
+    def __init__(self, name: str = "whatsapp-driver"):
+        self.name = name
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=self.name
+                )
+            return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        context = contextvars.copy_context()
+        try:
+            return await loop.run_in_executor(
+                self._get_executor(),
+                functools.partial(context.run, fn, *args, **kwargs),
+            )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
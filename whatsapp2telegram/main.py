@@ -1,39 +1,783 @@
 import os
 import asyncio
+import functools
+import importlib
+import json
 import signal
+import time
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from whatsapp2telegram.whatsapp import WhatsAppClient
-from whatsapp2telegram.telegram_bot import TelegramBot
+from whatsapp2telegram import tracing
+from whatsapp2telegram.accounts import (
+    Account,
+    accounts_for_replica,
+    assign_replica,
+    load_accounts,
+    replica_index_from_hostname,
+)
+from whatsapp2telegram.backfill import Backfill, BackfillState
+from whatsapp2telegram.digest import POLICIES, DigestPolicy
+from whatsapp2telegram.metrics import (
+    LoopLagMonitor,
+    Metric,
+    Registry,
+    StartupTimer,
+    counter,
+    gauge,
+    histogram,
+)
+from whatsapp2telegram.media_cache import MediaCache
+from whatsapp2telegram.message_index import MessageIndex
+from whatsapp2telegram.models import Message
+from whatsapp2telegram.pipeline import ForwardPipeline
+from whatsapp2telegram.reply_map import ReplyMap
+from whatsapp2telegram.reply_queue import ReplyQueue
+from whatsapp2telegram.scheduler import AdaptiveInterval, ChatScheduler
+from whatsapp2telegram.session_snapshot import SessionSnapshot
+from whatsapp2telegram.status_server import Request, Response, StatusServer
+from whatsapp2telegram.webhook import WebhookReceiver
+
+# Selenium and python-telegram-bot take most of the import time; main()
+# imports them while other startup work runs.
+if TYPE_CHECKING:
+    from whatsapp2telegram.browser import BrowserProfile
+    from whatsapp2telegram.telegram_bot import TelegramBot
+    from whatsapp2telegram.whatsapp import WhatsAppClient
 
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# "push" drains events buffered by an in-page MutationObserver, "poll"
+# rescans the whole page. Either way the interval between cycles starts at
+# the minimum after activity and backs off to the maximum while idle.
+INGESTION_MODE = os.getenv("INGESTION_MODE", "push")
+PUSH_INTERVAL = float(os.getenv("PUSH_INTERVAL", "1"))
+PUSH_MAX_INTERVAL = float(os.getenv("PUSH_MAX_INTERVAL", "5"))
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "2"))
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "30"))
+# {"chat name": weight}; chats with a higher weight are read first.
+CHAT_WEIGHTS: dict[str, float] = json.loads(os.getenv("CHAT_WEIGHTS", "{}"))
+MAX_MESSAGES_PER_CYCLE = int(os.getenv("MAX_MESSAGES_PER_CYCLE", "200"))
+# Chat name to "immediate" or "digest"; other chats get DEFAULT_CHAT_POLICY.
+# Digest chats reach Telegram as one message per DIGEST_WINDOW seconds or,
+# with DIGEST_ROLLING, as one message edited every DIGEST_EDIT_INTERVAL
+# seconds until the window ends.
+CHAT_POLICIES: dict[str, str] = json.loads(os.getenv("CHAT_POLICIES", "{}"))
+DEFAULT_CHAT_POLICY = os.getenv("DEFAULT_CHAT_POLICY", "immediate")
+DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", "300"))
+DIGEST_ROLLING = os.getenv("DIGEST_ROLLING", "false").lower() == "true"
+DIGEST_EDIT_INTERVAL = float(os.getenv("DIGEST_EDIT_INTERVAL", "30"))
+STATE_DIR = os.getenv("STATE_DIR", os.path.join(os.getcwd(), "state"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+# With SESSION_SNAPSHOT_DIR, the WhatsApp Web login of every account is saved
+# there as <account>.tar.gz every SESSION_SNAPSHOT_INTERVAL seconds and on
+# shutdown, and restored into profiles without one before Chrome launches.
+SESSION_SNAPSHOT_DIR = os.getenv("SESSION_SNAPSHOT_DIR")
+SESSION_SNAPSHOT_INTERVAL = float(os.getenv("SESSION_SNAPSHOT_INTERVAL", "3600"))
+# Multi-account mode: a JSON file listing the WhatsApp accounts to serve,
+# sharded across REPLICA_COUNT replicas. Without it the bridge serves the
+# single account configured by TELEGRAM_CHAT_ID.
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE")
+PROFILES_DIR = os.getenv(
+    "PROFILES_DIR", os.path.join(os.getcwd(), "whatsapp_user_data")
+)
+REPLICA_COUNT = int(os.getenv("REPLICA_COUNT", "1"))
+REPLICA_INDEX = os.getenv("REPLICA_INDEX")
+MAX_CHROME_SESSIONS = int(os.getenv("MAX_CHROME_SESSIONS", "4"))
+# "lean" trims Chrome to what the bridge needs and recycles the WhatsApp Web
+# tab once Chrome's resident memory passes MAX_CHROME_RSS_MB; "full" is a
+# stock Chrome.
+BROWSER_MODE = os.getenv("BROWSER_MODE", "lean")
+CHROME_HEAP_MB = int(os.getenv("CHROME_HEAP_MB", "512"))
+MAX_CHROME_RSS_MB = int(os.getenv("MAX_CHROME_RSS_MB", "1536"))
+# Comma-separated URL patterns Chrome must not load in lean mode; unset for
+# browser.DEFAULT_BLOCKED_URLS.
+BLOCKED_URLS = os.getenv("BLOCKED_URLS")
+# Metrics and health probes, on the port the Service exposes.
+STATUS_PORT = int(os.getenv("STATUS_PORT", "6000"))
+# Telegram webhook mode: the public HTTPS URL Telegram POSTs updates to,
+# routed to WEBHOOK_PATH on STATUS_PORT, and the secret it must present.
+# Without a URL the bot long-polls.
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+WEBHOOK_PATH = "/telegram"
+# Where a replica passes on updates for chats another replica serves.
+WEBHOOK_PEER_URL = os.getenv(
+    "WEBHOOK_PEER_URL",
+    "http://whatsapp2telegram-{replica}.whatsapp2telegram-peers:6000/telegram",
+)
+# Seconds without a finished ingestion cycle before /healthz fails.
+LIVENESS_TIMEOUT = float(os.getenv("LIVENESS_TIMEOUT", "300"))
+# Catch-up on start: every chat forwarded from before is read from its
+# checkpoint, the last message forwarded, up to its newest message,
+# BACKFILL_PAGE_SIZE messages per driver call, scrolling history back at most
+# BACKFILL_MAX_SCROLLS times. Pages wait while more than BACKFILL_MAX_PENDING
+# messages are queued for Telegram.
+BACKFILL_ON_START = os.getenv("BACKFILL_ON_START", "true").lower() == "true"
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", "100"))
+BACKFILL_MAX_SCROLLS = int(os.getenv("BACKFILL_MAX_SCROLLS", "40"))
+BACKFILL_MAX_PENDING = int(os.getenv("BACKFILL_MAX_PENDING", "200"))
+# Messages read from WhatsApp wait in a queue of FORWARD_QUEUE_SIZE per
+# account, direct chats first, while MAX_IN_FLIGHT_DELIVERIES are being sent
+# to Telegram. A full queue slows reading down and, after FORWARD_PUT_TIMEOUT
+# seconds, sheds messages to the outbox on disk until it has drained.
+FORWARD_QUEUE_SIZE = int(os.getenv("FORWARD_QUEUE_SIZE", "500"))
+MAX_IN_FLIGHT_DELIVERIES = int(os.getenv("MAX_IN_FLIGHT_DELIVERIES", "100"))
+FORWARD_PUT_TIMEOUT = float(os.getenv("FORWARD_PUT_TIMEOUT", "5"))
+# Spans of ingestion cycles, chat reads, Telegram sends, reply dispatch and
+# driver restarts are appended to TRACE_FILE as JSON lines and posted to the
+# OpenTelemetry collector at OTEL_EXPORTER_OTLP_ENDPOINT, if set, every
+# TRACE_EXPORT_INTERVAL seconds.
+TRACE_FILE = os.getenv("TRACE_FILE")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "whatsapp2telegram")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+# SIGUSR1 starts a sampling profiler and, sent again, stops it and writes a
+# flame graph ready profile of folded stacks to PROFILE_DIR.
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(STATE_DIR, "profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_ON_START = os.getenv("PROFILE_ON_START", "false").lower() == "true"
+MAX_FORWARD_ATTEMPTS = 8
+# Replies handed to WhatsApp at once; each chat in a batch is opened once.
+MAX_REPLY_BATCH = 20
 
 
 async def shutdown(
     signal: signal.Signals,
     loop: asyncio.AbstractEventLoop,
-    whatsapp_client: WhatsAppClient,
-    telegram_bot: TelegramBot,
+    whatsapp_clients: list["WhatsAppClient"],
+    telegram_bot: "TelegramBot",
 ) -> None:
     print(f"Received exit signal {signal.name}...")
-    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    # Delivery workers keep running so telegram_bot.stop() can flush them.
+    delivery_workers = set(telegram_bot.delivery.workers.values())
+    tasks = [
+        t
+        for t in asyncio.all_tasks()
+        if t is not asyncio.current_task() and t not in delivery_workers
+    ]
     [task.cancel() for task in tasks]
     await asyncio.gather(*tasks, return_exceptions=True)
-    whatsapp_client.stop()
+    for whatsapp_client in whatsapp_clients:
+        await whatsapp_client.executor.run(whatsapp_client.stop)
+        # Chrome has closed the profile, so this snapshot is consistent.
+        await asyncio.to_thread(whatsapp_client.save_snapshot)
+        whatsapp_client.executor.shutdown(wait=True)
+        await whatsapp_client.supervisor.close()
     await telegram_bot.stop()
     loop.stop()
 
 
+def forward(
+    telegram_bot: "TelegramBot",
+    message_index: MessageIndex,
+    message: Message,
+    attempt: int = 0,
+    chat_id: str | None = None,
+) -> None:
+    delivery = telegram_bot.queue_message(message, chat_id)
+    delivery.add_done_callback(
+        functools.partial(
+            _on_forwarded, telegram_bot, message_index, message, attempt, chat_id
+        )
+    )
+
+
+def _on_forwarded(
+    telegram_bot: "TelegramBot",
+    message_index: MessageIndex,
+    message: Message,
+    attempt: int,
+    chat_id: str | None,
+    delivery: asyncio.Future[object],
+) -> None:
+    from telegram.error import BadRequest, Forbidden
+
+    if delivery.cancelled():
+        # Shutting down: the message stays in the outbox for the next start.
+        message_index.defer(message)
+        return
+    error = delivery.exception()
+    if error is None:
+        message_index.mark_forwarded(message)
+    elif isinstance(error, (BadRequest, Forbidden)):
+        print(f"Telegram rejected a message from '{message.chat}': {error}")
+        message_index.release(message)
+    elif attempt + 1 >= MAX_FORWARD_ATTEMPTS:
+        print(f"Giving up on a message from '{message.chat}' until restart")
+        message_index.defer(message)
+    else:
+        asyncio.get_running_loop().call_later(
+            min(5 * 2**attempt, 300),
+            forward,
+            telegram_bot,
+            message_index,
+            message,
+            attempt + 1,
+            chat_id,
+        )
+
+
+async def dispatch_replies(
+    telegram_bot: "TelegramBot",
+    whatsapp_client: "WhatsAppClient",
+    replies: ReplyQueue | None = None,
+) -> None:
+    replies = replies or telegram_bot.replies
+    while True:
+        batch = await replies.get_batch(MAX_REPLY_BATCH)
+        try:
+            with tracing.span("reply_dispatch", replies=len(batch)):
+                results = await whatsapp_client.send_messages(
+                    [reply for _, reply in batch]
+                )
+        except Exception as e:
+            print(f"[dispatch_replies] Sending {len(batch)} replies failed: {e}")
+            results = [False] * len(batch)
+        for (reply_id, _), sent in zip(batch, results):
+            if sent:
+                replies.ack(reply_id)
+            else:
+                replies.nack(reply_id)
+
+
+def collect_metrics(
+    telegram_bot: "TelegramBot",
+    whatsapp_clients: list["WhatsAppClient"],
+    accounts: list[Account],
+    loop_lag_monitor: LoopLagMonitor,
+    pipelines: list[ForwardPipeline] | None = None,
+) -> list[Metric]:
+    prefix = "whatsapp2telegram"
+    delivery = telegram_bot.delivery
+    metrics = [
+        counter(
+            f"{prefix}_messages_forwarded_total",
+            "Telegram messages sent",
+            delivery.sent,
+        ),
+        counter(
+            f"{prefix}_messages_coalesced_total",
+            "WhatsApp messages merged into another Telegram message",
+            delivery.coalesced,
+        ),
+        counter(
+            f"{prefix}_messages_digested_total",
+            "WhatsApp messages gathered into digests",
+            telegram_bot.digests.digested,
+        ),
+        counter(
+            f"{prefix}_digest_messages_total",
+            "Telegram messages sent or edited to carry digests",
+            telegram_bot.digests.sent,
+        ),
+        counter(
+            f"{prefix}_telegram_retries_total",
+            "Bot API requests retried",
+            delivery.retries,
+        ),
+        counter(
+            f"{prefix}_telegram_flood_limited_total",
+            "Bot API requests rejected with 429 Too Many Requests",
+            delivery.flood_limited,
+        ),
+        histogram(
+            f"{prefix}_telegram_request_seconds",
+            "Bot API request latency",
+            delivery.request_seconds,
+        ),
+        gauge(
+            f"{prefix}_telegram_pending_deliveries",
+            "Messages waiting to be sent to Telegram",
+            delivery.pending,
+        ),
+        counter(
+            f"{prefix}_media_cache_hits_total",
+            "Media re-sent by Telegram file_id",
+            telegram_bot.media_cache.hits,
+        ),
+        counter(
+            f"{prefix}_media_uploads_total",
+            "Media uploaded to Telegram",
+            telegram_bot.media_cache.uploads,
+        ),
+        gauge(
+            f"{prefix}_event_loop_lag_seconds",
+            "Event loop lag at the last sample",
+            loop_lag_monitor.last_lag,
+        ),
+        gauge(
+            f"{prefix}_event_loop_max_lag_seconds",
+            "Largest event loop lag since start",
+            loop_lag_monitor.max_lag,
+        ),
+    ]
+    for chat_id, replies in telegram_bot.reply_queues.items():
+        metrics.append(
+            gauge(
+                f"{prefix}_reply_queue_depth",
+                "Telegram replies waiting for WhatsApp",
+                len(replies),
+                telegram_chat_id=chat_id,
+            )
+        )
+    for pipeline, account in zip(pipelines or [], accounts):
+        metrics += [
+            gauge(
+                f"{prefix}_forward_queue_depth",
+                "Messages read from WhatsApp waiting for a Telegram delivery slot",
+                len(pipeline),
+                account=account.name,
+            ),
+            counter(
+                f"{prefix}_forward_queue_shed_total",
+                "Messages left in the outbox because the forward queue was full",
+                pipeline.shed,
+                account=account.name,
+            ),
+            counter(
+                f"{prefix}_forward_queue_blocked_seconds_total",
+                "Time ingestion waited for room in the forward queue",
+                pipeline.blocked_seconds,
+                account=account.name,
+            ),
+        ]
+    for whatsapp_client, account in zip(whatsapp_clients, accounts):
+        name = account.name
+        for phase, seconds in whatsapp_client.startup.phases.items():
+            metrics.append(
+                gauge(
+                    f"{prefix}_startup_phase_seconds",
+                    "Wall time of each startup phase",
+                    seconds,
+                    account=name,
+                    phase=phase,
+                )
+            )
+        supervisor = whatsapp_client.supervisor
+        scheduler = whatsapp_client.scheduler
+        navigation = whatsapp_client.navigation
+        metrics += [
+            histogram(
+                f"{prefix}_cycle_phase_seconds",
+                "WebDriver time per ingestion phase",
+                whatsapp_client.phase_seconds,
+                account=name,
+            ),
+            counter(
+                f"{prefix}_messages_read_total",
+                "Messages read from WhatsApp Web",
+                whatsapp_client.messages_read,
+                account=name,
+            ),
+            counter(
+                f"{prefix}_webdriver_round_trips_total",
+                "WebDriver commands sent to chromedriver",
+                whatsapp_client.round_trips.count,
+                account=name,
+            ),
+            counter(
+                f"{prefix}_driver_restarts_total",
+                "WebDriver sessions replaced after a failure",
+                supervisor.recoveries,
+                account=name,
+            ),
+            counter(
+                f"{prefix}_driver_cold_restarts_total",
+                "Restarts that had no warm standby session",
+                supervisor.cold_restarts,
+                account=name,
+            ),
+            gauge(
+                f"{prefix}_driver_last_recovery_seconds",
+                "Duration of the last driver recovery",
+                supervisor.last_recovery_time,
+                account=name,
+            ),
+            counter(
+                f"{prefix}_tab_recycles_total",
+                "WhatsApp Web tabs replaced to release Chrome memory",
+                whatsapp_client.tab_recycles,
+                account=name,
+            ),
+            counter(
+                f"{prefix}_page_reloads_total",
+                "WhatsApp Web page reloads",
+                navigation.reloads,
+                account=name,
+            ),
+            gauge(
+                f"{prefix}_deferred_chats",
+                "Unread chats left for the next cycle",
+                scheduler.last_cycle.deferred,
+                account=name,
+            ),
+            gauge(
+                f"{prefix}_chrome_rss_bytes",
+                "Resident memory of Chrome and chromedriver",
+                whatsapp_client.chrome_rss(),
+                account=name,
+            ),
+            gauge(
+                f"{prefix}_authenticated",
+                "1 while the WhatsApp Web session is logged in",
+                int(whatsapp_client.authenticated),
+                account=name,
+            ),
+        ]
+        snapshot = whatsapp_client.snapshot
+        if snapshot is not None:
+            metrics += [
+                counter(
+                    f"{prefix}_session_snapshots_total",
+                    "WhatsApp Web logins saved to the snapshot directory",
+                    snapshot.saves,
+                    account=name,
+                ),
+                gauge(
+                    f"{prefix}_session_snapshot_bytes",
+                    "Size of the compressed login snapshot",
+                    snapshot.size,
+                    account=name,
+                ),
+            ]
+    return metrics
+
+
+def status_server(
+    telegram_bot: "TelegramBot",
+    whatsapp_clients: list["WhatsAppClient"],
+    accounts: list[Account],
+    loop_lag_monitor: LoopLagMonitor,
+    port: int = STATUS_PORT,
+    webhook: WebhookReceiver | None = None,
+    pipelines: list[ForwardPipeline] | None = None,
+) -> StatusServer:
+    registry = Registry()
+    registry.register(
+        functools.partial(
+            collect_metrics,
+            telegram_bot,
+            whatsapp_clients,
+            accounts,
+            loop_lag_monitor,
+            pipelines,
+        )
+    )
+    if webhook is not None:
+        registry.register(
+            lambda: [
+                counter(
+                    "whatsapp2telegram_webhook_updates_total",
+                    "Telegram updates received through the webhook",
+                    webhook.received,
+                ),
+                counter(
+                    "whatsapp2telegram_webhook_forwarded_total",
+                    "Webhook updates passed on to the replica serving the chat",
+                    webhook.forwarded,
+                ),
+            ]
+        )
+
+    async def metrics(request: Request) -> Response:
+        return Response(
+            body=registry.render(), content_type="text/plain; version=0.0.4"
+        )
+
+    async def healthz(request: Request) -> Response:
+        # Live while every account finishes ingestion cycles; a wedged
+        # WebDriver call stops them and gets the pod restarted.
+        now = time.monotonic()
+        stalled = [
+            account.name
+            for whatsapp_client, account in zip(whatsapp_clients, accounts)
+            if whatsapp_client.last_cycle_at is not None
+            and now - whatsapp_client.last_cycle_at > LIVENESS_TIMEOUT
+        ]
+        if stalled:
+            return Response(503, f"stalled: {', '.join(stalled)}\n")
+        return Response(body="ok\n")
+
+    async def readyz(request: Request) -> Response:
+        logged_out = [
+            account.name
+            for whatsapp_client, account in zip(whatsapp_clients, accounts)
+            if not whatsapp_client.authenticated
+        ]
+        if logged_out:
+            return Response(503, f"not authenticated: {', '.join(logged_out)}\n")
+        return Response(body="ok\n")
+
+    server = StatusServer(port=port)
+    server.route("GET", "/metrics", metrics)
+    server.route("GET", "/healthz", healthz)
+    server.route("GET", "/readyz", readyz)
+    if webhook is not None:
+        server.route("POST", WEBHOOK_PATH, webhook.handle)
+    return server
+
+
+def replica_index() -> int:
+    if REPLICA_INDEX is not None:
+        return int(REPLICA_INDEX)
+    return replica_index_from_hostname(os.getenv("HOSTNAME", "")) or 0
+
+
+def chat_replicas() -> dict[str, int]:
+    # Which replica serves each Telegram chat, for routing webhook updates.
+    if not ACCOUNTS_FILE or REPLICA_COUNT <= 1:
+        return {}
+    return {
+        account.telegram_chat_id: assign_replica(account.name, REPLICA_COUNT)
+        for account in load_accounts(ACCOUNTS_FILE, PROFILES_DIR, STATE_DIR)
+    }
+
+
+def configured_accounts() -> list[Account]:
+    if not ACCOUNTS_FILE:
+        return [
+            Account(
+                name="default",
+                telegram_chat_id=TELEGRAM_CHAT_ID,  # type: ignore
+                user_data_dir=PROFILES_DIR,
+                state_dir=STATE_DIR,
+            )
+        ]
+    index = replica_index()
+    accounts = accounts_for_replica(
+        load_accounts(ACCOUNTS_FILE, PROFILES_DIR, STATE_DIR),
+        index,
+        REPLICA_COUNT,
+    )
+    if len(accounts) > MAX_CHROME_SESSIONS:
+        raise ValueError(
+            f"Replica {index} was assigned {len(accounts)} accounts but "
+            f"MAX_CHROME_SESSIONS is {MAX_CHROME_SESSIONS}; add replicas."
+        )
+    print(
+        f"Replica {index}/{REPLICA_COUNT} serves: "
+        + ", ".join(account.name for account in accounts)
+    )
+    return accounts
+
+
+def browser_profile() -> "BrowserProfile":
+    from whatsapp2telegram.browser import DEFAULT_BLOCKED_URLS, BrowserProfile
+
+    blocked_urls = (
+        tuple(filter(None, BLOCKED_URLS.split(",")))
+        if BLOCKED_URLS is not None
+        else DEFAULT_BLOCKED_URLS
+    )
+    return BrowserProfile(
+        lean=BROWSER_MODE == "lean",
+        heap_mb=CHROME_HEAP_MB,
+        max_rss=MAX_CHROME_RSS_MB * 1024 * 1024,
+        blocked_urls=blocked_urls,
+    )
+
+
+def configure_tracing():
+    if TRACE_FILE:
+        tracing.tracer.exporters.append(tracing.JsonlExporter(TRACE_FILE))
+    if OTEL_EXPORTER_OTLP_ENDPOINT:
+        tracing.tracer.exporters.append(
+            tracing.OtlpExporter(OTEL_EXPORTER_OTLP_ENDPOINT, OTEL_SERVICE_NAME)
+        )
+
+
+def digest_policy() -> DigestPolicy:
+    return DigestPolicy(
+        CHAT_POLICIES,
+        DEFAULT_CHAT_POLICY,
+        DIGEST_WINDOW,
+        DIGEST_ROLLING,
+        DIGEST_EDIT_INTERVAL,
+    )
+
+
+def session_snapshot(account: Account) -> SessionSnapshot | None:
+    if not SESSION_SNAPSHOT_DIR:
+        return None
+    return SessionSnapshot(
+        os.path.join(SESSION_SNAPSHOT_DIR, f"{account.name}.tar.gz"),
+        SESSION_SNAPSHOT_INTERVAL,
+    )
+
+
+def chat_scheduler() -> ChatScheduler:
+    if INGESTION_MODE == "push":
+        interval = AdaptiveInterval(PUSH_INTERVAL, PUSH_MAX_INTERVAL)
+    else:
+        interval = AdaptiveInterval(POLL_MIN_INTERVAL, POLL_INTERVAL)
+    return ChatScheduler(CHAT_WEIGHTS, 1, MAX_MESSAGES_PER_CYCLE, interval)
+
+
+def forward_pipeline(telegram_bot: "TelegramBot", account: Account) -> ForwardPipeline:
+    message_index = MessageIndex(os.path.join(account.state_dir, "forwarded.db"))
+    return ForwardPipeline(
+        message_index,
+        functools.partial(
+            forward, telegram_bot, message_index, chat_id=account.telegram_chat_id
+        ),
+        lambda: telegram_bot.delivery.pending,
+        capacity=FORWARD_QUEUE_SIZE,
+        max_in_flight=MAX_IN_FLIGHT_DELIVERIES,
+        put_timeout=FORWARD_PUT_TIMEOUT,
+    )
+
+
+async def run_account(
+    telegram_bot: "TelegramBot",
+    whatsapp_client: "WhatsAppClient",
+    account: Account,
+    pipeline: ForwardPipeline,
+    startup: StartupTimer | None = None,
+) -> None:
+    message_index = pipeline.message_index
+    replies = telegram_bot.reply_queues[account.telegram_chat_id]
+    chat_id = account.telegram_chat_id
+    reply_dispatcher: asyncio.Task[None] | None = None
+    supervision: asyncio.Task[None] | None = None
+    forwarding: asyncio.Task[None] | None = None
+    catch_up: asyncio.Task[None] | None = None
+    backfill = Backfill(
+        whatsapp_client,
+        telegram_bot,
+        message_index,
+        BackfillState(os.path.join(account.state_dir, "backfill.db")),
+        pipeline.submit,
+        page_size=BACKFILL_PAGE_SIZE,
+        max_scrolls=BACKFILL_MAX_SCROLLS,
+        max_pending=BACKFILL_MAX_PENDING,
+    )
+    if BACKFILL_ON_START:
+        backfill.plan()
+    try:
+        await whatsapp_client.start()
+        # Chrome usually needs longer than Telegram; forwarding starts once
+        # both are up.
+        await telegram_bot.wait_started()
+        supervision = asyncio.create_task(
+            whatsapp_client.supervise(HEALTH_CHECK_INTERVAL)
+        )
+        message_index.prune()
+        pipeline.resume()
+        forwarding = asyncio.create_task(pipeline.run())
+        reply_dispatcher = asyncio.create_task(
+            dispatch_replies(telegram_bot, whatsapp_client, replies)
+        )
+        if BACKFILL_ON_START:
+            catch_up = asyncio.create_task(backfill.run())
+
+        while True:
+            if INGESTION_MODE == "push":
+                stream = whatsapp_client.stream_pushed_messages()
+            else:
+                stream = whatsapp_client.stream_new_messages()
+            new_messages = False
+            # Each chat is forwarded as soon as it is read; a full queue
+            # holds back reading the next one.
+            async for chat_messages in stream:
+                new_messages = True
+                for message in chat_messages:
+                    await pipeline.submit(message)
+            if startup is not None:
+                print(
+                    f"[{account.name}] Forwarding after {startup.elapsed():.1f}s: "
+                    f"{startup.summary()}, {whatsapp_client.startup.summary()}"
+                )
+                startup = None
+
+            await asyncio.sleep(whatsapp_client.scheduler.next_interval(new_messages))
+    finally:
+        if reply_dispatcher:
+            reply_dispatcher.cancel()
+        if supervision:
+            supervision.cancel()
+        if forwarding:
+            forwarding.cancel()
+        if catch_up:
+            catch_up.cancel()
+        supervisor = whatsapp_client.supervisor
+        scheduler = whatsapp_client.scheduler
+        print(
+            f"[{account.name}] Cycles: {scheduler.cycles}, "
+            f"last interval {scheduler.interval.interval:.1f}s"
+        )
+        print(
+            f"[{account.name}] Driver recoveries: {supervisor.recoveries} "
+            f"({supervisor.cold_restarts} cold), "
+            f"max {supervisor.max_recovery_time:.1f}s"
+        )
+
+
 async def main():
+    startup = StartupTimer()
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
         raise ValueError(
             "TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID must be set in the environment variables."
         )
+    if INGESTION_MODE not in ("push", "poll"):
+        raise ValueError("INGESTION_MODE must be either 'push' or 'poll'.")
+    if BROWSER_MODE not in ("lean", "full"):
+        raise ValueError("BROWSER_MODE must be either 'lean' or 'full'.")
+    if not set(CHAT_POLICIES.values()) | {DEFAULT_CHAT_POLICY} <= set(POLICIES):
+        raise ValueError("Chat policies must be either 'immediate' or 'digest'.")
+    if TELEGRAM_WEBHOOK_URL and not TELEGRAM_WEBHOOK_SECRET:
+        raise ValueError(
+            "TELEGRAM_WEBHOOK_SECRET must be set with TELEGRAM_WEBHOOK_URL."
+        )
 
-    telegram_bot = TelegramBot(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
-    whatsapp_client = WhatsAppClient(telegram_bot)
+    accounts = configured_accounts()
+    configure_tracing()
+    profiler = tracing.SamplingProfiler(PROFILE_DIR, PROFILE_INTERVAL_MS / 1000)
+    with startup.phase("import_telegram"):
+        from whatsapp2telegram.telegram_bot import TelegramBot
+    # One Telegram application and connection pool serves every account;
+    # TELEGRAM_CHAT_ID stays the chat for bot-level notices.
+    media_cache = MediaCache(os.path.join(STATE_DIR, "media.db"))
+    media_cache.prune()
+    telegram_bot = TelegramBot(
+        TELEGRAM_BOT_TOKEN,
+        TELEGRAM_CHAT_ID,
+        ReplyQueue(os.path.join(STATE_DIR, "replies.db")),
+        media_cache=media_cache,
+        reply_map=ReplyMap(os.path.join(STATE_DIR, "reply_map.db")),
+        webhook_url=TELEGRAM_WEBHOOK_URL,
+        webhook_secret=TELEGRAM_WEBHOOK_SECRET,
+        digest_policy=digest_policy(),
+    )
+    webhook = (
+        WebhookReceiver(
+            telegram_bot,
+            TELEGRAM_WEBHOOK_SECRET,  # type: ignore
+            chat_replicas(),
+            replica_index(),
+            WEBHOOK_PEER_URL,
+        )
+        if TELEGRAM_WEBHOOK_URL
+        else None
+    )
+    for account in accounts:
+        if account.telegram_chat_id not in telegram_bot.reply_queues:
+            telegram_bot.add_chat(
+                account.telegram_chat_id,
+                ReplyQueue(os.path.join(account.state_dir, "replies.db")),
+            )
+    whatsapp_clients: list["WhatsAppClient"] = []
+    pipelines = [forward_pipeline(telegram_bot, account) for account in accounts]
+    loop_lag_monitor = LoopLagMonitor()
+    server = status_server(
+        telegram_bot,
+        whatsapp_clients,
+        accounts,
+        loop_lag_monitor,
+        webhook=webhook,
+        pipelines=pipelines,
+    )
 
     loop = asyncio.get_running_loop()
     signals = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
@@ -41,28 +785,59 @@ async def main():
         loop.add_signal_handler(
             s,
             lambda s=s: asyncio.create_task(
-                shutdown(s, loop, whatsapp_client, telegram_bot)
+                shutdown(s, loop, whatsapp_clients, telegram_bot)
             ),
         )
+    # Writing the profile stays off the event loop.
+    loop.add_signal_handler(
+        signal.SIGUSR1,
+        lambda: asyncio.create_task(asyncio.to_thread(profiler.toggle)),
+    )
 
-    try:
-        await telegram_bot.start()
-        await whatsapp_client.start()
-
-        while True:
-            new_messages = await whatsapp_client.get_new_messages()
-            for message in new_messages:
-                await telegram_bot.forward_message(message)
-
-            replies = telegram_bot.get_replies()
-            for reply in replies:
-                await whatsapp_client.send_message(reply["chat"], reply["text"])
-
-            await asyncio.sleep(30)
+    async def start_telegram():
+        with startup.phase("telegram"):
+            await telegram_bot.start()
 
+    try:
+        if PROFILE_ON_START:
+            profiler.start()
+        if tracing.tracer.exporters:
+            asyncio.create_task(tracing.tracer.run(TRACE_EXPORT_INTERVAL))
+        loop_lag_monitor.start()
+        await server.start()
+        # Telegram connects while Selenium is imported and Chrome launches.
+        telegram_start = asyncio.create_task(start_telegram())
+        with startup.phase("import_whatsapp"):
+            whatsapp = await asyncio.to_thread(
+                importlib.import_module, "whatsapp2telegram.whatsapp"
+            )
+        for account in accounts:
+            whatsapp_clients.append(
+                whatsapp.WhatsAppClient(
+                    telegram_bot,
+                    account.user_data_dir,
+                    account.telegram_chat_id,
+                    chat_scheduler(),
+                    media_cache,
+                    browser_profile(),
+                    session_snapshot(account),
+                )
+            )
+        await asyncio.gather(
+            telegram_start,
+            *(
+                run_account(telegram_bot, whatsapp_client, account, pipeline, startup)
+                for whatsapp_client, account, pipeline in zip(
+                    whatsapp_clients, accounts, pipelines
+                )
+            ),
+        )
     except asyncio.CancelledError:
         pass
     finally:
+        profiler.stop()
+        tracing.tracer.flush()
+        print(f"Max event loop lag: {loop_lag_monitor.max_lag * 1000:.1f}ms")
         print("Shutdown complete.")
 
 
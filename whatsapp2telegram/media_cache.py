@@ -0,0 +1,97 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_RETENTION = 30 * 24 * 3600
+
+
+# Media pulled out of WhatsApp Web, keyed by content hash. The bytes are kept
+# only until Telegram has them; after the first upload the returned file_id is
+# remembered instead, so the same photo forwarded again, or posted in several
+# groups, is re-sent by id rather than uploaded a second time. The driver
+# thread stores blobs while the event loop sends them, hence the lock.
+class MediaCache:
+    def __init__(self, path: str = ":memory:", retention: float = DEFAULT_RETENTION):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.retention = retention
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " hash TEXT PRIMARY KEY,"
+            " file_id TEXT NOT NULL,"
+            " used_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " hash TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " stored_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.db.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.uploads = 0
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def put_blob(self, data: bytes) -> str:
+        content_hash = self.content_hash(data)
+        with self._lock:
+            known = self.db.execute(
+                "SELECT 1 FROM files WHERE hash = ?", (content_hash,)
+            ).fetchone()
+            if not known:
+                self.db.execute(
+                    "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)",
+                    (content_hash, data, time.time()),
+                )
+                self.db.commit()
+        return content_hash
+
+    def get_blob(self, content_hash: str) -> bytes | None:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT data FROM blobs WHERE hash = ?", (content_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def file_id(self, content_hash: str) -> str | None:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT file_id FROM files WHERE hash = ?", (content_hash,)
+            ).fetchone()
+            if row:
+                self.db.execute(
+                    "UPDATE files SET used_at = ? WHERE hash = ?",
+                    (time.time(), content_hash),
+                )
+                self.db.commit()
+        return row[0] if row else None
+
+    def store_file_id(self, content_hash: str, file_id: str):
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                (content_hash, file_id, time.time()),
+            )
+            self.db.execute("DELETE FROM blobs WHERE hash = ?", (content_hash,))
+            self.db.commit()
+
+    def prune(self) -> int:
+        cutoff = time.time() - self.retention
+        with self._lock:
+            files = self.db.execute("DELETE FROM files WHERE used_at < ?", (cutoff,))
+            blobs = self.db.execute("DELETE FROM blobs WHERE stored_at < ?", (cutoff,))
+            self.db.commit()
+        return files.rowcount + blobs.rowcount
+
+    def close(self):
+        self.db.close()
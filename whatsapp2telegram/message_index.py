@@ -0,0 +1,185 @@
+import collections
+import hashlib
+import os
+import sqlite3
+import time
+
+from whatsapp2telegram.models import Media, Message
+
+DEFAULT_RETENTION = 30 * 24 * 3600
+# Optional message fields kept in the outbox for media messages.
+MEDIA_FIELDS = ("media_type", "media_hash", "filename")
+PRUNE_EVERY = 1000
+
+
+# Remembers which WhatsApp messages were already forwarded so that restarts,
+# page refreshes and repeated unread badges never forward a message twice.
+# Fingerprints live in SQLite; a bounded LRU in front answers repeated lookups
+# for recent messages without touching the disk. Claimed messages are kept in
+# a pending outbox until Telegram confirms them, so a message already marked
+# read in WhatsApp survives a crash or a failed delivery. The newest forwarded
+# message of each chat is its checkpoint, where a catch-up backfill resumes.
+class MessageIndex:
+    def __init__(
+        self,
+        path: str = ":memory:",
+        cache_size: int = 10_000,
+        retention: float = DEFAULT_RETENTION,
+    ):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS forwarded ("
+            " fingerprint TEXT PRIMARY KEY,"
+            " chat TEXT NOT NULL,"
+            " forwarded_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS forwarded_at ON forwarded (forwarded_at)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " fingerprint TEXT PRIMARY KEY,"
+            " chat TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " pre TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " claimed_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " chat TEXT PRIMARY KEY,"
+            " id TEXT NOT NULL,"
+            " updated_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(pending)")}
+        for column in MEDIA_FIELDS:
+            if column not in columns:
+                self.db.execute(
+                    f"ALTER TABLE pending ADD COLUMN {column} TEXT NOT NULL DEFAULT ''"
+                )
+        self.db.commit()
+        self.retention = retention
+        self.cache_size = cache_size
+        self.cache: collections.OrderedDict[str, None] = collections.OrderedDict()
+        self.in_flight: set[str] = set()
+        self._marks = 0
+
+    @staticmethod
+    def fingerprint(message: Message) -> str:
+        # data-id is stable per message and the pre-plain-text carries its
+        # timestamp; the text only disambiguates messages without an id.
+        key = message.id or message.text
+        return hashlib.blake2b(
+            f"{message.chat}\0{key}\0{message.pre}".encode(),
+            digest_size=16,
+        ).hexdigest()
+
+    def is_forwarded(self, fingerprint: str) -> bool:
+        if fingerprint in self.cache:
+            self.cache.move_to_end(fingerprint)
+            return True
+        row = self.db.execute(
+            "SELECT 1 FROM forwarded WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row:
+            self._remember(fingerprint)
+        return row is not None
+
+    def claim(self, message: Message) -> bool:
+        fingerprint = self.fingerprint(message)
+        if fingerprint in self.in_flight or self.is_forwarded(fingerprint):
+            return False
+        self.in_flight.add(fingerprint)
+        media = message.media
+        self.db.execute(
+            "INSERT OR IGNORE INTO pending"
+            " (fingerprint, chat, id, pre, text, claimed_at, "
+            + ", ".join(MEDIA_FIELDS)
+            + ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                fingerprint,
+                message.chat,
+                message.id,
+                message.pre,
+                message.text,
+                time.time(),
+                *((media.type, media.hash, media.filename) if media else ("",) * 3),
+            ),
+        )
+        self.db.commit()
+        return True
+
+    def pending_messages(self) -> list[Message]:
+        rows = self.db.execute(
+            "SELECT chat, id, pre, text, "
+            + ", ".join(MEDIA_FIELDS)
+            + " FROM pending ORDER BY claimed_at"
+        ).fetchall()
+        return [
+            Message.parse(
+                chat,
+                text,
+                id,
+                pre,
+                Media(media_type, media_hash, filename) if media_hash else None,
+            )
+            for chat, id, pre, text, media_type, media_hash, filename in rows
+        ]
+
+    def mark_forwarded(self, message: Message):
+        fingerprint = self.fingerprint(message)
+        self.in_flight.discard(fingerprint)
+        self.db.execute("DELETE FROM pending WHERE fingerprint = ?", (fingerprint,))
+        self.db.execute(
+            "INSERT OR IGNORE INTO forwarded VALUES (?, ?, ?)",
+            (fingerprint, message.chat, time.time()),
+        )
+        if message.id:
+            self.db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+                (message.chat, message.id, time.time()),
+            )
+        self.db.commit()
+        self._remember(fingerprint)
+        self._marks += 1
+        if self._marks % PRUNE_EVERY == 0:
+            self.prune()
+
+    def checkpoints(self) -> dict[str, str]:
+        # {chat: WhatsApp id of the message forwarded last}.
+        return dict(self.db.execute("SELECT chat, id FROM checkpoints").fetchall())
+
+    def defer(self, message: Message):
+        # Gives up for this run; the message stays in the outbox.
+        self.in_flight.discard(self.fingerprint(message))
+
+    def release(self, message: Message):
+        # Gives up for good, e.g. when Telegram rejects the message.
+        fingerprint = self.fingerprint(message)
+        self.in_flight.discard(fingerprint)
+        self.db.execute("DELETE FROM pending WHERE fingerprint = ?", (fingerprint,))
+        self.db.commit()
+
+    def prune(self) -> int:
+        cursor = self.db.execute(
+            "DELETE FROM forwarded WHERE forwarded_at < ?",
+            (time.time() - self.retention,),
+        )
+        self.db.commit()
+        return cursor.rowcount
+
+    def close(self):
+        self.db.close()
+
+    def _remember(self, fingerprint: str):
+        self.cache[fingerprint] = None
+        self.cache.move_to_end(fingerprint)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator
+
+from whatsapp2telegram import tracing
+
+
+# Measures how late the event loop wakes up from a short sleep; any lag beyond
+# a few milliseconds means something is blocking the loop.
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1, warn_threshold: float = 0.05):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.samples = 0
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def reset(self):
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.samples = 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.samples += 1
+            if lag > self.warn_threshold:
+                print(f"Warning: event loop blocked for {lag * 1000:.0f}ms")
+
+
+
+# Wall time of each startup phase, for the startup log line and /metrics.
+class StartupTimer:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.monotonic() - started
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{name} {seconds:.2f}s" for name, seconds in self.phases.items()
+        )
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# A cumulative histogram in the Prometheus sense, optionally split by label
+# values, e.g. histogram.observe(0.2, phase="drain").
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.series: dict[tuple[tuple[str, str], ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        # One count per bucket, then the +Inf count and the sum.
+        counts = self.series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        counts = self.series.get(tuple(sorted(labels.items())))
+        return int(counts[-2]) if counts else 0
+
+    def samples(self, **labels: str) -> list[tuple[str, dict[str, str], float]]:
+        samples: list[tuple[str, dict[str, str], float]] = []
+        for key, counts in self.series.items():
+            series_labels = {**labels, **dict(key)}
+            for bound, count in zip(self.buckets, counts):
+                bucket_labels = {**series_labels, "le": f"{bound:g}"}
+                samples.append(("_bucket", bucket_labels, count))
+            samples.append(("_bucket", {**series_labels, "le": "+Inf"}, counts[-2]))
+            samples.append(("_count", series_labels, counts[-2]))
+            samples.append(("_sum", series_labels, counts[-1]))
+        return samples
+
+
+@dataclass
+class Metric:
+    name: str
+    kind: str
+    help: str
+    # (name suffix, labels, value); the suffix is empty except for histograms.
+    samples: list[tuple[str, dict[str, str], float]]
+
+
+def counter(name: str, help: str, value: float, **labels: str) -> Metric:
+    return Metric(name, "counter", help, [("", labels, value)])
+
+
+def gauge(name: str, help: str, value: float, **labels: str) -> Metric:
+    return Metric(name, "gauge", help, [("", labels, value)])
+
+
+def histogram(name: str, help: str, source: Histogram, **labels: str) -> Metric:
+    return Metric(name, "histogram", help, source.samples(**labels))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Renders metrics in the Prometheus text exposition format. The collectors
+# read the counters the components already keep, at scrape time, so nothing
+# is instrumented twice.
+class Registry:
+    def __init__(self):
+        self.collectors: list[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, collector: Callable[[], Iterable[Metric]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        families: dict[str, Metric] = {}
+        for collector in self.collectors:
+            for metric in collector():
+                family = families.setdefault(
+                    metric.name, Metric(metric.name, metric.kind, metric.help, [])
+                )
+                family.samples.extend(metric.samples)
+        lines: list[str] = []
+        for metric in families.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples:
+                label_text = ",".join(
+                    f'{key}="{_escape(str(label))}"' for key, label in labels.items()
+                )
+                name = metric.name + suffix
+                lines.append(
+                    f"{name}{{{label_text}}} {value:g}" if label_text
+                    else f"{name} {value:g}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+# Counts WebDriver commands, i.e. HTTP round-trips to chromedriver, by
+# wrapping the command executor of every driver attached to it. Each command
+# is also counted on the current tracing span.
+class RoundTripCounter:
+    def __init__(self, driver: Any = None):
+        self.count = 0
+        if driver is not None:
+            self.attach(driver)
+
+    def attach(self, driver: Any):
+        executor = driver.command_executor
+        execute = executor.execute
+
+        def counting_execute(*args, **kwargs):
+            self.count += 1
+            tracing.count_driver_command()
+            return execute(*args, **kwargs)
+
+        executor.execute = counting_execute
+
+
+def process_tree_rss(pid: int) -> int:
+    # Resident memory in bytes of a process and all its descendants, read from
+    # /proc; 0 where /proc is unavailable. Chrome runs as a tree of renderer,
+    # GPU and utility processes under chromedriver.
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as children:
+                    pending.extend(int(child) for child in children.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
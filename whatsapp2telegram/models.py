@@ -0,0 +1,87 @@
+import functools
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+from whatsapp2telegram.chat_directory import jid_of
+
+# data-pre-plain-text, e.g. "[12:00, 17/10/2026] Bob: " or, with a US
+# locale, "[12:00 PM, 10/17/2026] Bob: ".
+PRE_PLAIN_TEXT = re.compile(
+    r"^\[(?P<time>[^,\]]+), (?P<date>[^\]]+)\] (?P<sender>.*?): ?$", re.DOTALL
+)
+TIMESTAMP_FORMATS = (
+    "%H:%M %d/%m/%Y",
+    "%I:%M %p %m/%d/%Y",
+    "%H:%M %d.%m.%Y",
+    "%H:%M %Y-%m-%d",
+)
+
+
+def parse_pre(pre: str) -> tuple[str, float | None]:
+    # Returns the sender and the timestamp, in local time, of a message.
+    match = PRE_PLAIN_TEXT.match(pre)
+    if not match:
+        return "", None
+    stamp = f"{match['time'].strip()} {match['date'].strip()}"
+    return match["sender"], parse_timestamp(stamp)
+
+
+# Timestamps have minute resolution, so a burst of messages shares a handful
+# of them; strptime dominates parsing otherwise.
+@functools.lru_cache(maxsize=1024)
+def parse_timestamp(stamp: str) -> float | None:
+    for pattern in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(stamp, pattern).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class Media:
+    # "photo", "voice" or "document".
+    type: str
+    # Content hash of the bytes in the media cache.
+    hash: str
+    filename: str = ""
+
+
+# A WhatsApp message on its way to Telegram. `id` is WhatsApp's data-id and
+# `pre` its data-pre-plain-text, which together identify the message; the
+# chat id, sender and timestamp are parsed from them when the message is read.
+@dataclass(frozen=True, slots=True)
+class Message:
+    chat: str
+    text: str
+    id: str = ""
+    pre: str = ""
+    chat_id: str | None = None
+    sender: str = ""
+    timestamp: float | None = None
+    media: Media | None = None
+
+    @classmethod
+    def parse(
+        cls,
+        chat: str,
+        text: str,
+        id: str | None = None,
+        pre: str | None = None,
+        media: Media | None = None,
+    ) -> "Message":
+        id, pre = id or "", pre or ""
+        sender, timestamp = parse_pre(pre)
+        return cls(chat, text, id, pre, jid_of(id), sender, timestamp, media)
+
+    @property
+    def is_group(self) -> bool:
+        return bool(self.chat_id and self.chat_id.endswith("@g.us"))
+
+    @property
+    def body(self) -> str:
+        # The text as forwarded: in groups, prefixed with who wrote it.
+        if self.is_group and self.sender:
+            return f"{self.sender}: {self.text}" if self.text else f"{self.sender}:"
+        return self.text
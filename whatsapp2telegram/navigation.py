@@ -0,0 +1,58 @@
+import time
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from whatsapp2telegram import scripts
+
+
+# Brings WhatsApp Web back to the bare chat list without reloading the page:
+# Escape clears the search box and closes the open conversation. A full
+# reload, which re-downloads and re-syncs the whole app, is only the fallback
+# when the DOM health check fails afterwards.
+class NavigationManager:
+    def __init__(self, reload_cost: float = 15.0, max_escapes: int = 3):
+        self.reload_cost = reload_cost
+        self.max_escapes = max_escapes
+        self.reloads = 0
+        self.reloads_avoided = 0
+        self.time_saved = 0.0
+        self.needs_recovery = False
+
+    def return_to_chat_list(self, driver: WebDriver):
+        started = time.monotonic()
+        for _ in range(self.max_escapes):
+            ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+            if driver.execute_script(scripts.CHAT_LIST_HEALTHY):
+                elapsed = time.monotonic() - started
+                self.reloads_avoided += 1
+                self.time_saved += max(0.0, self.reload_cost - elapsed)
+                print(
+                    f"Returned to chat list in {elapsed * 1000:.0f}ms "
+                    f"(~{self.reload_cost - elapsed:.1f}s saved)"
+                )
+                return
+        print("Chat list health check failed, reloading page")
+        self.reload(driver)
+
+    def recover(self, driver: WebDriver):
+        # Runs before the next command when navigating away after a send
+        # failed; the send itself already succeeded and must not be retried.
+        if self.needs_recovery:
+            self.needs_recovery = False
+            self.reload(driver)
+
+    def reload(self, driver: WebDriver):
+        started = time.monotonic()
+        driver.refresh()
+        WebDriverWait(driver, 30).until(
+            EC.presence_of_element_located(
+                (By.XPATH, '//span[@data-icon="chats-filled"]')
+            )
+        )
+        self.reloads += 1
+        # Track the observed reload cost so time_saved stays realistic.
+        self.reload_cost = 0.8 * self.reload_cost + 0.2 * (time.monotonic() - started)
@@ -0,0 +1,117 @@
+import asyncio
+import heapq
+import itertools
+from typing import Callable
+
+from whatsapp2telegram.message_index import MessageIndex
+from whatsapp2telegram.models import Message
+
+PRIORITY_DIRECT = 0
+PRIORITY_GROUP = 1
+
+
+def priority_of(message: Message) -> int:
+    return PRIORITY_GROUP if message.is_group else PRIORITY_DIRECT
+
+
+# Sits between WhatsApp ingestion and the Telegram delivery queue. Claimed
+# messages wait in a bounded heap, direct chats ahead of groups and in arrival
+# order otherwise, and are handed to `forward` while fewer than
+# `max_in_flight` deliveries are pending. When Telegram throttles, the heap
+# fills and `submit` blocks, which slows ingestion down. A submit still
+# blocked after `put_timeout` sheds its message instead: it stays in the
+# message index outbox on disk, and so does every message after it until
+# the heap has drained to half its capacity and the outbox is read back in
+# claim order. Ingestion keeps cycling, memory stays bounded and no message
+# is lost or reordered within its chat.
+class ForwardPipeline:
+    def __init__(
+        self,
+        message_index: MessageIndex,
+        forward: Callable[[Message], None],
+        pending: Callable[[], int],
+        capacity: int = 500,
+        max_in_flight: int = 100,
+        put_timeout: float = 5.0,
+        poll_interval: float = 0.2,
+    ):
+        self.message_index = message_index
+        self.forward = forward
+        self.pending = pending
+        self.capacity = capacity
+        self.max_in_flight = max_in_flight
+        self.put_timeout = put_timeout
+        self.poll_interval = poll_interval
+        self.heap: list[tuple[int, int, Message]] = []
+        self.sequence = itertools.count()
+        self.changed = asyncio.Condition()
+        # Set while shed messages wait in the outbox.
+        self.spilling = False
+        self.forwarded = 0
+        self.shed = 0
+        self.refilled = 0
+        self.blocked_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def resume(self):
+        # Messages claimed before a restart are read back from the outbox as
+        # the heap has room, instead of all at once.
+        self.spilling = True
+
+    async def submit(self, message: Message) -> bool:
+        # Returns False when the message was already forwarded or is queued.
+        if not self.message_index.claim(message):
+            return False
+        async with self.changed:
+            if not self.spilling and len(self.heap) >= self.capacity:
+                started = asyncio.get_running_loop().time()
+                try:
+                    await asyncio.wait_for(
+                        self.changed.wait_for(lambda: len(self.heap) < self.capacity),
+                        self.put_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                self.blocked_seconds += asyncio.get_running_loop().time() - started
+            if self.spilling or len(self.heap) >= self.capacity:
+                self.message_index.defer(message)
+                self.shed += 1
+                self.spilling = True
+            else:
+                self._push(message)
+        return True
+
+    async def run(self):
+        while True:
+            if self.spilling and len(self.heap) <= self.capacity // 2:
+                await self._refill()
+            while self.pending() >= self.max_in_flight:
+                await asyncio.sleep(self.poll_interval)
+            async with self.changed:
+                await self.changed.wait_for(lambda: bool(self.heap) or self.spilling)
+                if not self.heap:
+                    continue
+                _, _, message = heapq.heappop(self.heap)
+                self.changed.notify_all()
+            self.forward(message)
+            self.forwarded += 1
+
+    async def _refill(self):
+        async with self.changed:
+            free = self.capacity - len(self.heap)
+            for message in self.message_index.pending_messages():
+                if free == 0:
+                    break
+                if self.message_index.claim(message):
+                    self._push(message)
+                    self.refilled += 1
+                    free -= 1
+            else:
+                self.spilling = False
+            self.changed.notify_all()
+
+    def _push(self, message: Message):
+        heapq.heappush(self.heap, (priority_of(message), next(self.sequence), message))
+        self.changed.notify_all()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import time
+
+PRUNE_EVERY = 1000
+
+
+# Maps every Telegram message the bridge sent to the WhatsApp message it
+# carries, so a Telegram reply resolves its WhatsApp chat and the message to
+# quote with one primary-key lookup. Only the newest `capacity` routes are
+# kept; replies to older messages fall back to the "From:" header.
+class ReplyMap:
+    def __init__(self, path: str = ":memory:", capacity: int = 100_000):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.capacity = capacity
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS routes ("
+            " telegram_chat_id TEXT NOT NULL,"
+            " telegram_message_id INTEGER NOT NULL,"
+            " chat TEXT NOT NULL,"
+            " whatsapp_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (telegram_chat_id, telegram_message_id)"
+            ") WITHOUT ROWID"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS routes_created_at ON routes (created_at)"
+        )
+        self.db.commit()
+        self._records = 0
+
+    def record(
+        self,
+        telegram_chat_id: str,
+        telegram_message_id: int,
+        chat: str,
+        whatsapp_id: str,
+    ):
+        self.db.execute(
+            "INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?)",
+            (telegram_chat_id, telegram_message_id, chat, whatsapp_id, time.time()),
+        )
+        self.db.commit()
+        self._records += 1
+        if self._records % PRUNE_EVERY == 0:
+            self.prune()
+
+    def resolve(
+        self, telegram_chat_id: str, telegram_message_id: int
+    ) -> tuple[str, str] | None:
+        row = self.db.execute(
+            "SELECT chat, whatsapp_id FROM routes"
+            " WHERE telegram_chat_id = ? AND telegram_message_id = ?",
+            (telegram_chat_id, telegram_message_id),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def prune(self) -> int:
+        cursor = self.db.execute(
+            "DELETE FROM routes WHERE created_at <= ("
+            " SELECT created_at FROM routes ORDER BY created_at DESC"
+            " LIMIT 1 OFFSET ?)",
+            (self.capacity,),
+        )
+        self.db.commit()
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+
+# Crash-safe queue of Telegram replies waiting to be sent to WhatsApp. A reply
+# stays in the queue, leased to its consumer, until it is acknowledged; a
+# negative acknowledgement schedules a retry with exponential backoff. Leases
+# left behind by a crash are released when the queue is reopened.
+class ReplyQueue:
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_attempts: int = 10,
+        base_backoff: float = 2,
+        max_backoff: float = 300,
+    ):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS replies ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " chat TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " leased INTEGER NOT NULL DEFAULT 0,"
+            " quote TEXT NOT NULL DEFAULT ''"
+            ")"
+        )
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(replies)")}
+        if "quote" not in columns:
+            self.db.execute(
+                "ALTER TABLE replies ADD COLUMN quote TEXT NOT NULL DEFAULT ''"
+            )
+        self.db.execute("UPDATE replies SET leased = 0")
+        self.db.commit()
+        self._available = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM replies").fetchone()[0]
+
+    def put(self, reply: dict[str, str]) -> int:
+        cursor = self.db.execute(
+            "INSERT INTO replies (chat, text, quote, next_attempt_at)"
+            " VALUES (?, ?, ?, ?)",
+            (reply["chat"], reply["text"], reply.get("quote", ""), time.time()),
+        )
+        self.db.commit()
+        self._available.set()
+        return cursor.lastrowid  # type: ignore
+
+    def get_nowait(self) -> tuple[int, dict[str, str]] | None:
+        row = self.db.execute(
+            "SELECT id, chat, text, quote FROM replies"
+            " WHERE leased = 0 AND next_attempt_at <= ?"
+            " ORDER BY next_attempt_at, id LIMIT 1",
+            (time.time(),),
+        ).fetchone()
+        if row is None:
+            return None
+        self.db.execute("UPDATE replies SET leased = 1 WHERE id = ?", (row[0],))
+        self.db.commit()
+        reply = {"chat": row[1], "text": row[2]}
+        if row[3]:
+            # The WhatsApp message id to send the reply as a quote of.
+            reply["quote"] = row[3]
+        return row[0], reply
+
+    async def get(self) -> tuple[int, dict[str, str]]:
+        while True:
+            self._available.clear()
+            item = self.get_nowait()
+            if item is not None:
+                return item
+            try:
+                await asyncio.wait_for(self._available.wait(), self._next_due_in())
+            except asyncio.TimeoutError:
+                pass
+
+    async def get_batch(self, limit: int = 20) -> list[tuple[int, dict[str, str]]]:
+        # Waits for one reply, then takes whatever else is already due.
+        batch = [await self.get()]
+        while len(batch) < limit and (item := self.get_nowait()) is not None:
+            batch.append(item)
+        return batch
+
+    def ack(self, reply_id: int):
+        self.db.execute("DELETE FROM replies WHERE id = ?", (reply_id,))
+        self.db.commit()
+
+    def nack(self, reply_id: int):
+        row = self.db.execute(
+            "SELECT attempts, chat FROM replies WHERE id = ?", (reply_id,)
+        ).fetchone()
+        if row is None:
+            return
+        attempts = row[0] + 1
+        if attempts >= self.max_attempts:
+            print(
+                f"[reply_queue] Dropping reply to '{row[1]}' after {attempts} attempts"
+            )
+            self.ack(reply_id)
+            return
+        delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+        self.db.execute(
+            "UPDATE replies SET attempts = ?, next_attempt_at = ?, leased = 0"
+            " WHERE id = ?",
+            (attempts, time.time() + delay, reply_id),
+        )
+        self.db.commit()
+        self._available.set()
+
+    def close(self):
+        self.db.close()
+
+    def _next_due_in(self) -> float | None:
+        row = self.db.execute(
+            "SELECT MIN(next_attempt_at) FROM replies WHERE leased = 0"
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+
+
+# Picks how long to wait before the next ingestion cycle: the shortest
+# interval right after activity, backing off exponentially while idle.
+class AdaptiveInterval:
+    def __init__(self, min_interval: float, max_interval: float, backoff: float = 2):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def next(self, active: bool) -> float:
+        if active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return self.interval
+
+
+@dataclass
+class CycleStats:
+    chats: int = 0
+    messages: int = 0
+    deferred: int = 0
+
+
+# Orders unread chats by configurable weight, so direct chats can go before
+# noisy groups, then smallest first, and caps the messages read per cycle so one huge group cannot
+# hold up everything else. Opening a chat marks all of it read, so a chat is
+# always read whole; the budget decides which chats wait for the next cycle.
+# Chats that wait gain priority every cycle, so low weights never starve.
+class ChatScheduler:
+    def __init__(
+        self,
+        weights: dict[str, float] | None = None,
+        default_weight: float = 1,
+        max_messages_per_cycle: int = 200,
+        interval: AdaptiveInterval | None = None,
+    ):
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.max_messages_per_cycle = max_messages_per_cycle
+        self.interval = interval or AdaptiveInterval(1, 30)
+        self.waiting: dict[str, int] = {}
+        self.last_cycle = CycleStats()
+        self.cycles = 0
+
+    def weight(self, chat: str) -> float:
+        return self.weights.get(chat, self.default_weight)
+
+    def plan(
+        self, unread: list[dict[str, int | str]]
+    ) -> tuple[list[dict[str, int | str]], list[dict[str, int | str]]]:
+        # Returns the chats to read now and the chats deferred to a later
+        # cycle, each as {"chat": name, "count": unread count}.
+        ranked = sorted(
+            unread,
+            key=lambda c: (
+                -self.weight(str(c["chat"])) * (1 + self.waiting.get(str(c["chat"]), 0)),
+                int(c["count"]),
+            ),
+        )
+        selected: list[dict[str, int | str]] = []
+        deferred: list[dict[str, int | str]] = []
+        budget = self.max_messages_per_cycle
+        for chat in ranked:
+            count = int(chat["count"])
+            if selected and count > budget:
+                deferred.append(chat)
+                continue
+            selected.append(chat)
+            budget -= count
+
+        # Chats read elsewhere in the meantime stop waiting.
+        self.waiting = {
+            str(c["chat"]): self.waiting[str(c["chat"])]
+            for c in deferred
+            if str(c["chat"]) in self.waiting
+        }
+        for chat in deferred:
+            self.waiting[str(chat["chat"])] = self.waiting.get(str(chat["chat"]), 0) + 1
+        self.cycles += 1
+        self.last_cycle = CycleStats(
+            chats=len(selected),
+            messages=sum(int(c["count"]) for c in selected),
+            deferred=len(deferred),
+        )
+        return selected, deferred
+
+    def next_interval(self, found_messages: bool) -> float:
+        # Deferred chats are work already waiting, so they count as activity.
+        previous = self.interval.interval
+        interval = self.interval.next(found_messages or self.last_cycle.deferred > 0)
+        if interval != previous:
+            print(f"[scheduler] Next cycle in {interval:.1f}s")
+        return interval
@@ -0,0 +1,427 @@
+UNREAD_BADGE_SELECTOR = ", ".join(
+    [
+        "#pane-side span[aria-label*='unread message']",
+        "#pane-side span[aria-label*='непрочитанное сообщение']",
+        "#pane-side span[aria-label*='непрочитанных']",
+    ]
+)
+
+MESSAGE_TEXT_SELECTOR = "span.selectable-text.copyable-text > span"
+
+CHAT_HEADER_XPATH = "//header/div[2]/div/div/div/span"
+
+# Returns {url, type, filename} for the media a message row holds as a blob:
+# URL (images, voice notes, downloaded documents), or null.
+MEDIA_OF = """
+const mediaOf = (node) => {
+    const img = node.querySelector('img[src^="blob:"]');
+    if (img) return {url: img.src, type: 'photo', filename: ''};
+    const audio = node.querySelector('audio[src^="blob:"]');
+    if (audio) return {url: audio.src, type: 'voice', filename: ''};
+    const link = node.querySelector('a[href^="blob:"]');
+    if (link) {
+        return {url: link.href, type: 'document', filename: link.getAttribute('download') || ''};
+    }
+    return null;
+};
+"""
+
+# Installs (once per page load) a MutationObserver that buffers new-message
+# events in `window.__w2t`, then returns and clears the buffer. Returns null
+# when the chat list is not rendered, i.e. the session is not authenticated.
+DRAIN_EVENTS = f"""
+const BADGES = {UNREAD_BADGE_SELECTOR!r};
+const TEXTS = {MESSAGE_TEXT_SELECTOR!r};
+const HEADER = {CHAT_HEADER_XPATH!r};
+const SUSPEND_TIMEOUT_MS = 5000;
+const MAX_SEEN = 5000;
+
+const pane = document.getElementById('pane-side');
+if (!pane) return null;
+{MEDIA_OF}
+const currentChat = () => {{
+    const node = document.evaluate(
+        HEADER, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+    return node ? node.textContent : null;
+}};
+
+if (!window.__w2t) {{
+    const state = {{
+        events: [],
+        seen: new Set(),
+        unread: new Map(),
+        held: new Map(),
+        chat: null,
+        suspended: false,
+        suspendedAt: 0,
+        scanTimer: null,
+    }};
+
+    state.suspend = () => {{
+        if (state.suspended) return;
+        state.suspended = true;
+        state.suspendedAt = Date.now();
+    }};
+
+    // Ends a suspension. Messages rendered while suspended are held back;
+    // those rendered after the last message Python extracted itself arrived
+    // while the chat was being read and are emitted now, the rest is history.
+    state.baseline = (extracted) => {{
+        const ids = new Set(extracted || []);
+        const last = extracted && extracted.length
+            ? document.querySelector(`#main [data-id="${{CSS.escape(extracted[extracted.length - 1])}}"]`)
+            : null;
+        state.held.forEach((held, id) => {{
+            if (!last || ids.has(id) || !held.node.isConnected) return;
+            if (last.compareDocumentPosition(held.node) & Node.DOCUMENT_POSITION_FOLLOWING) {{
+                state.events.push(held.event);
+            }}
+        }});
+        state.held.clear();
+        if (state.seen.size > MAX_SEEN) state.seen.clear();
+        document.querySelectorAll('#main [data-id]').forEach(
+            (node) => state.seen.add(node.getAttribute('data-id'))
+        );
+        state.chat = currentChat();
+        state.suspended = false;
+    }};
+
+    // Forgets the last known unread count of a chat so that the next scan
+    // emits it again while its badge is still present.
+    state.retry = (chat) => {{
+        state.unread.delete(chat);
+        if (!state.scanTimer) state.scanTimer = setTimeout(state.scanChats, 200);
+    }};
+
+    state.scanChats = () => {{
+        state.scanTimer = null;
+        const current = new Map();
+        document.querySelectorAll(BADGES).forEach((badge) => {{
+            const row = badge.closest('[role="listitem"], [role="row"]');
+            const title = row && row.querySelector('span[title]');
+            const count = parseInt(badge.getAttribute('aria-label'), 10);
+            if (!title || !count) return;
+            current.set(title.getAttribute('title'), count);
+        }});
+        current.forEach((count, chat) => {{
+            if (count > (state.unread.get(chat) || 0)) {{
+                state.events.push({{type: 'unread', chat: chat, count: count}});
+            }}
+        }});
+        state.unread = current;
+    }};
+
+    state.collect = (node) => {{
+        const nodes = node.matches('[data-id]')
+            ? [node]
+            : node.querySelectorAll('[data-id]');
+        nodes.forEach((message) => {{
+            const id = message.getAttribute('data-id');
+            if (state.seen.has(id)) return;
+            state.seen.add(id);
+            if (!id.startsWith('false_')) return;
+            const copyable = message.querySelector('.copyable-text');
+            const media = mediaOf(message);
+            if (!copyable && !media) return;
+            const text = Array.from(message.querySelectorAll(TEXTS))
+                .map((span) => span.innerText)
+                .join('\\n');
+            const event = {{
+                type: 'message',
+                chat: state.chat,
+                id: id,
+                pre: (copyable && copyable.getAttribute('data-pre-plain-text')) || '',
+                text: text,
+                media: media,
+            }};
+            if (state.suspended) state.held.set(id, {{event: event, node: message}});
+            else state.events.push(event);
+        }});
+    }};
+
+    state.observer = new MutationObserver((mutations) => {{
+        const chat = currentChat();
+        if (chat !== state.chat) {{
+            // A conversation we did not open ourselves: hold its rendering
+            // back until Python baselines it (or the suspension times out).
+            state.chat = chat;
+            if (chat) state.suspend();
+        }}
+        for (const mutation of mutations) {{
+            const target = mutation.target;
+            if (target.closest && target.closest('#pane-side')) {{
+                if (!state.scanTimer) state.scanTimer = setTimeout(state.scanChats, 200);
+                continue;
+            }}
+            if (!(target.closest && target.closest('#main'))) continue;
+            mutation.addedNodes.forEach((node) => {{
+                if (node.nodeType === Node.ELEMENT_NODE) state.collect(node);
+            }});
+        }}
+    }});
+
+    state.observer.observe(document.getElementById('app') || document.body, {{
+        childList: true,
+        subtree: true,
+        attributes: true,
+        attributeFilter: ['aria-label'],
+    }});
+    state.baseline();
+    state.scanChats();
+    window.__w2t = state;
+}}
+
+if (
+    window.__w2t.suspended &&
+    Date.now() - window.__w2t.suspendedAt > SUSPEND_TIMEOUT_MS
+) {{
+    window.__w2t.baseline(null);
+}}
+
+const events = window.__w2t.events;
+window.__w2t.events = [];
+return events;
+"""
+
+# Returns every chat with an unread badge in a single pass over the chat list.
+SCAN_UNREAD_CHATS = f"""
+const chats = [];
+document.querySelectorAll({UNREAD_BADGE_SELECTOR!r}).forEach((badge) => {{
+    const row = badge.closest('[role="listitem"], [role="row"]');
+    const title = row && row.querySelector('span[title]');
+    const count = parseInt(badge.getAttribute('aria-label'), 10);
+    if (title && count) chats.push({{chat: title.getAttribute('title'), count: count}});
+}});
+return chats;
+"""
+
+# Defines messageRows(), the top-level text and media rows of the open
+# conversation in page order, messageOf(row), the fields Python reads from one
+# of them, and chatHeader(), the conversation's name. Needs MEDIA_OF.
+MESSAGE_ROWS = f"""
+const messageRows = () => Array.from(document.querySelectorAll('#main [data-id]'))
+    .filter((row) => !row.parentElement.closest('[data-id]')
+        && (row.querySelector('.copyable-text') || mediaOf(row)));
+const messageOf = (row) => {{
+    const copyable = row.querySelector('div.copyable-text');
+    return {{
+        id: row.getAttribute('data-id'),
+        pre: copyable ? copyable.getAttribute('data-pre-plain-text') : null,
+        text: Array.from(row.querySelectorAll({MESSAGE_TEXT_SELECTOR!r}))
+            .map((span) => span.innerText)
+            .join('\\n'),
+        media: mediaOf(row),
+    }};
+}};
+const chatHeader = () => {{
+    const header = document.evaluate(
+        {CHAT_HEADER_XPATH!r}, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+    return header ? header.textContent : null;
+}};
+"""
+
+# Returns the open conversation name and its last `arguments[0]` messages,
+# counting text and media messages alike.
+EXTRACT_OPEN_CHAT = f"""
+const count = arguments[0];
+{MEDIA_OF}
+{MESSAGE_ROWS}
+return {{chat: chatHeader(), messages: messageRows().slice(-count).map(messageOf)}};
+"""
+
+# Asynchronous. Scrolls the open conversation up, one screen of history per
+# step, until the message with data-id `arguments[0]` is rendered, at most
+# `arguments[1]` times, waiting `arguments[2]` ms after each scroll for
+# WhatsApp Web to load older messages. Stops early once three scrolls in a
+# row load nothing. Calls back with {found, scrolls}.
+SCROLL_TO_MESSAGE = f"""
+const [since, maxScrolls, settleMs] = arguments;
+const done = arguments[arguments.length - 1];
+{MEDIA_OF}
+{MESSAGE_ROWS}
+const rendered = () => since !== null
+    && document.querySelector(`#main [data-id="${{CSS.escape(since)}}"]`);
+const scroller = () => {{
+    let node = messageRows()[0];
+    while (node && node !== document.body) {{
+        if (node.scrollHeight > node.clientHeight + 1) return node;
+        node = node.parentElement;
+    }}
+    return null;
+}};
+let scrolls = 0;
+let idle = 0;
+const step = () => {{
+    if (rendered()) return done({{found: true, scrolls: scrolls}});
+    const pane = scroller();
+    if (!pane || scrolls >= maxScrolls || idle >= 3) {{
+        return done({{found: false, scrolls: scrolls}});
+    }}
+    const before = messageRows().length;
+    pane.scrollTop = 0;
+    scrolls += 1;
+    setTimeout(() => {{
+        idle = messageRows().length > before ? 0 : idle + 1;
+        step();
+    }}, settleMs);
+}};
+step();
+"""
+
+# Returns up to `arguments[1]` messages of the open conversation that follow
+# the one with data-id `arguments[0]`, oldest first; all of them from the
+# oldest rendered one when it is not rendered. `newest` is the data-id of the
+# last rendered message and `complete` tells whether the page reaches it.
+EXTRACT_AFTER = f"""
+const [since, limit] = arguments;
+{MEDIA_OF}
+{MESSAGE_ROWS}
+const rows = messageRows();
+const index = rows.findIndex((row) => row.getAttribute('data-id') === since);
+const page = rows.slice(index + 1, index + 1 + limit);
+return {{
+    chat: chatHeader(),
+    found: index >= 0,
+    messages: page.map(messageOf),
+    newest: rows.length ? rows[rows.length - 1].getAttribute('data-id') : null,
+    complete: index + 1 + limit >= rows.length,
+}};
+"""
+
+# Suspends observer emission (the conversation pane is about to be re-rendered
+# by a click we make ourselves) and returns {row, position} for the chat list
+# row titled `arguments[0]`. When several chats share the name, the row
+# closest to the last seen position `arguments[1]` wins. When the virtualized
+# list has not rendered the row, scrolls towards that position and returns
+# null so a retry can find it.
+FIND_CHAT_ROW = """
+const chat = arguments[0];
+const position = arguments[1];
+if (window.__w2t) window.__w2t.suspend();
+const pane = document.getElementById('pane-side');
+if (!pane) return null;
+const offset = (row) =>
+    row.getBoundingClientRect().top - pane.getBoundingClientRect().top + pane.scrollTop;
+const rows = Array.from(pane.querySelectorAll('span[title]'))
+    .filter((title) => title.getAttribute('title') === chat)
+    .map((title) => title.closest('[role="listitem"], [role="row"]') || title);
+if (!rows.length) {
+    if (position !== null && position !== undefined) {
+        pane.scrollTop = Math.max(0, position - pane.clientHeight / 2);
+    }
+    return null;
+}
+let best = rows[0];
+if (position !== null && position !== undefined) {
+    rows.forEach((row) => {
+        if (Math.abs(offset(row) - position) < Math.abs(offset(best) - position)) {
+            best = row;
+        }
+    });
+}
+return {row: best, position: offset(best)};
+"""
+
+# Returns {jid} once the conversation titled `arguments[0]` is open with its
+# composer rendered, null until then. The JID comes from the data-id of the
+# newest rendered message and is null for an empty conversation.
+CHAT_IDENTITY = f"""
+const header = document.evaluate(
+    {CHAT_HEADER_XPATH!r}, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+if (!header || header.textContent !== arguments[0]) return null;
+if (!document.querySelector("#main div[contenteditable='true'][data-tab='10']")) {{
+    return null;
+}}
+const rows = document.querySelectorAll('#main [data-id]');
+const id = rows.length ? rows[rows.length - 1].getAttribute('data-id') : '';
+const parts = id.split('_');
+return {{jid: parts.length > 2 && parts[1].includes('@') ? parts[1] : null}};
+"""
+
+# Suspends observer emission before a chat is opened through the search box.
+SUSPEND_OBSERVER = """
+if (window.__w2t) window.__w2t.suspend();
+"""
+
+# Marks every rendered message of the open conversation as already seen so
+# that only messages arriving afterwards are emitted by the observer.
+# `arguments[0]` lists the ids Python extracted itself, or is null.
+BASELINE_OPEN_CHAT = """
+if (window.__w2t) window.__w2t.baseline(arguments[0]);
+"""
+
+# Asks the observer to emit an unread chat again on its next scan.
+RETRY_UNREAD_CHAT = """
+if (window.__w2t) window.__w2t.retry(arguments[0]);
+"""
+
+# Cheap DOM health check used to decide whether the page can be reused after
+# navigating back to the chat list, or needs a full reload.
+CHAT_LIST_HEALTHY = """
+const pane = document.getElementById('pane-side');
+if (!pane || !pane.querySelector('span[title]')) return false;
+if (document.querySelector('[role="dialog"]')) return false;
+const search = document.querySelector(
+    "div[contenteditable='true'][aria-autocomplete='list']"
+);
+if (search && search.textContent.trim()) return false;
+return !document.querySelector('#main');
+"""
+
+# Asynchronously fetches a blob: URL into a page-side buffer and reports its
+# size, so the bytes can be read back in chunks instead of one huge response.
+FETCH_BLOB = """
+const url = arguments[0];
+const done = arguments[arguments.length - 1];
+fetch(url)
+    .then((response) => response.arrayBuffer())
+    .then((buffer) => {
+        window.__w2tBlobs = window.__w2tBlobs || {};
+        window.__w2tBlobs[url] = new Uint8Array(buffer);
+        done(buffer.byteLength);
+    })
+    .catch(() => done(null));
+"""
+
+# Returns bytes [arguments[1], arguments[1] + arguments[2]) of a fetched blob
+# as base64.
+READ_BLOB_CHUNK = """
+const bytes = window.__w2tBlobs[arguments[0]];
+const chunk = bytes.subarray(arguments[1], arguments[1] + arguments[2]);
+let binary = '';
+for (let i = 0; i < chunk.length; i += 0x8000) {
+    binary += String.fromCharCode.apply(null, chunk.subarray(i, i + 0x8000));
+}
+return btoa(binary);
+"""
+
+RELEASE_BLOB = """
+if (window.__w2tBlobs) delete window.__w2tBlobs[arguments[0]];
+"""
+
+# Opens the message menu of the WhatsApp message `arguments[0]` in the open
+# conversation, so its "Reply" item can be clicked. Returns false when the
+# message is not rendered.
+OPEN_MESSAGE_MENU = """
+const row = document.querySelector(`#main [data-id="${CSS.escape(arguments[0])}"]`);
+if (!row) return false;
+row.scrollIntoView({block: 'center'});
+row.dispatchEvent(new MouseEvent('mouseover', {bubbles: true}));
+const icon = row.querySelector('[data-icon="down-context"], [data-icon="ic-chevron-down-menu"]');
+if (!icon) return false;
+(icon.closest('[role="button"]') || icon).click();
+return true;
+"""
+
+# What a freshly loaded WhatsApp Web shows: "chats" once the chat list is
+# rendered, "qr" when the device must be linked, null while still loading.
+STARTUP_STATE = """
+if (document.getElementById('pane-side')) return 'chats';
+if (document.querySelector("canvas[aria-label='Scan this QR code to link a device!']")) {
+    return 'qr';
+}
+return null;
+"""
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+import tarfile
+import time
+
+# Files Chrome uses to lock a profile to one running browser.
+PROFILE_LOCKS = {"SingletonLock", "SingletonSocket", "SingletonCookie"}
+# Disposable caches, rebuilt by Chrome as needed.
+PROFILE_CACHES = {"Cache", "Code Cache", "GPUCache", "GrShaderCache", "Crashpad"}
+# What WhatsApp Web needs to resume a linked session: its IndexedDB, which
+# holds the session keys, its local storage, and the profile settings Chrome
+# reads on launch. Everything else in a profile is rebuilt on the fly.
+SESSION_PATHS = (
+    "Local State",
+    "Default/Preferences",
+    "Default/Local Storage",
+    "Default/IndexedDB/https_web.whatsapp.com_0.indexeddb.leveldb",
+    "Default/IndexedDB/https_web.whatsapp.com_0.indexeddb.blob",
+)
+# Present in every profile that has been logged in to WhatsApp Web.
+SESSION_MARKER = "Default/IndexedDB/https_web.whatsapp.com_0.indexeddb.leveldb"
+# LevelDB's lock file, held by the Chrome that has the database open.
+SKIPPED_FILES = PROFILE_LOCKS | {"LOCK"}
+
+
+def has_session(user_data_dir: str) -> bool:
+    return os.path.isdir(os.path.join(user_data_dir, SESSION_MARKER))
+
+
+def in_session(name: str) -> bool:
+    return any(name == path or name.startswith(f"{path}/") for path in SESSION_PATHS)
+
+
+def session_files(user_data_dir: str) -> set[str]:
+    # Paths relative to the profile, with "/" separators as in SESSION_PATHS.
+    files: set[str] = set()
+    for path in SESSION_PATHS:
+        full_path = os.path.join(user_data_dir, path)
+        if os.path.isfile(full_path):
+            files.add(path)
+        for root, _, names in os.walk(full_path):
+            relative = os.path.relpath(root, user_data_dir).replace(os.sep, "/")
+            files.update(
+                f"{relative}/{name}" for name in names if name not in SKIPPED_FILES
+            )
+    return files
+
+
+def prune_caches(user_data_dir: str) -> int:
+    # Removes Chrome's disposable caches from a profile no browser has open;
+    # returns the bytes freed.
+    freed = 0
+    for root, dirs, _ in os.walk(user_data_dir):
+        for name in [d for d in dirs if d in PROFILE_CACHES]:
+            cache = os.path.join(root, name)
+            for cache_root, _, names in os.walk(cache):
+                for file in names:
+                    try:
+                        freed += os.path.getsize(os.path.join(cache_root, file))
+                    except OSError:
+                        pass
+            shutil.rmtree(cache, ignore_errors=True)
+            dirs.remove(name)
+    return freed
+
+
+# A compressed, checksummed archive of the part of a Chrome profile that
+# keeps WhatsApp Web logged in, at `path`, with its SHA-256 next to it in
+# sha256sum format. A profile without a session is restored from it before
+# Chrome launches, so a new pod, volume or replica taking over an account
+# starts logged in instead of sending a QR code. Each save replaces the
+# previous archive; neither is ever half written.
+class SessionSnapshot:
+    def __init__(
+        self,
+        path: str,
+        interval: float = 3600,
+        compresslevel: int = 6,
+        attempts: int = 3,
+    ):
+        self.path = path
+        self.checksum_path = f"{path}.sha256"
+        self.interval = interval
+        self.compresslevel = compresslevel
+        self.attempts = attempts
+        self.saves = 0
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.saved_at = os.path.getmtime(path) if os.path.exists(path) else None
+
+    def due(self) -> bool:
+        return self.saved_at is None or time.time() - self.saved_at >= self.interval
+
+    def save(self, user_data_dir: str) -> bool:
+        if not has_session(user_data_dir):
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        # Chrome keeps the profile open meanwhile. LevelDB recovers a log
+        # copied mid-write, but not files replaced by a compaction between
+        # being listed and copied, so such a snapshot is taken again.
+        for _ in range(self.attempts):
+            files = session_files(user_data_dir)
+            try:
+                with tarfile.open(
+                    temporary, "w:gz", compresslevel=self.compresslevel
+                ) as archive:
+                    for name in sorted(files):
+                        archive.add(
+                            os.path.join(user_data_dir, name), name, recursive=False
+                        )
+            except FileNotFoundError:
+                continue
+            if session_files(user_data_dir) == files:
+                break
+        else:
+            print("[snapshot] The profile kept changing, snapshot skipped")
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return False
+        with open(temporary, "rb") as archive_file:
+            digest = hashlib.file_digest(archive_file, "sha256").hexdigest()
+        os.replace(temporary, self.path)
+        with open(f"{self.checksum_path}.tmp", "w") as checksum_file:
+            checksum_file.write(f"{digest}  {os.path.basename(self.path)}\n")
+        os.replace(f"{self.checksum_path}.tmp", self.checksum_path)
+        self.saves += 1
+        self.size = os.path.getsize(self.path)
+        self.saved_at = time.time()
+        print(f"[snapshot] Session saved to {self.path} ({self.size >> 10} KiB)")
+        return True
+
+    def verify(self) -> bool:
+        try:
+            with open(self.checksum_path) as checksum_file:
+                expected = checksum_file.read().split()[0]
+            with open(self.path, "rb") as archive_file:
+                digest = hashlib.file_digest(archive_file, "sha256").hexdigest()
+        except (OSError, IndexError):
+            return False
+        return digest == expected
+
+    def restore(self, user_data_dir: str) -> bool:
+        # Restores into a profile without a session; returns whether it did.
+        if has_session(user_data_dir) or not os.path.exists(self.path):
+            return False
+        if not self.verify():
+            print(f"[snapshot] {self.path} does not match its checksum, not restoring")
+            return False
+        staging = f"{os.path.abspath(user_data_dir)}.restoring"
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            with tarfile.open(self.path, "r:gz") as archive:
+                members = [
+                    member
+                    for member in archive.getmembers()
+                    if member.isfile() and in_session(member.name)
+                ]
+                archive.extractall(staging, members=members, filter="data")
+            for path in SESSION_PATHS:
+                source = os.path.join(staging, path)
+                if not os.path.exists(source):
+                    continue
+                target = os.path.join(user_data_dir, path)
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+        except (OSError, tarfile.TarError, EOFError) as e:
+            print(f"[snapshot] Restoring {self.path} failed: {e}")
+            return False
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        print(f"[snapshot] Session restored from {self.path}")
+        return True
@@ -0,0 +1,109 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+MAX_BODY_SIZE = 1024 * 1024
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    headers: dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: str | bytes = ""
+    content_type: str = "text/plain; charset=utf-8"
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+# A small HTTP/1.1 server on the event loop for metrics, health probes and
+# other endpoints the bridge exposes on the Service port. One request per
+# connection; handlers must not block.
+class StatusServer:
+    def __init__(self, host: str = "0.0.0.0", port: int = 6000):
+        self.host = host
+        self.port = port
+        self.routes: dict[tuple[str, str], Handler] = {}
+        self._server: asyncio.AbstractServer | None = None
+
+    def route(self, method: str, path: str, handler: Handler):
+        self.routes[(method, path)] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        print(f"Status server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            response = await self._respond(reader)
+            body = response.body
+            if isinstance(body, str):
+                body = body.encode()
+            writer.write(
+                (
+                    f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}\r\n"
+                    f"Content-Type: {response.content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, reader: asyncio.StreamReader) -> Response:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers: dict[str, str] = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", "0"))
+        except (ValueError, asyncio.TimeoutError):
+            return Response(400, "bad request\n")
+        if length > MAX_BODY_SIZE:
+            return Response(413, "payload too large\n")
+        body = await reader.readexactly(length) if length else b""
+        path = target.split("?", 1)[0]
+        handler = self.routes.get((method, path))
+        if handler is None:
+            known = any(route_path == path for _, route_path in self.routes)
+            return Response(405 if known else 404, "not found\n")
+        try:
+            return await handler(Request(method, path, headers, body))
+        except Exception as e:
+            print(f"[status] {method} {path} failed: {e}")
+            return Response(500, "internal error\n")
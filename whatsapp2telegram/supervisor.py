@@ -0,0 +1,116 @@
+import shutil
+from typing import Callable
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.common.exceptions import WebDriverException
+
+from whatsapp2telegram.driver_executor import DriverExecutor
+from whatsapp2telegram.session_snapshot import PROFILE_CACHES, PROFILE_LOCKS
+
+
+# Keeps a second Chrome warm so that a crashed or hung session can be replaced
+# in seconds instead of cold-launching Chrome. Chrome locks a profile to one
+# browser, so the standby runs on a snapshot of the active profile, and it
+# idles on about:blank: opening WhatsApp Web in two browsers at once would
+# make them fight over the session. The standby has its own worker thread so
+# warming it never blocks commands on the active driver.
+class SessionSupervisor:
+    def __init__(
+        self,
+        create_driver: Callable[[str], WebDriver],
+        user_data_dir: str,
+        url: str = "https://web.whatsapp.com",
+    ):
+        self.create_driver = create_driver
+        self.url = url
+        # [active profile, standby profile]; swapped on every promotion.
+        self.profiles = [user_data_dir, f"{user_data_dir}-standby"]
+        self.active: WebDriver | None = None
+        self.standby: WebDriver | None = None
+        self.executor = DriverExecutor(name="whatsapp-standby")
+        self.recoveries = 0
+        self.cold_restarts = 0
+        self.last_recovery_time = 0.0
+        self.max_recovery_time = 0.0
+
+    def launch(self) -> WebDriver:
+        self.active = self.create_driver(self.profiles[0])
+        self.active.get(self.url)
+        return self.active
+
+    @staticmethod
+    def probe(driver: WebDriver | None) -> bool:
+        if driver is None:
+            return False
+        try:
+            return driver.execute_script("return 1") == 1
+        except WebDriverException:
+            return False
+
+    async def ensure_standby(self):
+        if self.standby is not None:
+            if await self.executor.run(self.probe, self.standby):
+                return
+            print("[supervisor] Standby session died, replacing it")
+            await self.executor.run(self._quit, self.standby)
+            self.standby = None
+        self.standby = await self.executor.run(self._launch_standby)
+        print("[supervisor] Standby session ready")
+
+    def _launch_standby(self) -> WebDriver:
+        self._snapshot(self.profiles[0], self.profiles[1])
+        driver = self.create_driver(self.profiles[1])
+        driver.get("about:blank")
+        return driver
+
+    @staticmethod
+    def _snapshot(source: str, target: str):
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(
+            source,
+            target,
+            ignore=lambda _, names: [
+                n for n in names if n in PROFILE_LOCKS or n in PROFILE_CACHES
+            ],
+            ignore_dangling_symlinks=True,
+        )
+
+    def promote(self) -> WebDriver | None:
+        # Replaces the active session with the standby one. Returns None when
+        # no healthy standby is available and a cold start is needed.
+        standby, self.standby = self.standby, None
+        if standby is None:
+            return None
+        if not self.probe(standby):
+            self._quit(standby)
+            return None
+        self._quit(self.active)
+        self.profiles.reverse()
+        self.active = standby
+        standby.get(self.url)
+        return standby
+
+    def record_recovery(self, duration: float, warm: bool):
+        self.recoveries += 1
+        if not warm:
+            self.cold_restarts += 1
+        self.last_recovery_time = duration
+        self.max_recovery_time = max(self.max_recovery_time, duration)
+        print(
+            f"[supervisor] Recovered in {duration:.1f}s "
+            f"({'standby' if warm else 'cold start'})"
+        )
+
+    async def close(self):
+        if self.standby is not None:
+            await self.executor.run(self._quit, self.standby)
+            self.standby = None
+        self.executor.shutdown(wait=True)
+
+    @staticmethod
+    def _quit(driver: WebDriver | None):
+        if driver is None:
+            return
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
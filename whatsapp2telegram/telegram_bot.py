@@ -1,3 +1,7 @@
+import asyncio
+import io
+from typing import Any
+
 from telegram import Update
 from telegram.request import HTTPXRequest
 from telegram.ext import (
@@ -8,21 +12,69 @@ from telegram.ext import (
     ContextTypes,
 )
 
+from whatsapp2telegram.delivery import DeliveryQueue
+from whatsapp2telegram.digest import Digester, DigestPolicy
+from whatsapp2telegram.media_cache import MediaCache
+from whatsapp2telegram.models import Media, Message
+from whatsapp2telegram.reply_map import ReplyMap
+from whatsapp2telegram.reply_queue import ReplyQueue
+
+CONNECTION_POOL_SIZE = 8
+
 
 class TelegramBot:
-    def __init__(self, token: str, chat_id: str):
+    def __init__(
+        self,
+        token: str,
+        chat_id: str,
+        replies: ReplyQueue | None = None,
+        base_url: str | None = None,
+        media_cache: MediaCache | None = None,
+        reply_map: ReplyMap | None = None,
+        webhook_url: str | None = None,
+        webhook_secret: str | None = None,
+        digest_policy: DigestPolicy | None = None,
+    ):
         self.token = token
         self.chat_id = chat_id
+        # With a webhook, Telegram POSTs updates to the bridge's HTTP server,
+        # which hands them to receive_update, instead of being long-polled.
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
         request = HTTPXRequest(
-            connection_pool_size=8,
+            connection_pool_size=CONNECTION_POOL_SIZE,
             read_timeout=30,
             write_timeout=30,
             connect_timeout=30,
         )
-        self.application = (
-            Application.builder().token(self.token).request(request=request).build()
+        builder = Application.builder().token(self.token).request(request=request)
+        if base_url:
+            # A different Bot API server, e.g. a local one for benchmarks.
+            builder = builder.base_url(base_url)
+        self.application = builder.build()
+        # Replies waiting for WhatsApp, per Telegram chat the bot serves.
+        self.reply_queues: dict[str, ReplyQueue] = {chat_id: replies or ReplyQueue()}
+        self.media_cache = media_cache or MediaCache()
+        self.reply_map = reply_map or ReplyMap()
+        self.delivery = DeliveryQueue(
+            self._send_text,
+            self._format_message,
+            concurrency=CONNECTION_POOL_SIZE,
+            send_media=self._send_media,
+            on_sent=self._record_route,
+            edit=self._edit_text,
         )
-        self.replies: list[dict[str, str]] = []
+        self.digests = Digester(self.delivery, digest_policy)
+        self._started = asyncio.Event()
+
+    @property
+    def replies(self) -> ReplyQueue:
+        return self.reply_queues[self.chat_id]
+
+    def add_chat(self, chat_id: str, replies: ReplyQueue | None = None):
+        # Serves one more Telegram chat over the same application, connection
+        # pool and delivery queue.
+        self.reply_queues[chat_id] = replies or ReplyQueue()
 
     async def start(self):
         self.application.add_handler(CommandHandler("start", self._start_command))
@@ -31,12 +83,31 @@ class TelegramBot:
         )
         await self.application.initialize()
         await self.application.start()
-        if self.application.updater:
+        if self.webhook_url:
+            await self.application.bot.set_webhook(
+                self.webhook_url,
+                secret_token=self.webhook_secret,
+                allowed_updates=[Update.MESSAGE],
+            )
+        elif self.application.updater:
             await self.application.updater.start_polling()
         else:
             print("Warning: Application updater is None. Polling not started.")
+        self._started.set()
+
+    async def wait_started(self):
+        await self._started.wait()
+
+    async def receive_update(self, data: dict[str, Any]):
+        # An update delivered to the webhook; handled like a polled one.
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
 
     async def stop(self):
+        await self.digests.stop()
+        await self.delivery.close()
+        if self.application.updater and self.application.updater.running:
+            await self.application.updater.stop()
         await self.application.stop()
         await self.application.shutdown()
 
@@ -49,13 +120,12 @@ class TelegramBot:
             )
 
     async def _handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if (
-            update.message
-            and update.message.chat
-            and update.message.chat.id == int(self.chat_id)
-        ):
+        if update.message and update.message.chat:
+            replies = self.reply_queues.get(str(update.message.chat.id))
+            if replies is None:
+                return
             if not update.message.reply_to_message or not update.message.text:
-                self.replies.append(
+                replies.put(
                     {
                         "chat": "General",
                         "text": "Unhandled message: No reply to message or text",
@@ -65,8 +135,17 @@ class TelegramBot:
 
             text = update.message.text
             reply_message = update.message.reply_to_message
+            route = self.reply_map.resolve(
+                str(update.message.chat.id), reply_message.message_id
+            )
+            if route:
+                chat, quote = route
+                replies.put({"chat": chat, "text": text, "quote": quote})
+                return
+
+            # Messages older than the reply map: fall back to the header.
             if not reply_message.text:
-                self.replies.append(
+                replies.put(
                     {
                         "chat": "General",
                         "text": "Unhandled message: No text in the reply to message",
@@ -74,9 +153,11 @@ class TelegramBot:
                 )
                 return
 
-            from_chat = reply_message.text.split("\n")[0].split(":")[1].strip()
+            from_chat = (
+                reply_message.text.split("\n")[0].removeprefix("From:").strip()
+            )
             if not from_chat:
-                self.replies.append(
+                replies.put(
                     {
                         "chat": "General",
                         "text": "Unhandled message: No chat name found in the reply to message",
@@ -84,27 +165,97 @@ class TelegramBot:
                 )
                 return
 
-            self.replies.append(
+            replies.put(
                 {
                     "chat": from_chat,
                     "text": text,
                 }
             )
 
-    async def forward_message(self, message: dict[str, str]) -> None:
-        await self.application.bot.send_message(
+    async def forward_message(self, message: Message) -> None:
+        sent = await self.application.bot.send_message(
             chat_id=self.chat_id,
-            text=f"From: {message['chat']}\nMessage:\n{message['text']}",
+            text=self._format_message(message.chat, [message.body]),
+        )
+        self._record_route(self.chat_id, self._route_of(message), sent)
+
+    def queue_message(
+        self, message: Message, chat_id: str | None = None
+    ) -> asyncio.Future[Any]:
+        chat_id = chat_id or self.chat_id
+        if self.digests.applies(message):
+            return self.digests.submit(chat_id, message)
+        # What the chat's digest holds goes first, keeping the chat in order.
+        self.digests.close(chat_id, message.chat)
+        return self.delivery.submit(
+            chat_id,
+            message.chat,
+            message.body,
+            message.media,
+            self._route_of(message),
         )
 
-    async def send_qr_code(self, qr_image_bytes: bytes):
+    @staticmethod
+    def _route_of(message: Message) -> tuple[str, str] | None:
+        # The WhatsApp chat and message id a Telegram reply should go to.
+        if not message.id:
+            return None
+        return message.chat, message.id
+
+    def _record_route(self, chat_id: str, route: tuple[str, str] | None, sent: Any):
+        message_id = getattr(sent, "message_id", None)
+        if route is None or not isinstance(message_id, int):
+            return
+        self.reply_map.record(str(chat_id), message_id, *route)
+
+    async def _send_text(self, chat_id: str, text: str):
+        return await self.application.bot.send_message(chat_id=chat_id, text=text)
+
+    async def _edit_text(self, chat_id: str, message_id: int, text: str):
+        return await self.application.bot.edit_message_text(
+            text, chat_id=chat_id, message_id=message_id
+        )
+
+    async def _send_media(self, chat_id: str, caption: str, media: Media):
+        # Re-sends known content by file_id; uploads it from memory otherwise.
+        file_id = self.media_cache.file_id(media.hash)
+        if file_id:
+            self.media_cache.hits += 1
+            payload: str | io.BytesIO = file_id
+        else:
+            data = self.media_cache.get_blob(media.hash)
+            if data is None:
+                return await self._send_text(
+                    chat_id, f"{caption}\n[{media.type} no longer available]"
+                )
+            self.media_cache.uploads += 1
+            payload = io.BytesIO(data)
+
+        bot = self.application.bot
+        if media.type == "photo":
+            sent = await bot.send_photo(chat_id=chat_id, photo=payload, caption=caption)
+            attachment = sent.photo[-1] if sent.photo else None
+        elif media.type == "voice":
+            sent = await bot.send_voice(chat_id=chat_id, voice=payload, caption=caption)
+            attachment = sent.voice
+        else:
+            sent = await bot.send_document(
+                chat_id=chat_id,
+                document=payload,
+                caption=caption,
+                filename=media.filename or None,
+            )
+            attachment = sent.document
+        if not file_id and attachment:
+            self.media_cache.store_file_id(media.hash, attachment.file_id)
+        return sent
+
+    def _format_message(self, chat: str, texts: list[str]) -> str:
+        return f"From: {chat}\nMessage:\n" + "\n\n".join(texts)
+
+    async def send_qr_code(self, qr_image_bytes: bytes, chat_id: str | None = None):
         await self.application.bot.send_photo(
-            chat_id=self.chat_id,
+            chat_id=chat_id or self.chat_id,
             photo=qr_image_bytes,
             caption="Scan this QR code to authenticate WhatsApp",
         )
-
-    def get_replies(self):
-        replies = self.replies
-        self.replies = []
-        return replies
@@ -0,0 +1,314 @@
+import asyncio
+import collections
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Protocol
+
+# The span operations run in. DriverExecutor copies it into the driver
+# thread, so spans and WebDriver commands there nest under the caller's span.
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar(
+    "whatsapp2telegram_span", default=None
+)
+
+
+# One timed operation of the bridge. Spans started while another is current
+# become its children and share its trace id. `round_trips` counts the
+# WebDriver commands sent while the span or one of its children was current.
+@dataclass(eq=False)
+class Span:
+    name: str
+    trace_id: str = ""
+    span_id: str = ""
+    parent: "Span | None" = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    start_ns: int = 0
+    end_ns: int = 0
+    round_trips: int = 0
+    tracer: "Tracer | None" = None
+    _tokens: list[contextvars.Token] = field(default_factory=list)
+
+    def __enter__(self) -> "Span":
+        # Makes the span current until exit. A span can be entered several
+        # times, e.g. around each driver call of a streaming cycle, so work
+        # its consumer does in between is not attributed to it.
+        if self.tracer is not None:
+            self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._tokens:
+            _current.reset(self._tokens.pop())
+
+    def set(self, **attributes: Any):
+        if self.tracer is not None:
+            self.attributes.update(attributes)
+
+    def end(self):
+        if self.tracer is None or self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if self.parent is not None:
+            self.parent.round_trips += self.round_trips
+        self.tracer.finished.append(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        # Field names follow the OpenTelemetry span data model.
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent.span_id if self.parent else None,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": {**self.attributes, "webdriver.commands": self.round_trips},
+        }
+
+
+# Returned while tracing is off; entering and ending it does nothing.
+NOOP_SPAN = Span("noop")
+
+
+class Exporter(Protocol):
+    def export(self, spans: list[Span]): ...
+
+
+# Appends finished spans to a file, one JSON object per line.
+class JsonlExporter:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+
+    def export(self, spans: list[Span]):
+        if not spans:
+            return
+        with open(self.path, "a") as file:
+            for span in spans:
+                file.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# Posts finished spans to an OpenTelemetry collector over OTLP/HTTP with the
+# JSON encoding, so no OpenTelemetry packages are needed.
+class OtlpExporter:
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str = "whatsapp2telegram",
+        timeout: float = 10,
+    ):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans: list[Span]):
+        if not spans:
+            return
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(self.payload(spans)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def payload(self, spans: list[Span]) -> dict[str, Any]:
+        service = {"key": "service.name", "value": {"stringValue": self.service_name}}
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [service]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "whatsapp2telegram"},
+                            "spans": [self._span(span) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _span(self, span: Span) -> dict[str, Any]:
+        attributes = {**span.attributes, "webdriver.commands": span.round_trips}
+        error = "error" in span.attributes
+        return {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent.span_id if span.parent else "",
+            "name": span.name,
+            # SPAN_KIND_INTERNAL
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in attributes.items()
+            ],
+            # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+            "status": {"code": 2 if error else 0},
+        }
+
+
+# Collects finished spans in a bounded buffer, oldest dropped first, and hands
+# them to the exporters from a worker thread every `interval` seconds. Without
+# exporters, tracing is off and every span is NOOP_SPAN.
+class Tracer:
+    def __init__(self, exporters: list[Exporter] | None = None, max_spans: int = 10000):
+        self.exporters = exporters if exporters is not None else []
+        self.finished: collections.deque[Span] = collections.deque(maxlen=max_spans)
+        self.exported = 0
+
+    def start(self, name: str, **attributes: Any) -> Span:
+        # Starts a child of the current span without making it current; end()
+        # it when done.
+        if not self.exporters:
+            return NOOP_SPAN
+        parent = _current.get()
+        return Span(
+            name,
+            parent.trace_id if parent else f"{random.getrandbits(128):032x}",
+            f"{random.getrandbits(64):016x}",
+            parent,
+            attributes,
+            time.time_ns(),
+            tracer=self,
+        )
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        span = self.start(name, **attributes)
+        try:
+            with span:
+                yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.end()
+
+    def flush(self):
+        spans: list[Span] = []
+        while self.finished:
+            spans.append(self.finished.popleft())
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                print(f"[tracing] Exporting {len(spans)} spans failed: {e}")
+        self.exported += len(spans)
+
+    async def run(self, interval: float = 5):
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.flush)
+
+
+# The process-wide tracer; main adds the configured exporters.
+tracer = Tracer()
+
+
+def span(name: str, **attributes: Any):
+    return tracer.span(name, **attributes)
+
+
+def start(name: str, **attributes: Any) -> Span:
+    return tracer.start(name, **attributes)
+
+
+def count_driver_command():
+    # Called by RoundTripCounter for every WebDriver command.
+    current = _current.get()
+    if current is not None:
+        current.round_trips += 1
+
+
+def fold(thread_name: str, frame: Any) -> str:
+    # A stack in the folded format flame graph tools read: root first,
+    # frames separated by semicolons.
+    names: list[str] = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_qualname}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names)).replace(" ", "_")
+
+
+# Samples the stacks of every thread of the running process every `interval`
+# seconds, from a thread of its own, while it runs. stop() writes the samples
+# as folded stacks, ready for flamegraph.pl or speedscope.
+class SamplingProfiler:
+    def __init__(self, directory: str, interval: float = 0.005):
+        self.directory = directory
+        self.interval = interval
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self.samples = 0
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.stacks.clear()
+        self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample, name="profiler", daemon=True
+        )
+        self._thread.start()
+        print(f"[profile] Sampling every {self.interval * 1000:g}ms")
+
+    def stop(self) -> str | None:
+        # Returns the path of the profile written, if one was running.
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(
+            self.directory, f"profile-{os.getpid()}-{int(time.time())}.folded"
+        )
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        print(f"[profile] {self.samples} samples written to {path}")
+        return path
+
+    def toggle(self) -> str | None:
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[fold(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
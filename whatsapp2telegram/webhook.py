@@ -0,0 +1,95 @@
+import hmac
+import json
+from typing import TYPE_CHECKING, Any
+
+from whatsapp2telegram.status_server import Request, Response
+
+if TYPE_CHECKING:
+    from whatsapp2telegram.telegram_bot import TelegramBot
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+# Marks an update one replica passed on to another, so it is never passed on
+# again.
+FORWARDED_HEADER = "x-whatsapp2telegram-forwarded"
+
+
+def update_chat_id(update: dict[str, Any]) -> str | None:
+    for key in ("message", "edited_message"):
+        chat = update.get(key, {}).get("chat") or {}
+        if "id" in chat:
+            return str(chat["id"])
+    return None
+
+
+# Receives Telegram updates POSTed to the webhook. Telegram delivers every
+# update of the bot to one URL, behind which the load balancer picks any
+# replica; an update for a chat served by another replica is passed on to
+# that replica's pod, addressed through `peer_url`.
+class WebhookReceiver:
+    def __init__(
+        self,
+        telegram_bot: "TelegramBot",
+        secret: str,
+        chat_replicas: dict[str, int] | None = None,
+        replica_index: int = 0,
+        peer_url: str | None = None,
+    ):
+        self.telegram_bot = telegram_bot
+        self.secret = secret
+        # Telegram chat id -> index of the replica serving it.
+        self.chat_replicas = chat_replicas or {}
+        self.replica_index = replica_index
+        # e.g. "http://whatsapp2telegram-{replica}.peers:6000/telegram"
+        self.peer_url = peer_url
+        self.received = 0
+        self.forwarded = 0
+        self._client: Any = None
+
+    async def handle(self, request: Request) -> Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            return Response(403, "forbidden\n")
+        try:
+            update = json.loads(request.body)
+        except ValueError:
+            return Response(400, "bad request\n")
+        owner = self.chat_replicas.get(update_chat_id(update) or "")
+        if (
+            owner is not None
+            and owner != self.replica_index
+            and self.peer_url
+            and FORWARDED_HEADER not in request.headers
+        ):
+            return await self._forward(owner, request.body)
+        await self.telegram_bot.receive_update(update)
+        self.received += 1
+        return Response(body="ok\n")
+
+    async def _forward(self, replica: int, body: bytes) -> Response:
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        try:
+            response = await self._client.post(
+                self.peer_url.format(replica=replica),  # type: ignore
+                content=body,
+                headers={
+                    "Content-Type": "application/json",
+                    SECRET_HEADER: self.secret,
+                    FORWARDED_HEADER: "1",
+                },
+            )
+        except httpx.HTTPError as e:
+            print(f"[webhook] Could not pass an update on to replica {replica}: {e}")
+            return Response(502, "peer unavailable\n")
+        if response.status_code >= 300:
+            # Telegram redelivers the update later.
+            return Response(502, "peer rejected the update\n")
+        self.forwarded += 1
+        return Response(body="ok\n")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,36 +1,240 @@
+import asyncio
+import base64
+import dataclasses
 import os
+import tarfile
 import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.common.exceptions import TimeoutException, WebDriverException
 
-from whatsapp2telegram.telegram_bot import TelegramBot
+from whatsapp2telegram import scripts, tracing
+from whatsapp2telegram.backfill import BackfillPage
+from whatsapp2telegram.browser import BrowserProfile
+from whatsapp2telegram.chat_directory import ChatDirectory, jid_of
+from whatsapp2telegram.driver_executor import DriverExecutor
+from whatsapp2telegram.media_cache import MediaCache
+from whatsapp2telegram.models import Media, Message
+from whatsapp2telegram.metrics import (
+    Histogram,
+    RoundTripCounter,
+    StartupTimer,
+    process_tree_rss,
+)
+from whatsapp2telegram.navigation import NavigationManager
+from whatsapp2telegram.scheduler import ChatScheduler
+from whatsapp2telegram.session_snapshot import SessionSnapshot, prune_caches
+from whatsapp2telegram.supervisor import SessionSupervisor
+
+if TYPE_CHECKING:
+    from whatsapp2telegram.telegram_bot import TelegramBot
+
+MEDIA_CHUNK_SIZE = 512 * 1024
+# Shift+Enter starts a new line in the composer; Enter alone would send.
+# NULL releases Shift again.
+NEWLINE_KEYS = Keys.SHIFT + Keys.ENTER + Keys.NULL
+# Largest file the Bot API accepts for upload.
+MAX_MEDIA_SIZE = 50 * 1024 * 1024
+# How long a backfill waits for older messages to load after each scroll.
+BACKFILL_SCROLL_SETTLE_MS = 500
+
+
+class DriverTime:
+    # Adds up the time spent in driver calls, leaving out the time a
+    # streaming consumer holds on to a batch in between. The span is current
+    # only during those calls, too.
+    def __init__(self, span: tracing.Span = tracing.NOOP_SPAN):
+        self.seconds = 0.0
+        self.span = span
+
+    def __enter__(self):
+        self.span.__enter__()
+        self._started = time.monotonic()
+
+    def __exit__(self, *exc_info):
+        self.seconds += time.monotonic() - self._started
+        self.span.__exit__(*exc_info)
 
 
 class WhatsAppClient:
-    def __init__(self, telegram_bot: TelegramBot):
+    def __init__(
+        self,
+        telegram_bot: "TelegramBot",
+        user_data_dir: str | None = None,
+        telegram_chat_id: str | None = None,
+        scheduler: ChatScheduler | None = None,
+        media_cache: MediaCache | None = None,
+        browser: BrowserProfile | None = None,
+        snapshot: SessionSnapshot | None = None,
+    ):
         self.telegram_bot = telegram_bot
+        # The Telegram chat this WhatsApp account reports to; None means the
+        # bot's default chat.
+        self.telegram_chat_id = telegram_chat_id
         self.driver = None
-        self.user_data_dir = os.path.join(os.getcwd(), "whatsapp_user_data")
+        self.user_data_dir = user_data_dir or os.path.join(
+            os.getcwd(), "whatsapp_user_data"
+        )
+        self.executor = DriverExecutor()
+        self.navigation = NavigationManager()
+        self.scheduler = scheduler or ChatScheduler()
+        self.media_cache = media_cache or MediaCache()
+        self.directory = ChatDirectory()
+        self.browser = browser or BrowserProfile()
+        # Where the login is saved to and restored from, if anywhere.
+        self.snapshot = snapshot
+        self.tab_recycles = 0
+        self.supervisor = SessionSupervisor(self._create_driver, self.user_data_dir)
+        # Incremented on every start so concurrent failures restart only once.
+        self.generation = 0
+        self._restart_lock = asyncio.Lock()
+        # Messages read before a WebDriver failure interrupted a drain.
+        self._salvaged: list[Message] = []
+        # Exported by the status server.
+        self.round_trips = RoundTripCounter()
+        # Driver time per ingestion phase: "cycle" for a whole drain or scan,
+        # "drain", "scan", "read_chat" and "media" for its parts, and
+        # "backfill" per page of history caught up on.
+        self.phase_seconds = Histogram()
+        self.messages_read = 0
+        self.authenticated = False
+        self.last_cycle_at: float | None = None
+        self.startup = StartupTimer()
+
+    @contextmanager
+    def _phase(self, name: str, **attributes: str | int) -> Iterator[tracing.Span]:
+        # Times an ingestion phase into phase_seconds and traces it as a span.
+        with self.phase_seconds.time(phase=name):
+            with tracing.span(name, **attributes) as span:
+                yield span
 
     async def start(self):
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument("--headless=new")  # type: ignore
-        chrome_options.add_argument("--lang=en")  # type: ignore
-        chrome_options.add_argument(f"user-data-dir={self.user_data_dir}")  # type: ignore
-        chrome_options.add_argument("--window-size=1920,1080")  # type: ignore
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.get("https://web.whatsapp.com")
-        if not self._is_authenticated():
-            await self._authenticate()
+        if self.snapshot is not None:
+            with self.startup.phase("restore"):
+                await asyncio.to_thread(self._prepare_profile, self.snapshot)
+        with self.startup.phase("chrome"):
+            await self.executor.run(self._launch)
+        self.generation += 1
+        with self.startup.phase("chat_list"):
+            state = await self.executor.run(self._wait_for_startup)
+        self.authenticated = state == "chats"
+        if not self.authenticated:
+            with self.startup.phase("login"):
+                await self._authenticate()
+
+    def _prepare_profile(self, snapshot: SessionSnapshot):
+        # Runs before Chrome opens the profile: caches are dropped, and a
+        # profile without a login gets the saved one.
+        user_data_dir = self.supervisor.profiles[0]
+        freed = prune_caches(user_data_dir)
+        if freed:
+            print(f"Removed {freed >> 20} MB of Chrome caches")
+        snapshot.restore(user_data_dir)
+
+    def save_snapshot(self) -> bool:
+        # Blocks on disk I/O; call from a worker thread.
+        if self.snapshot is None or not self.authenticated:
+            return False
+        try:
+            return self.snapshot.save(self.supervisor.profiles[0])
+        except (OSError, tarfile.TarError) as e:
+            print(f"Warning: could not save the session snapshot: {e}")
+            return False
+
+    def _launch(self):
+        self.driver = self.supervisor.launch()
+        self.round_trips.attach(self.driver)
+
+    def _create_driver(self, user_data_dir: str) -> webdriver.Chrome:
+        driver = webdriver.Chrome(options=self.browser.options(user_data_dir))
+        self.browser.apply(driver)
+        return driver
 
     def stop(self):
         if self.driver:
             self.driver.quit()
 
+    def chrome_rss(self) -> int:
+        # Resident memory of the active chromedriver and its Chrome processes.
+        try:
+            return process_tree_rss(self.driver.service.process.pid)  # type: ignore
+        except AttributeError:
+            return 0
+
+    async def _restart(self, generation: int | None = None):
+        if generation is None:
+            generation = self.generation
+        async with self._restart_lock:
+            if generation != self.generation:
+                print("Driver already restarted, skipping")
+                return
+            started = time.monotonic()
+            with tracing.span("driver_restart") as span:
+                driver = await self.executor.run(self.supervisor.promote)
+                span.set(warm=driver is not None)
+                if driver is None:
+                    await self.executor.run(self.stop)
+                    await self.start()
+                else:
+                    self.driver = driver
+                    self.round_trips.attach(driver)
+                    self.navigation.needs_recovery = False
+                    self.generation += 1
+                    if not await self.executor.run(self._is_authenticated):
+                        await self._authenticate()
+            self.supervisor.record_recovery(
+                time.monotonic() - started, warm=driver is not None
+            )
+
+    async def supervise(self, interval: float = 10):
+        # Probes the active session and keeps the standby one warm.
+        while True:
+            await asyncio.sleep(interval)
+            generation = self.generation
+            if not await self.executor.run(self.supervisor.probe, self.driver):
+                print("[supervise] Health probe failed. Restarting...")
+                await self._restart(generation)
+            elif self.browser.needs_recycling(self.chrome_rss()):
+                await self._recycle_tab(generation)
+            if self.snapshot is not None and self.snapshot.due():
+                await asyncio.to_thread(self.save_snapshot)
+            try:
+                await self.supervisor.ensure_standby()
+            except (WebDriverException, OSError) as e:
+                print(f"[supervise] Could not warm a standby session: {e}")
+
+    async def _recycle_tab(self, generation: int):
+        rss_mb = self.chrome_rss() >> 20
+        print(f"[supervise] Chrome uses {rss_mb} MB, recycling the tab")
+        try:
+            await self.executor.run(
+                self.browser.recycle_tab, self.driver, self.supervisor.url
+            )
+            self.tab_recycles += 1
+            if not await self.executor.run(self._is_authenticated):
+                await self._authenticate()
+        except WebDriverException as e:
+            print(f"[supervise] Tab recycling failed. Restarting... {e}")
+            await self._restart(generation)
+
+    def _wait_for_startup(self) -> str | None:
+        # Returns as soon as WhatsApp Web shows either the chat list or the QR
+        # code, instead of waiting out the chat list timeout before a login.
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        try:
+            return WebDriverWait(self.driver, 60, poll_frequency=0.1).until(
+                lambda driver: driver.execute_script(scripts.STARTUP_STATE)
+            )
+        except TimeoutException:
+            return None
+
     def _is_authenticated(self) -> bool:
         try:
             if self.driver is None:
@@ -40,12 +244,34 @@ class WhatsAppClient:
                     (By.XPATH, '//span[@data-icon="chats-filled"]')
                 )
             )
-            return True
+            self.authenticated = True
         except Exception:
-            return False
+            self.authenticated = False
+        return self.authenticated
 
     async def _authenticate(self):
-        print("Authenticating...")
+        with tracing.span("authenticate"):
+            print("Authenticating...")
+            qr_canvas_element, screenshot = await self.executor.run(
+                self._wait_for_qr_code
+            )
+            await self.telegram_bot.send_qr_code(screenshot, self.telegram_chat_id)
+            print("QR code sent to Telegram. Please scan it with your WhatsApp app.")
+
+            print("Waiting for QR code to be scanned")
+            await self.executor.run(self._wait_for_qr_scan, qr_canvas_element)
+            print("QR code scanned")
+
+            print("Waiting for authentication")
+            if await self.executor.run(self._is_authenticated):
+                print("WhatsApp is authenticated successfully")
+                if self.snapshot is not None:
+                    # A new login is saved at the next health probe.
+                    self.snapshot.saved_at = None
+            else:
+                raise Exception("Authentication failed")
+
+    def _wait_for_qr_code(self) -> tuple[WebElement, bytes]:
         if self.driver is None:
             raise WebDriverException("WebDriver is not initialized")
         qr_canvas_element = WebDriverWait(self.driver, 30).until(
@@ -57,157 +283,440 @@ class WhatsAppClient:
             )
         )
         print("QR code found on page")
+        return qr_canvas_element, self.driver.get_screenshot_as_png()  # type: ignore
 
-        screenshot = self.driver.get_screenshot_as_png()  # type: ignore
-        await self.telegram_bot.send_qr_code(screenshot)
-        print("QR code sent to Telegram. Please scan it with your WhatsApp app.")
-
-        print("Waiting for QR code to be scanned")
+    def _wait_for_qr_scan(self, qr_canvas_element: WebElement):
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
         WebDriverWait(self.driver, 60).until(EC.staleness_of(qr_canvas_element))
-        print("QR code scanned")
 
-        print("Waiting for authentication")
-        if self._is_authenticated():
-            print("WhatsApp is authenticated successfully")
-        else:
-            raise Exception("Authentication failed")
+    async def get_new_messages(self) -> list[Message]:
+        messages: list[Message] = []
+        async for chat_messages in self.stream_new_messages():
+            messages.extend(chat_messages)
+        return messages
 
-    async def get_new_messages(self) -> list[dict[str, str]]:
-        if not self._is_authenticated():
+    async def stream_new_messages(self) -> AsyncIterator[list[Message]]:
+        # Rescans the chat list and yields the messages of each unread chat
+        # as soon as it is read; the next chat is read when the consumer asks
+        # for it, so a slow consumer slows reading down.
+        if not await self.executor.run(self._is_authenticated):
             await self._authenticate()
 
         print("Getting new whatsapp messages")
+        generation = self.generation
+        read_before = self.messages_read
+        cycle = DriverTime(tracing.start("cycle", mode="poll"))
         try:
-            if self.driver is None:
-                raise WebDriverException("WebDriver is not initialized")
-            # # Dump the entire page HTML into a file
-            # page_source = self.driver.page_source
-            # with open("whatsapp_page_dump.html", "w", encoding="utf-8") as f:
-            #     f.write(page_source)
-            # print("Page HTML has been dumped to 'whatsapp_page_dump.html'")
-            unread_chats = (
-                self.driver.find_elements(
-                    By.XPATH,
-                    "//span[contains(@aria-label, 'unread message')]",
-                )
-                + self.driver.find_elements(
-                    By.XPATH,
-                    "//span[contains(@aria-label, 'непрочитанное сообщение')]",
-                )
-                + self.driver.find_elements(
-                    By.XPATH,
-                    "//span[contains(@aria-label, 'непрочитанных')]",
+            with cycle:
+                unread_chats = await self.executor.run(self._scan_unread_chats)
+            for chat in unread_chats:
+                with cycle, self._phase("read_chat", chat=chat["chat"]):
+                    messages = await self.executor.run(
+                        self._read_unread_chat, chat["chat"], chat["count"]
+                    )
+                self.messages_read += len(messages)
+                if messages:
+                    yield messages
+            if unread_chats:
+                with cycle:
+                    await self.executor.run(
+                        self.navigation.return_to_chat_list, self.driver
+                    )
+        except WebDriverException as e:
+            print("[get_new_messages] WebDriver connection lost. Restarting...")
+            print(e)
+            await self._restart(generation)
+        finally:
+            self.phase_seconds.observe(cycle.seconds, phase="cycle")
+            cycle.span.set(messages=self.messages_read - read_before)
+            cycle.span.end()
+            self.last_cycle_at = time.monotonic()
+
+    def _scan_unread_chats(self) -> list[dict[str, int | str]]:
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        self.navigation.recover(self.driver)
+        with self._phase("scan") as span:
+            unread_chats = self.driver.execute_script(scripts.SCAN_UNREAD_CHATS)
+            span.set(chats=len(unread_chats))
+        print(f"Unread chats: {len(unread_chats)}")
+        # Deferred chats keep their badge and are picked up by a later scan.
+        unread_chats, _ = self.scheduler.plan(unread_chats)
+        for chat in unread_chats:
+            print(f"chat: {chat['chat']}")
+            print(f"Unread messages count: {chat['count']}")
+        return unread_chats
+
+    def _read_open_chat(self, unread_count: int) -> list[Message]:
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        with tracing.span("extract") as span:
+            extracted = self.driver.execute_script(
+                scripts.EXTRACT_OPEN_CHAT, unread_count
+            )
+            span.set(messages=len(extracted["messages"]))
+        chat_name = extracted["chat"]
+        print(f"Chat name: {chat_name}")
+        messages: list[Message] = []
+        for message in extracted["messages"]:
+            print(f"message_text: {message['text']}")
+            messages.append(
+                self._attach_media(
+                    Message.parse(
+                        chat_name, message["text"], message["id"], message["pre"]
+                    ),
+                    message.get("media"),
                 )
             )
+        return messages
 
-            unread_chats = unread_chats[1:]
-            print(f"Unread chats: {len(unread_chats)}")
+    def _attach_media(self, message: Message, media: dict[str, str] | None) -> Message:
+        # `media` is the {url, type, filename} found next to the message.
+        if not media:
+            return message
+        data = self._fetch_media(media["url"])
+        if data is None:
+            print(
+                f"Warning: could not download a {media['type']} "
+                f"from '{message.chat}'"
+            )
+            note = f"[{media['type']} could not be forwarded]"
+            text = f"{message.text}\n{note}" if message.text else note
+            return dataclasses.replace(message, text=text)
+        content_hash = self.media_cache.put_blob(data)
+        return dataclasses.replace(
+            message, media=Media(media["type"], content_hash, media["filename"])
+        )
+
+    def _fetch_media(self, url: str) -> bytes | None:
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        with self._phase("media"):
+            size = self.driver.execute_async_script(scripts.FETCH_BLOB, url)
+            if size is None:
+                return None
+            try:
+                if size > MAX_MEDIA_SIZE:
+                    print(f"Warning: skipping {size} byte media, over the upload limit")
+                    return None
+                data = bytearray()
+                for offset in range(0, size, MEDIA_CHUNK_SIZE):
+                    chunk = self.driver.execute_script(
+                        scripts.READ_BLOB_CHUNK, url, offset, MEDIA_CHUNK_SIZE
+                    )
+                    data += base64.b64decode(chunk)
+                return bytes(data)
+            finally:
+                self.driver.execute_script(scripts.RELEASE_BLOB, url)
 
-            messages: list[dict[str, str]] = []
-            requres_refresh = len(unread_chats) > 1
+    async def get_pushed_messages(self) -> list[Message]:
+        messages: list[Message] = []
+        async for chat_messages in self.stream_pushed_messages():
+            messages.extend(chat_messages)
+        return messages
 
+    async def stream_pushed_messages(self) -> AsyncIterator[list[Message]]:
+        # Yields the messages the observer pushed, then those of each unread
+        # chat as soon as it is read; the next chat is read when the consumer
+        # asks for it, so a slow consumer slows reading down.
+        generation = self.generation
+        read_before = self.messages_read
+        cycle = DriverTime(tracing.start("cycle", mode="push"))
+        try:
+            with cycle:
+                drained = await self.executor.run(self._drain_events)
+            if drained is None:
+                if not await self.executor.run(self._is_authenticated):
+                    await self._authenticate()
+                return
+            messages, unread_chats = drained
+            self.messages_read += len(messages)
+            if messages:
+                yield messages
             for chat in unread_chats:
-                print(f"chat: {chat.text}")
-                unread_count = chat.get_attribute("aria-label")  # type: ignore
-                if unread_count:
-                    unread_count = unread_count.split()[0]
-                print(f"Unread messages count: {unread_count}")
-                chat.click()  # type: ignore
-                time.sleep(1)
-                chat_name = self.driver.find_element(
-                    By.XPATH, "//header/div[2]/div/div/div/span"
-                ).text
-                print(f"Chat name: {chat_name}")
-                message_elements = self.driver.find_elements(
-                    By.XPATH, "//div[contains(@class, 'copyable-text')]/parent::*"
-                )
-                # print(f"message_elements: {message_elements}")
-                # Get the last unread_count elements from message_elements
-                if unread_count and unread_count.isdigit():
-                    unread_count_int = int(unread_count)
-                    message_elements = message_elements[-unread_count_int:]
-                else:
-                    print(
-                        f"Warning: Invalid unread count '{unread_count}' for chat '{chat_name}'"
+                with cycle, self._phase("read_chat", chat=str(chat["chat"])):
+                    messages = await self.executor.run(
+                        self._read_unread_chat, str(chat["chat"]), int(chat["count"])
                     )
-                for element in message_elements:
-                    message_text: str = "\n".join(
-                        map(
-                            lambda x: x.text,
-                            element.find_elements(  # type: ignore
-                                By.XPATH,
-                                ".//span[contains(@class, 'selectable-text') and contains(@class, 'copyable-text')]/span",
+                self.messages_read += len(messages)
+                if messages:
+                    yield messages
+        except WebDriverException as e:
+            print("[get_pushed_messages] WebDriver connection lost. Restarting...")
+            print(e)
+            await self._restart(generation)
+            salvaged, self._salvaged = self._salvaged, []
+            self.messages_read += len(salvaged)
+            if salvaged:
+                yield salvaged
+        finally:
+            self.phase_seconds.observe(cycle.seconds, phase="cycle")
+            cycle.span.set(messages=self.messages_read - read_before)
+            cycle.span.end()
+            self.last_cycle_at = time.monotonic()
+
+    def _drain_events(
+        self,
+    ) -> tuple[list[Message], list[dict[str, int | str]]] | None:
+        # Returns the pushed messages and the unread chats to read this
+        # cycle, or None when the chat list is not rendered.
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        self.navigation.recover(self.driver)
+        with self._phase("drain") as span:
+            events = self.driver.execute_script(scripts.DRAIN_EVENTS)
+            span.set(events=len(events or ()))
+        if events is None:
+            return None
+
+        messages: list[Message] = []
+        unread: dict[str, dict[str, int | str]] = {}
+        try:
+            for event in events:
+                if event["type"] == "message":
+                    print(f"[push] new message in '{event['chat']}'")
+                    messages.append(
+                        self._attach_media(
+                            Message.parse(
+                                event["chat"], event["text"], event["id"], event["pre"]
                             ),
+                            event.get("media"),
                         )
                     )
-                    print(f"message_text: {message_text}")
-                    messages.append(
-                        {
-                            "chat": chat_name,
-                            "text": message_text,
-                        }
-                    )
+                elif event["type"] == "unread":
+                    print(f"[push] {event['count']} unread in '{event['chat']}'")
+                    unread[event["chat"]] = event
+            selected, deferred = self.scheduler.plan(list(unread.values()))
+            for chat in deferred:
+                # Emitted again by the observer's next scan.
+                self.driver.execute_script(scripts.RETRY_UNREAD_CHAT, chat["chat"])
+        except WebDriverException:
+            # The drained events are gone from the page; keep what was read.
+            self._salvaged.extend(messages)
+            raise
+        return messages, selected
 
-            if requres_refresh:
-                self.driver.refresh()
+    def _read_unread_chat(self, chat: str, unread_count: int) -> list[Message]:
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        extracted_ids: list[str] | None = None
+        try:
+            with tracing.span("open_chat") as span:
+                found = self._find_chat_row(chat)
+                span.set(found=bool(found))
+                if found:
+                    found["row"].click()
+                    time.sleep(1)
+            if not found:
+                print(f"Warning: chat '{chat}' not found in the chat list")
+                self.driver.execute_script(scripts.RETRY_UNREAD_CHAT, chat)
+                return []
+            messages = self._read_open_chat(unread_count)
+            extracted_ids = [m.id for m in messages if m.id]
+            jid = next(filter(None, (m.chat_id for m in messages)), None)
+            self.directory.update(chat, jid, found["position"])
             return messages
-        except WebDriverException as e:
-            print("[get_new_messages] WebDriver connection lost. Restarting...")
-            print(e)
-            self.stop()
-            await self.start()
-            return []
+        finally:
+            self.driver.execute_script(scripts.BASELINE_OPEN_CHAT, extracted_ids)
 
-    async def send_message(self, chat_name: str, message: str):
+    async def backfill_page(
+        self, chat: str, since: str, limit: int, max_scrolls: int
+    ) -> BackfillPage | None:
+        # Returns None when the driver failed and was restarted.
+        generation = self.generation
         try:
-            if self.driver is None:
-                raise WebDriverException("WebDriver is not initialized")
+            with self._phase("backfill", chat=chat):
+                page = await self.executor.run(
+                    self._backfill_page, chat, since, limit, max_scrolls
+                )
+            self.messages_read += len(page.messages)
+            return page
+        except WebDriverException as e:
+            print(f"[backfill_page] Reading '{chat}' failed. Restarting... {e}")
+            await self._restart(generation)
+            return None
 
-            search_box = WebDriverWait(self.driver, 30).until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//div[@contenteditable='true' and @aria-autocomplete='list']",
-                    )
+    def _backfill_page(
+        self, chat: str, since: str, limit: int, max_scrolls: int
+    ) -> BackfillPage:
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        self.navigation.recover(self.driver)
+        newest: list[str] | None = None
+        try:
+            if not self._open_chat(chat, jid_of(since)):
+                print(f"Warning: chat '{chat}' not found in the chat list")
+                return BackfillPage(found=False)
+            # Keep the async script under the driver's 30s script timeout.
+            max_scrolls = min(max_scrolls, 25_000 // BACKFILL_SCROLL_SETTLE_MS)
+            self.driver.execute_async_script(
+                scripts.SCROLL_TO_MESSAGE, since, max_scrolls, BACKFILL_SCROLL_SETTLE_MS
+            )
+            extracted = self.driver.execute_script(scripts.EXTRACT_AFTER, since, limit)
+            if extracted["newest"]:
+                newest = [extracted["newest"]]
+            chat_name = extracted["chat"]
+            messages = [
+                self._attach_media(
+                    Message.parse(
+                        chat_name, message["text"], message["id"], message["pre"]
+                    ),
+                    message.get("media"),
                 )
+                for message in extracted["messages"]
+            ]
+        finally:
+            # History scrolled into view is not news; only messages after
+            # the newest one extracted are.
+            self.driver.execute_script(scripts.BASELINE_OPEN_CHAT, newest)
+        self.navigation.return_to_chat_list(self.driver)
+        print(f"[backfill] '{chat}': {len(messages)} messages")
+        return BackfillPage(messages, extracted["found"], extracted["complete"])
+
+    def _find_chat_row(self, chat: str, jid: str | None = None) -> dict | None:
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        entry = self.directory.find(chat, jid)
+        position = entry.position if entry else None
+        found = self.driver.execute_script(scripts.FIND_CHAT_ROW, chat, position)
+        if not found and position is not None:
+            # The list scrolled to where the row was last seen; let it render.
+            time.sleep(0.3)
+            found = self.driver.execute_script(scripts.FIND_CHAT_ROW, chat, position)
+        return found
+
+    def _open_chat(self, chat_name: str, jid: str | None = None) -> bool:
+        # Opens a chat by clicking its row in the chat list. Returns False
+        # when the row cannot be found or turns out to be another chat with
+        # the same name, leaving the search box as the fallback.
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        found = self._find_chat_row(chat_name, jid)
+        if not found:
+            return False
+        found["row"].click()
+        try:
+            identity = WebDriverWait(self.driver, 10).until(
+                lambda driver: driver.execute_script(scripts.CHAT_IDENTITY, chat_name)
             )
+        except TimeoutException:
+            print(f"Chat '{chat_name}' did not open from the chat list")
+            return False
+        if jid and identity["jid"] and identity["jid"] != jid:
+            print(f"Chat row '{chat_name}' belongs to another chat")
+            return False
+        self.directory.update(chat_name, identity["jid"] or jid, found["position"])
+        return True
 
-            # try:
-            #     screenshot_path = f"whatsapp_screenshot_{int(time.time())}.png"
-            #     self.driver.save_screenshot(screenshot_path)
-            #     print(f"Screenshot saved to {screenshot_path}")
-            # except Exception as e:
-            #     print(f"Failed to save screenshot: {e}")
-
-            search_box.click()
-            time.sleep(1)
-            search_box.send_keys(chat_name)
-            search_box.send_keys(Keys.ENTER)
-
-            # try:
-            #     screenshot_path = f"whatsapp_screenshot_{int(time.time())}.png"
-            #     self.driver.save_screenshot(screenshot_path)
-            #     print(f"Screenshot saved to {screenshot_path}")
-            # except Exception as e:
-            #     print(f"Failed to save screenshot: {e}")
-
-            message_box = self.driver.find_element(
-                By.XPATH, "//div[@contenteditable='true' and @data-tab='10']"
+    def _open_chat_via_search(self, chat_name: str):
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        search_box = WebDriverWait(self.driver, 30).until(
+            EC.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "//div[@contenteditable='true' and @aria-autocomplete='list']",
+                )
             )
+        )
 
-            # try:
-            #     screenshot_path = f"whatsapp_screenshot_{int(time.time())}.png"
-            #     self.driver.save_screenshot(screenshot_path)
-            #     print(f"Screenshot saved to {screenshot_path}")
-            # except Exception as e:
-            #     print(f"Failed to save screenshot: {e}")
+        self.driver.execute_script(scripts.SUSPEND_OBSERVER)
+        search_box.click()
+        time.sleep(1)
+        search_box.send_keys(chat_name)
+        search_box.send_keys(Keys.ENTER)
 
-            message_box.clear()
-            message_box.send_keys(message)
-            message_box.send_keys(Keys.ENTER)
-            self.driver.refresh()
+    def _quote_message(self, message_id: str):
+        # Best effort: without the menu the reply is sent unquoted.
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        try:
+            if not self.driver.execute_script(scripts.OPEN_MESSAGE_MENU, message_id):
+                print(f"Quoted message {message_id} is not rendered, not quoting")
+                return
+            WebDriverWait(self.driver, 5).until(
+                EC.element_to_be_clickable(
+                    (By.XPATH, "//li//div[@aria-label='Reply' or text()='Reply']")
+                )
+            ).click()
+        except TimeoutException:
+            print("Reply menu item not found, not quoting")
+
+    async def send_message(
+        self, chat_name: str, message: str, quote: str | None = None
+    ) -> bool:
+        generation = self.generation
+        try:
+            await self.executor.run(self._send_message, chat_name, message, quote)
+            return True
         except WebDriverException as e:
             print(e)
             print(f"[send_message] WebDriver connection lost. Restarting... {e}")
-            self.stop()
-            await self.start()
+            await self._restart(generation)
+            return False
+
+    async def send_messages(self, replies: list[dict[str, str]]) -> list[bool]:
+        # Sends {"chat", "text", "quote"?} replies grouped by chat: each chat
+        # is opened once and gets its replies in order. Returns whether each
+        # reply was sent, in the order given.
+        by_chat: dict[str, list[int]] = {}
+        for index, reply in enumerate(replies):
+            by_chat.setdefault(reply["chat"], []).append(index)
+        results = [False] * len(replies)
+        generation = self.generation
+        for chat, indexes in by_chat.items():
+            sent: list[bool] = []
+            try:
+                with tracing.span("send_replies", chat=chat, replies=len(indexes)):
+                    await self.executor.run(
+                        self._send_batch, chat, [replies[i] for i in indexes], sent
+                    )
+            except WebDriverException as e:
+                print(f"[send_messages] Sending to '{chat}' failed. Restarting... {e}")
+                await self._restart(generation)
+            for index, ok in zip(indexes, sent):
+                results[index] = ok
+        return results
+
+    def _send_message(self, chat_name: str, message: str, quote: str | None = None):
+        self._send_batch(chat_name, [{"text": message, "quote": quote or ""}], [])
+
+    def _send_batch(
+        self, chat_name: str, replies: list[dict[str, str]], sent: list[bool]
+    ):
+        # Appends to `sent` as each reply goes out, so the caller knows which
+        # ones made it when the driver fails halfway.
+        if self.driver is None:
+            raise WebDriverException("WebDriver is not initialized")
+        self.navigation.recover(self.driver)
+
+        quote = next((r["quote"] for r in replies if r.get("quote")), None)
+        if not self._open_chat(chat_name, jid_of(quote) if quote else None):
+            self._open_chat_via_search(chat_name)
+
+        # try:
+        #     screenshot_path = f"whatsapp_screenshot_{int(time.time())}.png"
+        #     self.driver.save_screenshot(screenshot_path)
+        #     print(f"Screenshot saved to {screenshot_path}")
+        # except Exception as e:
+        #     print(f"Failed to save screenshot: {e}")
+
+        message_box = self.driver.find_element(
+            By.XPATH, "//div[@contenteditable='true' and @data-tab='10']"
+        )
+
+        self.driver.execute_script(scripts.BASELINE_OPEN_CHAT, None)
+        for reply in replies:
+            if reply.get("quote"):
+                self._quote_message(reply["quote"])
+            message_box.clear()
+            message_box.send_keys(NEWLINE_KEYS.join(reply["text"].split("\n")))
+            message_box.send_keys(Keys.ENTER)
+            sent.append(True)
+        try:
+            self.navigation.return_to_chat_list(self.driver)
+        except WebDriverException as e:
+            # The messages are already sent; recover before the next command.
+            print(f"[send_message] Navigation after send failed: {e}")
+            self.navigation.needs_recovery = True